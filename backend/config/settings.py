@@ -30,6 +30,51 @@ AUTH0_DOMAIN = config("AUTH0_DOMAIN")
 AUTH0_AUDIENCE = config("AUTH0_AUDIENCE")
 AUTH0_CLIENT_ID = config("AUTH0_CLIENT_ID")
 AUTH0_CLIENT_SECRET = config("AUTH0_CLIENT_SECRET")
+# Segundos que se conservan las llaves públicas del JWKS antes de volver a pedirlas
+AUTH0_JWKS_TTL = config("AUTH0_JWKS_TTL", default=600, cast=int)
+# Intervalo mínimo entre refrescos forzados por un kid desconocido
+AUTH0_JWKS_MIN_REFRESH_INTERVAL = config("AUTH0_JWKS_MIN_REFRESH_INTERVAL", default=30, cast=int)
+# Máximo de tokens ya verificados que se conservan en memoria por proceso
+AUTH0_TOKEN_CACHE_SIZE = config("AUTH0_TOKEN_CACHE_SIZE", default=10000, cast=int)
+# Máximo de pares sub -> email que se conservan en memoria por proceso
+AUTH0_SUBJECT_CACHE_SIZE = config("AUTH0_SUBJECT_CACHE_SIZE", default=10000, cast=int)
+# Segundos que se conserva cada par sub -> email (un cambio de email en Auth0 tarda eso en verse)
+AUTH0_SUBJECT_CACHE_TTL = config("AUTH0_SUBJECT_CACHE_TTL", default=300, cast=int)
+# Segundos antes del expires_in en que se renueva el token de la Management API
+AUTH0_MANAGEMENT_TOKEN_LEEWAY = config("AUTH0_MANAGEMENT_TOKEN_LEEWAY", default=60, cast=int)
+# Segundos que un UserProfile resuelto por la autenticación se reutiliza en el proceso
+AUTH0_PROFILE_CACHE_TTL = config("AUTH0_PROFILE_CACHE_TTL", default=5, cast=int)
+# Máximo de perfiles que la autenticación conserva en memoria por proceso
+AUTH0_PROFILE_CACHE_SIZE = config("AUTH0_PROFILE_CACHE_SIZE", default=10000, cast=int)
+
+# Segundos que caches compartidas (CDN, proxy) pueden guardar los payloads de candidatos
+CANDIDATE_PAYLOAD_MAX_AGE = config("CANDIDATE_PAYLOAD_MAX_AGE", default=60, cast=int)
+# Preguntas a partir de las cuales legacy_format se envía por partes en vez de armarse en memoria
+LEGACY_FORMAT_STREAM_THRESHOLD = config("LEGACY_FORMAT_STREAM_THRESHOLD", default=500, cast=int)
+# Segundos que un proceso reutiliza el histograma de percentiles de una vertical sin revisar su versión
+PERCENTILE_CACHE_TTL = config("PERCENTILE_CACHE_TTL", default=30, cast=int)
+
+# Cache compartida por todos los workers: versiones de contenido, claves de
+# respuestas, snapshots y resúmenes dependen de que un cambio en un proceso
+# se vea en los demás. Con REDIS_URL se usa Redis (requiere el paquete redis);
+# si no, una tabla de la base creada por la migración 0022_cache_table.
+REDIS_URL = config("REDIS_URL", default="")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "core_cache",
+            # Con el límite por defecto (300) el culling descartaría versiones de contenido
+            "OPTIONS": {"MAX_ENTRIES": config("CACHE_MAX_ENTRIES", default=100000, cast=int)},
+        }
+    }
 
 #speechace
 API_SPEECH_ACE_URL = os.getenv("API_SPEECH_ACE_URL")
@@ -37,6 +82,9 @@ API_SPEECH_ACE_URL = os.getenv("API_SPEECH_ACE_URL")
 #cohere 
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 
+# Timeouts, reintentos y pool por servicio externo (ver core/utils/http_client.py)
+OUTBOUND_HTTP_SERVICES = {}
+
 # Cloudinary configuration
 CLOUDINARY_CLOUD_NAME = os.getenv('CLOUDINARY_CLOUD_NAME')
 CLOUDINARY_API_KEY = os.getenv('CLOUDINARY_API_KEY')
@@ -208,6 +256,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'core.authentication.Auth0JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PARSER_CLASSES': [
@@ -8,6 +8,8 @@ from .sections.speaking_admin import SpeakingTestAdmin
 from .sections.reading_admin import ReadingTestAdmin
 from .sections.writing_admin import WritingTestAdmin
 from .sections.user_profile_admin import UserProfileAdmin
+from .sections.auth0_sync_admin import Auth0SyncOutboxAdmin
+from .sections.history_admin import TestAttemptAdmin, SectionResultAdmin
 
 __all__ = [
     'ListeningTestAdmin',
@@ -15,4 +17,7 @@ __all__ = [
     'ReadingTestAdmin',
     'WritingTestAdmin',
     'UserProfileAdmin',
+    'Auth0SyncOutboxAdmin',
+    'TestAttemptAdmin',
+    'SectionResultAdmin',
 ]
@@ -0,0 +1,18 @@
+from django.contrib import admin
+from core.models.sections.auth0_sync import Auth0SyncOutbox
+
+@admin.register(Auth0SyncOutbox)
+class Auth0SyncOutboxAdmin(admin.ModelAdmin):
+    list_display = (
+        'auth0_user_id',
+        'status',
+        'attempts',
+        'next_attempt_at',
+        'leased_until',
+        'created_at',
+        'processed_at'
+    )
+    list_filter = ('status',)
+    search_fields = ('auth0_user_id', 'profile__email')
+    ordering = ('-created_at',)
+    readonly_fields = ('profile', 'auth0_user_id', 'app_metadata', 'created_at', 'processed_at')
@@ -0,0 +1,29 @@
+from django.contrib import admin
+from core.models.sections.history import TestAttempt, SectionResult
+
+
+class AppendOnlyAdmin(admin.ModelAdmin):
+    # El historial solo se consulta; las filas las escriben los endpoints
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TestAttempt)
+class TestAttemptAdmin(AppendOnlyAdmin):
+    list_display = ('profile', 'vertical', 'attempt_number', 'created_at')
+    list_filter = ('vertical',)
+    search_fields = ('profile__email',)
+    list_select_related = ('profile',)
+    ordering = ('-created_at',)
+
+
+@admin.register(SectionResult)
+class SectionResultAdmin(AppendOnlyAdmin):
+    list_display = ('profile', 'section', 'test_id', 'vertical', 'attempt_number', 'score', 'created_at')
+    list_filter = ('section', 'vertical')
+    search_fields = ('profile__email',)
+    list_select_related = ('profile',)
+    ordering = ('-created_at',)
@@ -1,5 +1,22 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from core.models.sections.user_profile import UserProfile
+from core.utils import exports
+
+
+class PuedeIntentarFilter(admin.SimpleListFilter):
+    title = 'Puede intentar'
+    parameter_name = 'puede_intentar'
+
+    def lookups(self, request, model_admin):
+        return (('si', 'Sí'), ('no', 'No (bloqueado)'))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'si':
+            return queryset.habilitados()
+        if self.value() == 'no':
+            return queryset.bloqueados()
+        return queryset
+
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -7,6 +24,7 @@ class UserProfileAdmin(admin.ModelAdmin):
         'email',
         'name',
         'intentos_realizados',
+        'puede_intentar',
         'get_vertical_display',
         'resultado_speaking',
         'resultado_listening',
@@ -16,9 +34,30 @@ class UserProfileAdmin(admin.ModelAdmin):
         'nivel',
         'fecha_creacion'
     )
-    list_filter = ('nivel', 'vertical')
+    list_filter = ('nivel', 'vertical', PuedeIntentarFilter)
     search_fields = ('email', 'name')
     ordering = ('-fecha_creacion',)
+    actions = ['expirar_bloqueos', 'exportar_csv', 'exportar_jsonl']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_intento_habilitado()
+
+    @admin.display(boolean=True, ordering='intento_habilitado', description='Puede intentar')
+    def puede_intentar(self, obj):
+        return obj.intento_habilitado
+
+    @admin.action(description='Liberar bloqueos vencidos')
+    def expirar_bloqueos(self, request, queryset):
+        liberados = queryset.expirar_bloqueos()
+        self.message_user(request, f"{liberados} bloqueos liberados", messages.SUCCESS)
+
+    @admin.action(description='Exportar resultados (CSV)')
+    def exportar_csv(self, request, queryset):
+        return exports.export_response(exports.export_queryset(queryset), 'csv')
+
+    @admin.action(description='Exportar resultados (JSON lines)')
+    def exportar_jsonl(self, request, queryset):
+        return exports.export_response(exports.export_queryset(queryset), 'jsonl')
 
     def get_vertical_display(self, obj):
         return obj.get_vertical_display()
@@ -0,0 +1,187 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.authentication import BaseAuthentication, SessionAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.models.sections.user_profile import UserProfile
+from core.utils.auth0 import get_token_auth_header, verify_jwt, get_email_from_token
+
+logger = logging.getLogger(__name__)
+
+
+class Auth0Identity:
+    """
+    Datos del token de Auth0 que quedan en request.auth
+    """
+
+    def __init__(self, token, payload, email):
+        self.token = token
+        self.payload = payload
+        self.email = email
+
+    @property
+    def sub(self):
+        return self.payload.get("sub")
+
+
+class ProfileCache:
+    """
+    LRU acotado de proceso email -> UserProfile con un TTL corto.
+
+    Devuelve copias para que los handlers puedan modificar el perfil sin
+    tocar la entrada cacheada. Las entradas vencidas se descartan al leerlas
+    y, pasadas AUTH0_PROFILE_CACHE_SIZE, se expulsan las menos usadas. Se
+    invalida desde core.signals al guardar o borrar un perfil, pero solo en
+    el proceso que lo guardó: los demás workers ven el cambio cuando vence
+    el TTL (AUTH0_PROFILE_CACHE_TTL). Por eso las escrituras releen el
+    perfil con get_request_profile(fresh=True).
+    """
+
+    def __init__(self, ttl=None, max_entries=None):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "AUTH0_PROFILE_CACHE_TTL", 5)
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, "AUTH0_PROFILE_CACHE_SIZE", 10000)
+
+    def get(self, email):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None:
+                if now - entry[1] < self.ttl:
+                    self._entries.move_to_end(email)
+                    self.hits += 1
+                    return copy.copy(entry[0])
+                del self._entries[email]
+                self.expirations += 1
+            self.misses += 1
+
+        profile = UserProfile.objects.filter(email=email).first()
+        if profile is not None and self.max_entries > 0:
+            with self._lock:
+                self._entries[email] = (profile, now)
+                self._entries.move_to_end(email)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return copy.copy(profile)
+
+    def invalidate(self, email):
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+profile_cache = ProfileCache()
+
+
+class Auth0JWTAuthentication(BaseAuthentication):
+    """
+    Autentica con el bearer token de Auth0 una sola vez por request.
+
+    request.user queda con el UserProfile del email del token (o
+    AnonymousUser si aún no tiene perfil) y request.auth con Auth0Identity.
+    Las requests sin header Authorization se dejan pasar a las demás clases.
+    """
+
+    def authenticate(self, request):
+        auth = request.headers.get("Authorization")
+        if not auth:
+            return None
+
+        started = time.perf_counter()
+        try:
+            token = get_token_auth_header(request)
+            payload = verify_jwt(token)
+        except Exception as e:
+            raise AuthenticationFailed(str(e))
+
+        email = get_email_from_token(token, payload)
+        profile = profile_cache.get(email) if email else None
+
+        logger.debug("[AUTH0] Autenticación resuelta en %.2f ms", (time.perf_counter() - started) * 1000)
+        return (profile or AnonymousUser(), Auth0Identity(token, payload, email))
+
+    def authenticate_header(self, request):
+        return 'Bearer realm="api"'
+
+
+class OptionalAuth0JWTAuthentication(Auth0JWTAuthentication):
+    """
+    Para vistas públicas: un token vencido o inválido deja la request como
+    anónima en lugar de responder 401
+    """
+
+    def authenticate(self, request):
+        try:
+            return super().authenticate(request)
+        except AuthenticationFailed as e:
+            logger.info("[AUTH0] Token ignorado en vista pública: %s", e)
+            return None
+
+
+# authentication_classes de las vistas AllowAny que no dependen del usuario
+PUBLIC_AUTHENTICATION_CLASSES = [OptionalAuth0JWTAuthentication, SessionAuthentication]
+
+
+def get_request_profile(request, fallback_email=None, fresh=False):
+    """
+    Devuelve el perfil autenticado de la request. Para clientes que todavía
+    no envían token (sin header Authorization) se admite el email del body.
+    Con fresh=True se relee el perfil de la base de datos antes de modificarlo.
+    """
+    if isinstance(request.user, UserProfile):
+        if fresh:
+            return UserProfile.objects.filter(pk=request.user.pk).first()
+        return request.user
+    if fallback_email and not request.headers.get("Authorization"):
+        return UserProfile.objects.filter(email=fallback_email).first()
+    return None
+
+
+def get_submitting_profile(request, fallback_email=None):
+    """
+    Perfil (releído de la base) que envía respuestas a un submit_answers
+    público. Si la request trae token, el perfil sale solo de él: un token
+    inválido o sin perfil responde 401 en lugar de pasar a confiar en el
+    email del body, como haría OptionalAuth0JWTAuthentication al dejar la
+    request como anónima.
+    """
+    if request.headers.get("Authorization") and not isinstance(request.user, UserProfile):
+        raise AuthenticationFailed("Token inválido o sin perfil asociado")
+    return get_request_profile(request, fallback_email, fresh=True)
@@ -0,0 +1,131 @@
+import base64
+import json
+import threading
+import time
+import uuid
+
+import requests
+import rsa
+from django.conf import settings
+from jose import jwt
+from requests.adapters import BaseAdapter
+
+from core.utils import http_client
+
+
+def _b64url_uint(value):
+    raw = value.to_bytes((value.bit_length() + 7) // 8, 'big')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+class LocalAuth0Adapter(BaseAdapter):
+    """
+    Transporte de requests que responde como Auth0 (JWKS y /userinfo) sin
+    salir a la red y cuenta cada llamada por ruta.
+    """
+
+    def __init__(self, stub):
+        super().__init__()
+        self.stub = stub
+
+    def send(self, request, **kwargs):
+        path = request.path_url.split('?')[0]
+        self.stub.record_call(request.method, path)
+
+        if path == '/.well-known/jwks.json':
+            return self._response(request, 200, self.stub.jwks)
+        if path == '/userinfo':
+            token = request.headers.get('Authorization', '').split(' ')[-1]
+            claims = jwt.get_unverified_claims(token)
+            email = self.stub.emails.get(claims.get('sub'))
+            if email is None:
+                return self._response(request, 401, {'error': 'invalid_token'})
+            return self._response(request, 200, {'sub': claims['sub'], 'email': email})
+        if path == '/oauth/token':
+            return self._response(request, 200, {'access_token': 'local-management-token', 'expires_in': 86400})
+        if path.startswith('/api/v2/users/'):
+            return self._response(request, 200, {'app_metadata': {}})
+        return self._response(request, 404, {'error': 'not_found'})
+
+    @staticmethod
+    def _response(request, status, body):
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(body).encode('utf-8')
+        response.headers['Content-Type'] = 'application/json'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class LocalAuth0:
+    """
+    Sustituto local de Auth0 para benchmarks: genera un par RSA, publica su
+    JWKS por un transporte parcheado y emite tokens con o sin claim email.
+    """
+
+    def __init__(self, key_size=2048, kid=None):
+        self.kid = kid or uuid.uuid4().hex
+        self.public_key, self.private_key = rsa.newkeys(key_size)
+        self._private_pem = self.private_key.save_pkcs1().decode('ascii')
+        self.jwks = {'keys': [{
+            'kty': 'RSA',
+            'kid': self.kid,
+            'use': 'sig',
+            'alg': 'RS256',
+            'n': _b64url_uint(self.public_key.n),
+            'e': _b64url_uint(self.public_key.e),
+        }]}
+        self.emails = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._adapter = LocalAuth0Adapter(self)
+
+    @property
+    def base_url(self):
+        return f"https://{settings.AUTH0_DOMAIN}"
+
+    def record_call(self, method, path):
+        with self._lock:
+            key = f"{method} {path}"
+            self.calls[key] = self.calls.get(key, 0) + 1
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls = {}
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def mint_token(self, email, sub=None, include_email=True, vertical_id=1, ttl=3600):
+        sub = sub or f"auth0|{uuid.uuid4().hex}"
+        self.emails[sub] = email
+        now = int(time.time())
+        claims = {
+            'iss': f"https://{settings.AUTH0_DOMAIN}/",
+            'sub': sub,
+            'aud': settings.AUTH0_AUDIENCE,
+            'iat': now,
+            'exp': now + ttl,
+            'https://yourapp.com/app_metadata': {'vertical_id': vertical_id},
+        }
+        if include_email:
+            claims['email'] = email
+        return jwt.encode(claims, self._private_pem, algorithm='RS256', headers={'kid': self.kid})
+
+    def install(self):
+        http_client.get_session('auth0').mount(self.base_url, self._adapter)
+
+    def uninstall(self):
+        http_client.get_session('auth0').adapters.pop(self.base_url, None)
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *exc):
+        self.uninstall()
@@ -0,0 +1,63 @@
+from core.models.sections.listening import ListeningTest, ListeningBlock, ListeningQuestion, ListeningOption
+from core.models.sections.reading import ReadingTest, ReadingBlock, ReadingQuestion, ReadingOption
+from core.models.sections.writing import WritingTest, WritingBlock
+from core.models.sections.speaking import SpeakingTest, SpeakingBlock
+
+
+def build_content(tests, blocks, questions, options, vertical=1):
+    """
+    Crea tests sintéticos de las cuatro secciones con bulk_create.
+    Devuelve {sección: [ids de test]}.
+    """
+    created = {}
+
+    listening = ListeningTest.objects.bulk_create(
+        ListeningTest(title=f"Listening {t}", description="", vertical=vertical) for t in range(tests)
+    )
+    listening_blocks = ListeningBlock.objects.bulk_create(
+        ListeningBlock(test=test, instructions=f"Bloque {b}") for test in listening for b in range(blocks)
+    )
+    listening_questions = ListeningQuestion.objects.bulk_create(
+        ListeningQuestion(block=block, question_text=f"Pregunta {q}") for block in listening_blocks for q in range(questions)
+    )
+    ListeningOption.objects.bulk_create(
+        ListeningOption(question=question, option_text=f"Opción {o}", is_correct=o == 0)
+        for question in listening_questions for o in range(options)
+    )
+    created['listening'] = [test.id for test in listening]
+
+    reading = ReadingTest.objects.bulk_create(
+        ReadingTest(title=f"Reading {t}", description="", vertical=vertical) for t in range(tests)
+    )
+    reading_blocks = ReadingBlock.objects.bulk_create(
+        ReadingBlock(reading_test=test, title=f"Bloque {b}", content="Texto " * 50)
+        for test in reading for b in range(blocks)
+    )
+    reading_questions = ReadingQuestion.objects.bulk_create(
+        ReadingQuestion(reading_block=block, question_text=f"Pregunta {q}") for block in reading_blocks for q in range(questions)
+    )
+    ReadingOption.objects.bulk_create(
+        ReadingOption(question=question, option_text=f"Opción {o}", is_correct=o == 0)
+        for question in reading_questions for o in range(options)
+    )
+    created['reading'] = [test.id for test in reading]
+
+    writing = WritingTest.objects.bulk_create(
+        WritingTest(title=f"Writing {t}", description="", vertical=vertical) for t in range(tests)
+    )
+    WritingBlock.objects.bulk_create(
+        WritingBlock(writing_test=test, text=f"Consigna {b}", instruction="", example="")
+        for test in writing for b in range(blocks)
+    )
+    created['writing'] = [test.id for test in writing]
+
+    speaking = SpeakingTest.objects.bulk_create(
+        SpeakingTest(title=f"Speaking {t}", description="", vertical=vertical) for t in range(tests)
+    )
+    SpeakingBlock.objects.bulk_create(
+        SpeakingBlock(speaking_test=test, text=f"Frase {b}", instruction="", example="")
+        for test in speaking for b in range(blocks)
+    )
+    created['speaking'] = [test.id for test in speaking]
+
+    return created
@@ -0,0 +1,106 @@
+import contextlib
+import io
+import logging
+import threading
+import time
+
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+@contextlib.contextmanager
+def test_database(verbosity=0):
+    """
+    Crea una base de datos de prueba (como el test runner) para que los
+    benchmarks nunca escriban en la base configurada.
+    """
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Silencia los prints de depuración y el logging de las vistas mientras se mide
+    """
+    logging.disable(logging.CRITICAL)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def percentile(sorted_samples, pct):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(pct / 100 * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+
+def summarize(latencies_ms, elapsed):
+    ordered = sorted(latencies_ms)
+    return {
+        'requests': len(ordered),
+        'rps': len(ordered) / elapsed if elapsed > 0 else 0.0,
+        'p50': percentile(ordered, 50),
+        'p95': percentile(ordered, 95),
+        'p99': percentile(ordered, 99),
+    }
+
+
+def run_concurrently(fn, total, concurrency):
+    """
+    Ejecuta fn(i) `total` veces repartidas en `concurrency` hilos.
+    Devuelve (latencias en ms, conteo de resultados, segundos totales).
+    """
+    latencies = []
+    outcomes = {}
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                started = time.perf_counter()
+                try:
+                    outcome = fn(i)
+                except Exception as e:
+                    outcome = type(e).__name__
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed_ms)
+                    outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    return latencies, outcomes, elapsed
+
+
+def format_row(name, summary, extra=''):
+    return (
+        f"{name:<34} {summary['requests']:>6} req  {summary['rps']:>9.1f} req/s  "
+        f"p50 {summary['p50']:>7.2f} ms  p95 {summary['p95']:>7.2f} ms  "
+        f"p99 {summary['p99']:>7.2f} ms  {extra}"
+    )
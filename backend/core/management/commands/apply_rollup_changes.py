@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.utils import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Agrega a los rollups y a los histogramas de percentiles los cambios de "
+        "perfiles encolados en RollupChange"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=rollups.PENDING_BATCH_SIZE,
+                            help="Cambios agregados por transacción")
+        parser.add_argument('--loop', action='store_true',
+                            help="Sigue procesando en lugar de salir cuando la cola queda vacía")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Segundos de espera entre pasadas con --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            applied = rollups.apply_pending(options['batch_size'])
+            if applied or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"{applied} cambios aplicados en {time.monotonic() - started:.2f}s"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
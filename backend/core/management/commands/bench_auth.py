@@ -0,0 +1,94 @@
+import threading
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from core.authentication import profile_cache
+from core.benchmarks.auth0_stub import LocalAuth0
+from core.benchmarks.utils import test_database, quiet, run_concurrently, summarize, format_row
+from core.models.sections.user_profile import UserProfile
+from core.utils import http_client
+from core.utils.auth0 import jwks_store, verified_tokens, subject_emails
+
+ENDPOINTS = {
+    'auth0-login': ('post', '/api/auth/auth0-login/'),
+    'me': ('get', '/api/users/me/'),
+    'register-attempt': ('post', '/api/users/register-attempt/'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark offline del camino de autenticación: genera un par RSA, sirve "
+        "el JWKS desde un transporte local y mide las vistas con el test client"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300,
+                            help="Requests por escenario")
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="Hilos concurrentes (con SQLite pueden aparecer bloqueos de escritura)")
+        parser.add_argument('--users', type=int, default=50,
+                            help="Usuarios distintos (un token por usuario)")
+        parser.add_argument('--key-size', type=int, default=2048)
+        parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS), default=list(ENDPOINTS))
+        parser.add_argument('--warm', action='store_true',
+                            help="No vaciar las caches de autenticación entre escenarios")
+
+    def handle(self, *args, **options):
+        with test_database(), LocalAuth0(key_size=options['key_size']) as auth0:
+            emails = [f"bench{i}@example.com" for i in range(options['users'])]
+            UserProfile.objects.bulk_create([
+                UserProfile(email=email, name=email, vertical=1) for email in emails
+            ])
+
+            for include_email in (True, False):
+                tokens = [auth0.mint_token(email, include_email=include_email) for email in emails]
+                label = 'con email' if include_email else 'sin email'
+                for endpoint in options['endpoints']:
+                    self.run_scenario(auth0, endpoint, label, tokens, options)
+
+    def run_scenario(self, auth0, endpoint, label, tokens, options):
+        method, path = ENDPOINTS[endpoint]
+        if not options['warm']:
+            jwks_store.clear()
+            verified_tokens.clear()
+            subject_emails.clear()
+            profile_cache.clear()
+            UserProfile.objects.update(auth0_sub=None)
+        UserProfile.objects.update(intentos_realizados=0, fecha_bloqueo=None)
+        auth0.reset_calls()
+        http_client.metrics.reset()
+        jwks_before = jwks_store.stats()
+        tokens_before = verified_tokens.stats()
+
+        # Un Client por hilo, creado una sola vez: el test client no es seguro entre hilos
+        local = threading.local()
+
+        def call(i):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = Client()
+            token = tokens[i % len(tokens)]
+            response = getattr(client, method)(
+                path,
+                data={} if method == 'post' else None,
+                content_type='application/json' if method == 'post' else None,
+                HTTP_AUTHORIZATION=f"Bearer {token}",
+            )
+            return response.status_code
+
+        with quiet():
+            latencies, outcomes, elapsed = run_concurrently(call, options['requests'], options['concurrency'])
+
+        summary = summarize(latencies, elapsed)
+        jwks_after = jwks_store.stats()
+        tokens_after = verified_tokens.stats()
+        extra = (
+            f"salientes {auth0.total_calls()} "
+            f"(jwks {jwks_after['fetches'] - jwks_before['fetches']}, "
+            f"userinfo {auth0.calls.get('GET /userinfo', 0)})  "
+            f"token-cache hits {tokens_after['hits'] - tokens_before['hits']}  "
+            f"status {outcomes}"
+        )
+        self.stdout.write(format_row(f"{endpoint} ({label})", summary, extra))
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from core.benchmarks.fixtures import build_content
+from core.benchmarks.utils import test_database, quiet, run_concurrently, summarize, format_row
+from core.utils.diagnostic import BUNDLE_SECTIONS
+
+VERTICAL = 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el bundle /api/diagnostic/<vertical>/ contra los cuatro listados "
+        "?vertical= por separado, sobre una base de prueba con contenido sintético"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tests', type=int, default=2, help="Tests por sección")
+        parser.add_argument('--blocks', type=int, default=4, help="Bloques por test")
+        parser.add_argument('--questions', type=int, default=10, help="Preguntas por bloque")
+        parser.add_argument('--options', type=int, default=4, help="Opciones por pregunta")
+        parser.add_argument('--requests', type=int, default=200, help="Inicios de diagnóstico por escenario")
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help="Candidatos simultáneos (con SQLite pueden aparecer bloqueos)")
+        parser.add_argument('--cold', action='store_true',
+                            help="Vacía la cache antes de cada escenario para medir también la reconstrucción")
+
+    def handle(self, *args, **options):
+        with test_database():
+            build_content(options['tests'], options['blocks'], options['questions'], options['options'], VERTICAL)
+            clients = {}
+
+            def client_for(i):
+                return clients.setdefault(i % options['concurrency'], Client())
+
+            def four_calls(i):
+                client = client_for(i)
+                statuses = {client.get(f"/api/{section}/tests/?vertical={VERTICAL}").status_code for section in BUNDLE_SECTIONS}
+                return statuses.pop() if len(statuses) == 1 else str(sorted(statuses))
+
+            def bundle(i):
+                return client_for(i).get(f"/api/diagnostic/{VERTICAL}/").status_code
+
+            etag = Client().get(f"/api/diagnostic/{VERTICAL}/")["ETag"]
+
+            def bundle_revalidate(i):
+                return client_for(i).get(f"/api/diagnostic/{VERTICAL}/", HTTP_IF_NONE_MATCH=etag).status_code
+
+            scenarios = [
+                ('4 listados', four_calls, 4),
+                ('bundle', bundle, 1),
+                ('bundle If-None-Match', bundle_revalidate, 1),
+            ]
+            for name, fn, requests_per_start in scenarios:
+                if options['cold']:
+                    cache.clear()
+                queries = []
+
+                def count_query(execute, sql, params, many, context):
+                    queries.append(sql)
+                    return execute(sql, params, many, context)
+
+                with connection.execute_wrapper(count_query), quiet():
+                    fn(0)
+                with quiet():
+                    latencies, outcomes, elapsed = run_concurrently(fn, options['requests'], options['concurrency'])
+                extra = (
+                    f"requests HTTP/inicio {requests_per_start}  "
+                    f"consultas primer inicio {len(queries)}  status {outcomes}"
+                )
+                self.stdout.write(format_row(name, summarize(latencies, elapsed), extra))
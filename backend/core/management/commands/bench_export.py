@@ -0,0 +1,92 @@
+import random
+import resource
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from core.benchmarks.utils import test_database, quiet
+from core.constants import VERTICAL_CHOICES
+from core.models.sections.user_profile import UserProfile
+from core.serializers.user_serializers import UserProfileSerializer
+
+NIVELES = [choice for choice, _ in UserProfile.NIVEL_CHOICES]
+VERTICALES = [choice for choice, _ in VERTICAL_CHOICES]
+
+
+def peak_rss_mb():
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la exportación de resultados por partes (tiempo al primer byte, "
+        "filas/s y pico de RSS) sobre una base de prueba con perfiles sintéticos"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=500000, help="Perfiles sintéticos")
+        parser.add_argument('--formats', nargs='+', choices=['csv', 'jsonl'], default=['csv', 'jsonl'])
+        parser.add_argument('--compare-serializer', action='store_true',
+                            help="Al final serializa todos los perfiles juntos como /api/users/ "
+                                 "para comparar el pico de memoria (eleva el pico del proceso)")
+
+    def handle(self, *args, **options):
+        with test_database():
+            self.create_profiles(options['profiles'])
+            client = Client()
+            client.force_login(User.objects.create_superuser('bench', 'bench@example.com', 'x'))
+            self.stdout.write(f"{options['profiles']} perfiles; pico de RSS antes de exportar {peak_rss_mb():.1f} MB")
+
+            for fmt in options['formats']:
+                self.stdout.write(self.export(client, fmt))
+            if options['compare_serializer']:
+                self.stdout.write(self.serialize_all())
+
+    def create_profiles(self, total, batch_size=5000):
+        # Por lotes para que la carga no infle el pico de memoria que se mide después
+        rng = random.Random(0)
+        for start in range(0, total, batch_size):
+            batch = []
+            for i in range(start, min(total, start + batch_size)):
+                scores = [round(rng.uniform(0, 100), 2) for _ in range(4)]
+                general = round(0.4 * scores[0] + 0.4 * scores[1] + 0.1 * scores[2] + 0.1 * scores[3], 2)
+                batch.append(UserProfile(
+                    email=f"bench{i}@example.com", name=f"Bench {i}", vertical=rng.choice(VERTICALES),
+                    resultado_listening=scores[0], resultado_speaking=scores[1],
+                    resultado_reading=scores[2], resultado_writing=scores[3],
+                    resultado_general=general, nivel=rng.choice(NIVELES),
+                ))
+            UserProfile.objects.bulk_create(batch)
+
+    def export(self, client, fmt):
+        started = time.perf_counter()
+        with quiet():
+            response = client.get('/api/exports/results/', {'export_format': fmt})
+            parts = iter(response.streaming_content)
+            first = next(parts)
+            first_byte = time.perf_counter() - started
+            size = len(first)
+            lines = first.count(b'\n')
+            for part in parts:
+                size += len(part)
+                lines += part.count(b'\n')
+        elapsed = time.perf_counter() - started
+        return (
+            f"{fmt:<6} primer byte {first_byte * 1000:>7.2f} ms  total {elapsed:>6.2f} s  "
+            f"{lines / elapsed:>9.0f} líneas/s  {size / 1024 / 1024:>7.1f} MB  "
+            f"pico de RSS {peak_rss_mb():.1f} MB"
+        )
+
+    def serialize_all(self):
+        started = time.perf_counter()
+        data = UserProfileSerializer(UserProfile.objects.all(), many=True).data
+        elapsed = time.perf_counter() - started
+        return (
+            f"{'serializer':<6} {len(data)} perfiles en memoria  total {elapsed:>6.2f} s  "
+            f"pico de RSS {peak_rss_mb():.1f} MB"
+        )
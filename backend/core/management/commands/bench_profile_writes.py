@@ -0,0 +1,99 @@
+import random
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.benchmarks.utils import test_database, quiet, run_concurrently, summarize, format_row
+from core.models.sections.user_profile import UserProfile, RESULTADO_FIELDS
+
+SET_COLUMNS = re.compile(r'"(\w+)" = ')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el volumen de escritura por envío de sección: save() completo "
+        "contra el UPDATE dirigido de registrar_resultado, sobre una base de prueba"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=2000, help="Perfiles sintéticos")
+        parser.add_argument('--submits', type=int, default=2000, help="Envíos por escenario")
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help="Envíos simultáneos (con SQLite pueden aparecer bloqueos)")
+
+    def handle(self, *args, **options):
+        with test_database():
+            UserProfile.objects.bulk_create([
+                UserProfile(
+                    email=f"bench{i}@example.com", name=f"Bench {i}", vertical=1,
+                    resultado_listening=50.0, resultado_speaking=60.0,
+                    resultado_reading=70.0, resultado_writing=80.0,
+                )
+                for i in range(options['profiles'])
+            ], batch_size=1000)
+            pks = list(UserProfile.objects.order_by('id').values_list('id', flat=True))
+            sections = list(RESULTADO_FIELDS)
+
+            def submit_args(i):
+                rng = random.Random(i)
+                return pks[i % len(pks)], sections[i % len(sections)], round(rng.uniform(0, 100), 2)
+
+            def full_save(i):
+                pk, section, score = submit_args(i)
+                profile = UserProfile.objects.get(pk=pk)
+                setattr(profile, RESULTADO_FIELDS[section], score)
+                profile.save()
+                return 'ok'
+
+            def targeted(i):
+                pk, section, score = submit_args(i)
+                profile = UserProfile.objects.get(pk=pk)
+                profile.registrar_resultado(section, score)
+                return 'ok'
+
+            for name, fn in [('save() completo', full_save), ('registrar_resultado', targeted)]:
+                self.stdout.write(self.run_scenario(name, fn, options))
+
+    def run_scenario(self, name, fn, options):
+        updates = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('UPDATE'):
+                updates.append((sql, params))
+            return execute(sql, params, many, context)
+
+        # Un envío con captura para describir el UPDATE que genera
+        with connection.execute_wrapper(capture), quiet():
+            fn(0)
+        columns = sorted({column for sql, _ in updates for column in SET_COLUMNS.findall(sql.split(' WHERE ')[0])})
+        statement_bytes = sum(len(sql) + sum(len(str(p)) for p in params or ()) for sql, params in updates)
+
+        wal_before = self.wal_lsn()
+        with quiet():
+            latencies, outcomes, elapsed = run_concurrently(fn, options['submits'], options['concurrency'])
+        wal = self.wal_bytes(wal_before)
+
+        extra = (
+            f"UPDATEs/envío {len(updates)}  columnas {len(columns)}  bytes sentencia {statement_bytes}"
+            + (f"  WAL/envío {wal / max(1, options['submits']):.0f} B" if wal is not None else '')
+            + f"  status {outcomes}\n    SET {', '.join(columns)}"
+        )
+        return format_row(name, summarize(latencies, elapsed), extra)
+
+    @staticmethod
+    def wal_lsn():
+        # El volumen de WAL solo se puede medir en Postgres
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_current_wal_lsn()")
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def wal_bytes(before):
+        if before is None:
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)", [before])
+            return int(cursor.fetchone()[0])
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.test import Client
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmarks.fixtures import build_content
+from core.benchmarks.utils import test_database, quiet, run_concurrently, summarize, format_row
+from core.utils import snapshots
+from core.utils.querysets import with_test_tree
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara servir los tests desde snapshots contra serializarlos en vivo, "
+        "sobre una base de prueba con contenido sintético"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tests', type=int, default=5, help="Tests por sección")
+        parser.add_argument('--blocks', type=int, default=4, help="Bloques por test")
+        parser.add_argument('--questions', type=int, default=10, help="Preguntas por bloque")
+        parser.add_argument('--options', type=int, default=4, help="Opciones por pregunta")
+        parser.add_argument('--requests', type=int, default=200, help="Requests por escenario")
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--sections', nargs='+', choices=list(snapshots.SNAPSHOT_SECTIONS),
+                            default=list(snapshots.SNAPSHOT_SECTIONS))
+
+    def handle(self, *args, **options):
+        with test_database():
+            created = build_content(options['tests'], options['blocks'], options['questions'], options['options'])
+            for section in options['sections']:
+                snapshots.rebuild(section)
+                test_id = created[section][0]
+                self.run_section(section, test_id, options)
+
+    def run_section(self, section, test_id, options):
+        model, serializer_class = snapshots.SNAPSHOT_SECTIONS[section]
+        renderer = JSONRenderer()
+        clients = {}
+
+        def client_for(i):
+            return clients.setdefault(i % options['concurrency'], Client())
+
+        scenarios = {
+            'list live': lambda i: len(renderer.render(serializer_class(
+                with_test_tree(section, model.objects.filter(vertical=1)), many=True
+            ).data)),
+            'list snapshot': lambda i: len(snapshots.get_list_payload(section, 1)),
+            'list http': lambda i: client_for(i).get(f"/api/{section}/tests/?vertical=1").status_code,
+            'retrieve live': lambda i: len(renderer.render(serializer_class(
+                with_test_tree(section, model.objects.all()).get(pk=test_id)
+            ).data)),
+            'retrieve snapshot': lambda i: len(snapshots.get_test_payload(section, test_id)),
+            'retrieve http': lambda i: client_for(i).get(f"/api/{section}/tests/{test_id}/").status_code,
+        }
+
+        for name, fn in scenarios.items():
+            with quiet():
+                latencies, outcomes, elapsed = run_concurrently(fn, options['requests'], options['concurrency'])
+            extra = f"resultados {outcomes}" if name.endswith('http') else f"bytes {next(iter(outcomes))}"
+            self.stdout.write(format_row(f"{section} {name}", summarize(latencies, elapsed), extra))
@@ -0,0 +1,50 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils.bulk_grading import RESULT_FIELDS, DEFAULT_CHUNK_SIZE, detect_format, grade_file
+
+
+class Command(BaseCommand):
+    help = "Califica hojas de respuestas de una cohorte desde un archivo CSV o JSON lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Archivo con registros {email, test_id, answers}")
+        parser.add_argument('--section', required=True, choices=sorted(RESULT_FIELDS))
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help="Por defecto se deduce de la extensión del archivo")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Perfiles por bulk_update")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Califica sin guardar los resultados")
+        parser.add_argument('--output', help="Escribe el detalle por hoja en JSON lines")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        started = time.monotonic()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                summary = grade_file(
+                    options['section'], stream, fmt,
+                    chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+        elapsed = time.monotonic() - started
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                for result in summary['results']:
+                    output.write(json.dumps(result) + "\n")
+
+        for error in summary['errors'][:20]:
+            self.stderr.write(f"Línea {error.get('line')}: {error.get('email', '')} {error['error']}")
+        if len(summary['errors']) > 20:
+            self.stderr.write(f"... y {len(summary['errors']) - 20} errores más")
+
+        rate = summary['graded'] / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['graded']} hojas calificadas, {summary['updated']} perfiles actualizados, "
+            f"{len(summary['errors'])} errores en {elapsed:.2f}s ({rate:.0f} hojas/s)"
+        ))
@@ -0,0 +1,165 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from core.models.sections.auth0_sync import Auth0SyncOutbox
+from core.utils.auth0 import update_user_app_metadata
+
+
+class Command(BaseCommand):
+    help = "Envía a Auth0 los cambios de app_metadata pendientes en el outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--max-attempts', type=int, default=8)
+        parser.add_argument('--base-delay', type=float, default=5.0,
+                            help="Segundos de espera tras el primer fallo")
+        parser.add_argument('--max-delay', type=float, default=3600.0)
+        parser.add_argument('--lease', type=int, default=300,
+                            help="Segundos que una fila reclamada queda fuera de otros workers")
+        parser.add_argument('--loop', action='store_true',
+                            help="Sigue procesando en lugar de salir cuando el outbox queda vacío")
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help="Segundos de espera entre lotes vacíos con --loop")
+
+    def handle(self, *args, **options):
+        totals = {'sent': 0, 'failed': 0, 'retried': 0, 'superseded': 0}
+        started = time.monotonic()
+
+        while True:
+            batch = self.claim_batch(options['batch_size'], options['lease'])
+            # Un lote puede quedar sin filas para enviar si todas estaban coalescidas
+            if batch['rows'] or batch['superseded']:
+                result = self.process_batch(batch['rows'], options)
+                result['superseded'] += batch['superseded']
+                for key in totals:
+                    totals[key] += result[key]
+                self.stdout.write(
+                    "Lote: {sent} enviados, {retried} reintentos, {failed} fallidos, "
+                    "{superseded} coalescidos, latencia media {latency:.2f}s".format(**result)
+                )
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        elapsed = time.monotonic() - started
+        processed = totals['sent'] + totals['failed'] + totals['retried']
+        throughput = processed / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            "Outbox drenado: {sent} enviados, {retried} reintentos, {failed} fallidos, "
+            "{superseded} coalescidos".format(**totals) + f" ({throughput:.1f} filas/s)"
+        ))
+
+    def claim_batch(self, batch_size, lease):
+        """
+        Reclama un lote con SELECT ... FOR UPDATE SKIP LOCKED y coalesce por
+        usuario: solo se reclama la fila más reciente de cada uno (si no está
+        en el lote, la enviará el lote que la tome) y sus filas pendientes más
+        antiguas quedan superseded en la misma transacción. Los usuarios con
+        una fila en curso en otro worker se saltean hasta que termine.
+        """
+        now = timezone.now()
+        outbox = Auth0SyncOutbox.objects
+        with transaction.atomic():
+            in_flight = outbox.filter(
+                status=Auth0SyncOutbox.STATUS_PENDING, leased_until__gt=now
+            ).values('auth0_user_id')
+            due = list(
+                outbox
+                .select_for_update(skip_locked=True)
+                .filter(status=Auth0SyncOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+                .exclude(auth0_user_id__in=in_flight)
+                .order_by('id')[:batch_size]
+            )
+            if not due:
+                return {'rows': [], 'superseded': 0}
+
+            users = {row.auth0_user_id for row in due}
+            latest = dict(
+                outbox
+                .filter(auth0_user_id__in=users)
+                .values('auth0_user_id')
+                .annotate(latest=Max('id'))
+                .values_list('auth0_user_id', 'latest')
+            )
+            rows = [row for row in due if row.id == latest[row.auth0_user_id]]
+            claimed_ids = [row.id for row in rows]
+
+            # Todo lo pendiente anterior a la última fila de cada usuario ya es obsoleto
+            older = Q()
+            for user, latest_id in latest.items():
+                older |= Q(auth0_user_id=user, id__lt=latest_id)
+            superseded = outbox.filter(older, status=Auth0SyncOutbox.STATUS_PENDING).update(
+                status=Auth0SyncOutbox.STATUS_SUPERSEDED,
+                leased_until=None,
+                processed_at=now
+            )
+            # Lease: las filas reclamadas quedan fuera de otros workers mientras se envían
+            outbox.filter(id__in=claimed_ids).update(
+                next_attempt_at=now + timedelta(seconds=lease),
+                leased_until=now + timedelta(seconds=lease)
+            )
+        return {'rows': rows, 'superseded': superseded}
+
+    def process_batch(self, rows, options):
+        result = {'sent': 0, 'failed': 0, 'retried': 0, 'superseded': 0, 'latency': 0.0}
+        latencies = []
+        outbox = Auth0SyncOutbox.objects
+
+        for row in rows:
+            # Se encoló un cambio más nuevo mientras esperaba: ese es el que se envía
+            if outbox.filter(auth0_user_id=row.auth0_user_id, id__gt=row.id).exists():
+                result['superseded'] += outbox.filter(id=row.id, status=Auth0SyncOutbox.STATUS_PENDING).update(
+                    status=Auth0SyncOutbox.STATUS_SUPERSEDED,
+                    leased_until=None,
+                    processed_at=timezone.now()
+                )
+                continue
+
+            attempts = row.attempts + 1
+            try:
+                update_user_app_metadata(row.auth0_user_id, row.app_metadata)
+            except Exception as e:
+                update = {'attempts': attempts, 'last_error': str(e)[:2000], 'leased_until': None}
+                if attempts >= options['max_attempts']:
+                    update['status'] = Auth0SyncOutbox.STATUS_FAILED
+                    update['processed_at'] = timezone.now()
+                    result['failed'] += 1
+                else:
+                    update['next_attempt_at'] = timezone.now() + self.backoff(attempts, options)
+                    result['retried'] += 1
+                outbox.filter(id=row.id).update(**update)
+                continue
+
+            processed_at = timezone.now()
+            outbox.filter(id=row.id).update(
+                status=Auth0SyncOutbox.STATUS_SENT,
+                attempts=attempts,
+                last_error='',
+                leased_until=None,
+                processed_at=processed_at
+            )
+            # Filas más antiguas del mismo usuario (p.ej. en backoff) ya quedaron obsoletas
+            result['superseded'] += (
+                outbox
+                .filter(auth0_user_id=row.auth0_user_id, status=Auth0SyncOutbox.STATUS_PENDING, id__lt=row.id)
+                .update(status=Auth0SyncOutbox.STATUS_SUPERSEDED, leased_until=None, processed_at=processed_at)
+            )
+            latencies.append((processed_at - row.created_at).total_seconds())
+            result['sent'] += 1
+
+        if latencies:
+            result['latency'] = sum(latencies) / len(latencies)
+        return result
+
+    @staticmethod
+    def backoff(attempts, options):
+        # Backoff exponencial con jitter
+        delay = min(options['max_delay'], options['base_delay'] * (2 ** (attempts - 1)))
+        return timedelta(seconds=random.uniform(delay / 2, delay))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models.sections.user_profile import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Libera con un solo UPDATE los bloqueos de intentos que ya vencieron"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Solo cuenta los bloqueos vencidos, sin modificarlos")
+        parser.add_argument('--loop', action='store_true',
+                            help="Repite la liberación en lugar de salir tras la primera pasada")
+        parser.add_argument('--interval', type=float, default=300.0,
+                            help="Segundos de espera entre pasadas con --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            now = timezone.now()
+            if options['dry_run']:
+                vencidos = UserProfile.objects.bloqueo_vencido(now).count()
+                self.stdout.write(f"{vencidos} bloqueos vencidos")
+            else:
+                liberados = UserProfile.objects.expirar_bloqueos(now)
+                self.stdout.write(self.style.SUCCESS(f"{liberados} bloqueos liberados"))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
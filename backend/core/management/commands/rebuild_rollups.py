@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye desde cero los rollups de resultados por vertical, nivel y día "
+        "y los compara contra UserProfile. Mientras reconstruye frena las escrituras de perfiles"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Solo compara los rollups guardados con los datos vivos, sin modificarlos")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help="Perfiles leídos por vuelta del cursor")
+        parser.add_argument('--show', type=int, default=20, help="Diferencias a mostrar")
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            rows = rollups.rebuild(options['chunk_size'])
+            self.stdout.write(f"{rows} filas de rollup reconstruidas")
+
+        # Lo encolado todavía no está en los rollups
+        rollups.apply_pending()
+        problems = rollups.compare(rollups.stored_deltas(), rollups.live_deltas(options['chunk_size']))
+        for key, field, stored, live in problems[:options['show']]:
+            vertical, nivel, day = key
+            self.stdout.write(f"  vertical {vertical} nivel {nivel or '-'} día {day}: {field} guardado {stored} vivo {live}")
+        if problems:
+            raise CommandError(f"{len(problems)} diferencias entre los rollups y UserProfile")
+        self.stdout.write(self.style.SUCCESS("Rollups consistentes con UserProfile"))
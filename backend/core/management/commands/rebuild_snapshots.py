@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models.sections.snapshots import TestSnapshot
+from core.utils import snapshots
+from core.utils.content_cache import content_versions
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los snapshots JSON de los tests que sirven list y retrieve"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--section', nargs='+', choices=list(snapshots.SNAPSHOT_SECTIONS),
+                            default=list(snapshots.SNAPSHOT_SECTIONS))
+        parser.add_argument('--variant', nargs='+', choices=list(snapshots.RENDERERS),
+                            default=list(snapshots.RENDERERS))
+        parser.add_argument('--stale-only', action='store_true',
+                            help="Solo reconstruye los snapshots faltantes o desactualizados")
+
+    def handle(self, *args, **options):
+        for section in options['section']:
+            model, _ = snapshots.SNAPSHOT_SECTIONS[section]
+            test_ids = list(model.objects.order_by('id').values_list('id', flat=True))
+            for variant in options['variant']:
+                started = time.monotonic()
+                if options['stale_only']:
+                    payloads = self.rebuild_stale(section, variant, test_ids)
+                else:
+                    payloads = snapshots.rebuild(section, variant=variant)
+
+                size = sum(len(payload) for payload in payloads.values())
+                self.stdout.write(
+                    f"{section} ({variant}): {len(payloads)} snapshots reconstruidos de {len(test_ids)} tests "
+                    f"({size / 1024:.1f} KiB) en {time.monotonic() - started:.2f}s"
+                )
+        self.stdout.write(self.style.SUCCESS("Snapshots actualizados"))
+
+    def rebuild_stale(self, section, variant, test_ids):
+        versions = content_versions(section, test_ids)
+        current = dict(
+            TestSnapshot.objects
+            .filter(section=section, variant=variant, test_id__in=test_ids)
+            .values_list('test_id', 'content_version')
+        )
+        stale = [test_id for test_id in test_ids if current.get(test_id) != versions[test_id]]
+        TestSnapshot.objects.filter(section=section, variant=variant).exclude(test_id__in=test_ids).delete()
+        return snapshots.rebuild(section, stale, variant) if stale else {}
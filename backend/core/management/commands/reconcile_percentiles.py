@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.utils import percentiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula desde UserProfile los histogramas de percentiles por vertical "
+        "y corrige los que se hayan desviado. Mientras corrige frena las escrituras de perfiles"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Solo informa las verticales con diferencias, sin corregirlas")
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help="Perfiles leídos por vuelta del cursor")
+        parser.add_argument('--loop', action='store_true',
+                            help="Repite la conciliación en lugar de salir tras la primera pasada")
+        parser.add_argument('--interval', type=float, default=3600.0,
+                            help="Segundos de espera entre pasadas con --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            fixed = percentiles.reconcile(options['chunk_size'], dry_run=options['dry_run'])
+            for vertical, (stored, exact) in sorted(fixed.items()):
+                self.stdout.write(f"  vertical {vertical}: {stored} perfiles en el histograma, {exact} en UserProfile")
+            if options['dry_run']:
+                self.stdout.write(f"{len(fixed)} histogramas con diferencias")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{len(fixed)} histogramas corregidos"))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
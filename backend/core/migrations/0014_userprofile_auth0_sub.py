@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_userprofile_fecha_bloqueo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='auth0_sub',
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_userprofile_auth0_sub'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Auth0SyncOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('auth0_user_id', models.CharField(max_length=255)),
+                ('app_metadata', models.JSONField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed'), ('superseded', 'Superseded')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth0_sync_outbox', to='core.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Auth0 Sync Outbox',
+                'verbose_name_plural': 'Auth0 Sync Outbox',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='auth0_outbox_due_idx'), models.Index(fields=['auth0_user_id', 'status'], name='auth0_outbox_user_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_auth0syncoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TestSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(choices=[('listening', 'Listening'), ('reading', 'Reading'), ('writing', 'Writing'), ('speaking', 'Speaking')], max_length=20)),
+                ('test_id', models.PositiveIntegerField()),
+                ('vertical', models.IntegerField(choices=[(1, 'Quality Assurance Engineers'), (2, 'Cybersecurity'), (3, 'Digital Marketing'), (7, 'UX/UI & Product Management'), (8, 'Sales'), (9, 'Software Engineer'), (5, 'Data & BI'), (13, 'Finanzas y Contaduría'), (14, 'Negocios y Administración'), (15, 'Human Resources')])),
+                ('content_version', models.CharField(max_length=64)),
+                ('payload', models.BinaryField()),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Test Snapshot',
+                'verbose_name_plural': 'Test Snapshots',
+                'indexes': [models.Index(fields=['section', 'vertical', 'test_id'], name='test_snapshot_vertical_idx')],
+                'constraints': [models.UniqueConstraint(fields=('section', 'test_id'), name='test_snapshot_unique')],
+            },
+        ),
+    ]
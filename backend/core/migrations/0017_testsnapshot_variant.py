@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_testsnapshot'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='testsnapshot',
+            name='test_snapshot_unique',
+        ),
+        migrations.AddField(
+            model_name='testsnapshot',
+            name='variant',
+            field=models.CharField(choices=[('full', 'Full'), ('candidate', 'Candidate')], default='full', max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='testsnapshot',
+            constraint=models.UniqueConstraint(fields=('section', 'test_id', 'variant'), name='test_snapshot_unique'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_testsnapshot_variant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SectionResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(choices=[('listening', 'Listening'), ('reading', 'Reading'), ('writing', 'Writing'), ('speaking', 'Speaking')], max_length=10)),
+                ('test_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('vertical', models.IntegerField(choices=[(1, 'Quality Assurance Engineers'), (2, 'Cybersecurity'), (3, 'Digital Marketing'), (7, 'UX/UI & Product Management'), (8, 'Sales'), (9, 'Software Engineer'), (5, 'Data & BI'), (13, 'Finanzas y Contaduría'), (14, 'Negocios y Administración'), (15, 'Human Resources')])),
+                ('attempt_number', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField(blank=True, null=True)),
+                ('detail', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('profile', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='section_results', to='core.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Section Result',
+                'verbose_name_plural': 'Section Results',
+                'indexes': [models.Index(fields=['profile', 'section', '-created_at'], name='section_result_latest_idx'), models.Index(fields=['vertical', 'section', 'created_at'], name='section_result_vertical_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TestAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vertical', models.IntegerField(choices=[(1, 'Quality Assurance Engineers'), (2, 'Cybersecurity'), (3, 'Digital Marketing'), (7, 'UX/UI & Product Management'), (8, 'Sales'), (9, 'Software Engineer'), (5, 'Data & BI'), (13, 'Finanzas y Contaduría'), (14, 'Negocios y Administración'), (15, 'Human Resources')])),
+                ('attempt_number', models.PositiveSmallIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('profile', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='test_attempts', to='core.userprofile')),
+            ],
+            options={
+                'verbose_name': 'Test Attempt',
+                'verbose_name_plural': 'Test Attempts',
+                'indexes': [models.Index(fields=['profile', '-created_at'], name='test_attempt_latest_idx'), models.Index(fields=['vertical', 'created_at'], name='test_attempt_vertical_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:10
+
+import core.models.sections.rollups
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_testattempt_sectionresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vertical', models.IntegerField(choices=[(1, 'Quality Assurance Engineers'), (2, 'Cybersecurity'), (3, 'Digital Marketing'), (7, 'UX/UI & Product Management'), (8, 'Sales'), (9, 'Software Engineer'), (5, 'Data & BI'), (13, 'Finanzas y Contaduría'), (14, 'Negocios y Administración'), (15, 'Human Resources')])),
+                ('nivel', models.CharField(blank=True, max_length=20)),
+                ('day', models.DateField()),
+                ('profiles', models.IntegerField(default=0)),
+                ('listening_count', models.IntegerField(default=0)),
+                ('listening_sum', models.FloatField(default=0)),
+                ('listening_hist', models.JSONField(default=core.models.sections.rollups.empty_histogram)),
+                ('speaking_count', models.IntegerField(default=0)),
+                ('speaking_sum', models.FloatField(default=0)),
+                ('speaking_hist', models.JSONField(default=core.models.sections.rollups.empty_histogram)),
+                ('reading_count', models.IntegerField(default=0)),
+                ('reading_sum', models.FloatField(default=0)),
+                ('reading_hist', models.JSONField(default=core.models.sections.rollups.empty_histogram)),
+                ('writing_count', models.IntegerField(default=0)),
+                ('writing_sum', models.FloatField(default=0)),
+                ('writing_hist', models.JSONField(default=core.models.sections.rollups.empty_histogram)),
+                ('general_count', models.IntegerField(default=0)),
+                ('general_sum', models.FloatField(default=0)),
+                ('general_hist', models.JSONField(default=core.models.sections.rollups.empty_histogram)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Result Rollup',
+                'verbose_name_plural': 'Result Rollups',
+                'constraints': [models.UniqueConstraint(fields=('vertical', 'nivel', 'day'), name='result_rollup_unique')],
+            },
+        ),
+    ]
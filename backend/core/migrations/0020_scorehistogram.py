@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_resultrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreHistogram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vertical', models.IntegerField(choices=[(1, 'Quality Assurance Engineers'), (2, 'Cybersecurity'), (3, 'Digital Marketing'), (7, 'UX/UI & Product Management'), (8, 'Sales'), (9, 'Software Engineer'), (5, 'Data & BI'), (13, 'Finanzas y Contaduría'), (14, 'Negocios y Administración'), (15, 'Human Resources')], unique=True)),
+                ('total', models.IntegerField(default=0)),
+                ('counts', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Score Histogram',
+                'verbose_name_plural': 'Score Histograms',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_scorehistogram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auth0syncoutbox',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+def copy_bins(apps, schema_editor):
+    # Un tramo por cada conteo distinto de cero del histograma anterior
+    ScoreHistogram = apps.get_model('core', 'ScoreHistogram')
+    ScoreHistogramBin = apps.get_model('core', 'ScoreHistogramBin')
+    bins = [
+        ScoreHistogramBin(vertical=histogram.vertical, bin=index, count=count)
+        for histogram in ScoreHistogram.objects.all()
+        for index, count in enumerate(histogram.counts or [])
+        if count
+    ]
+    ScoreHistogramBin.objects.bulk_create(bins, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_cache_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreHistogramBin',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vertical', models.IntegerField(choices=[(1, 'Quality Assurance Engineers'), (2, 'Cybersecurity'), (3, 'Digital Marketing'), (7, 'UX/UI & Product Management'), (8, 'Sales'), (9, 'Software Engineer'), (5, 'Data & BI'), (13, 'Finanzas y Contaduría'), (14, 'Negocios y Administración'), (15, 'Human Resources')])),
+                ('bin', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Score Histogram Bin',
+                'verbose_name_plural': 'Score Histogram Bins',
+                'constraints': [models.UniqueConstraint(fields=('vertical', 'bin'), name='score_histogram_bin_unique')],
+            },
+        ),
+        migrations.RunPython(copy_bins, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='ScoreHistogram',
+        ),
+    ]
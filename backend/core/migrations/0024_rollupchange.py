@@ -0,0 +1,26 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_scorehistogrambin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('previous', models.JSONField(null=True)),
+                ('current', models.JSONField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Rollup Change',
+                'verbose_name_plural': 'Rollup Changes',
+            },
+        ),
+    ]
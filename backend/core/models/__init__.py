@@ -3,6 +3,10 @@ from .sections.speaking import SpeakingTest, SpeakingBlock
 from .sections.reading import ReadingTest, ReadingBlock, ReadingQuestion, ReadingOption
 from .sections.writing import WritingTest, WritingBlock
 from .sections.user_profile import UserProfile
+from .sections.auth0_sync import Auth0SyncOutbox
+from .sections.snapshots import TestSnapshot
+from .sections.history import TestAttempt, SectionResult
+from .sections.rollups import ResultRollup, RollupChange, ScoreHistogramBin
 
 __all__ = [
     'ListeningTest',
@@ -18,4 +22,11 @@ __all__ = [
     'WritingTest',
     'WritingBlock',
     'UserProfile',
+    'Auth0SyncOutbox',
+    'TestSnapshot',
+    'TestAttempt',
+    'SectionResult',
+    'ResultRollup',
+    'RollupChange',
+    'ScoreHistogramBin',
 ]
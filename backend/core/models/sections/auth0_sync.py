@@ -0,0 +1,59 @@
+from django.db import models
+from django.utils import timezone
+from .user_profile import UserProfile
+
+
+class Auth0SyncOutbox(models.Model):
+    """
+    Cambios de app_metadata pendientes de enviar a Auth0.
+
+    Se escriben en la misma transacción que el perfil y los procesa el comando
+    drain_auth0_outbox, así la request no espera a la Management API.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_SUPERSEDED = 'superseded'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_SUPERSEDED, 'Superseded'),
+    ]
+
+    profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='auth0_sync_outbox'
+    )
+    auth0_user_id = models.CharField(max_length=255)
+    app_metadata = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Hasta cuándo un worker tiene la fila reclamada; mientras tanto ninguna
+    # otra fila del mismo usuario se envía, para no invertir el orden en Auth0
+    leased_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def enqueue(cls, profile, auth0_user_id, app_metadata):
+        return cls.objects.create(
+            profile=profile,
+            auth0_user_id=auth0_user_id,
+            app_metadata=app_metadata
+        )
+
+    def __str__(self):
+        return f"{self.auth0_user_id} - {self.status}"
+
+    class Meta:
+        verbose_name = "Auth0 Sync Outbox"
+        verbose_name_plural = "Auth0 Sync Outbox"
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='auth0_outbox_due_idx'),
+            models.Index(fields=['auth0_user_id', 'status'], name='auth0_outbox_user_idx'),
+        ]
@@ -0,0 +1,107 @@
+from django.db import models
+from django.utils import timezone
+from core.constants import VERTICAL_CHOICES
+from .user_profile import UserProfile
+
+
+class AppendOnlyModel(models.Model):
+    """
+    Tablas de historial: solo se insertan filas, nunca se actualizan. Así
+    los reportes leen de aquí sin competir por los locks de UserProfile.
+    """
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError(f"{type(self).__name__} es solo de inserción")
+        super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+
+class TestAttempt(AppendOnlyModel):
+    """
+    Un intento registrado con register-attempt. attempt_number es el valor
+    de intentos_realizados que quedó en el perfil (vuelve a 1 tras un bloqueo).
+    """
+    # Sin índice propio: lo cubre test_attempt_latest_idx
+    profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='test_attempts',
+        db_index=False
+    )
+    vertical = models.IntegerField(choices=VERTICAL_CHOICES)
+    attempt_number = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def record(cls, profile, attempt_number):
+        return cls.objects.create(profile=profile, vertical=profile.vertical, attempt_number=attempt_number)
+
+    def __str__(self):
+        return f"{self.profile_id} - intento {self.attempt_number}"
+
+    class Meta:
+        verbose_name = "Test Attempt"
+        verbose_name_plural = "Test Attempts"
+        indexes = [
+            # Último intento de un usuario
+            models.Index(fields=['profile', '-created_at'], name='test_attempt_latest_idx'),
+            # Intentos de una vertical en un período
+            models.Index(fields=['vertical', 'created_at'], name='test_attempt_vertical_idx'),
+        ]
+
+
+class SectionResult(AppendOnlyModel):
+    """
+    Resultado de cada envío de una sección. detail guarda un resumen
+    compacto del envío (aciertos, preguntas falladas, criterios o puntajes
+    por bloque), no las respuestas completas.
+    """
+    SECTION_CHOICES = [
+        ('listening', 'Listening'),
+        ('reading', 'Reading'),
+        ('writing', 'Writing'),
+        ('speaking', 'Speaking'),
+    ]
+
+    # Sin índice propio: lo cubre section_result_latest_idx
+    profile = models.ForeignKey(
+        UserProfile,
+        on_delete=models.CASCADE,
+        related_name='section_results',
+        db_index=False
+    )
+    section = models.CharField(max_length=10, choices=SECTION_CHOICES)
+    test_id = models.PositiveIntegerField(null=True, blank=True)
+    vertical = models.IntegerField(choices=VERTICAL_CHOICES)
+    attempt_number = models.PositiveSmallIntegerField()
+    score = models.FloatField(null=True, blank=True)
+    detail = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def record(cls, profile, section, test_id, score, detail=None):
+        return cls.objects.create(
+            profile=profile,
+            section=section,
+            test_id=test_id,
+            vertical=profile.vertical,
+            attempt_number=profile.intentos_realizados,
+            score=score,
+            detail=detail
+        )
+
+    def __str__(self):
+        return f"{self.profile_id} - {self.section}: {self.score}"
+
+    class Meta:
+        verbose_name = "Section Result"
+        verbose_name_plural = "Section Results"
+        indexes = [
+            # Último resultado de un usuario (por sección)
+            models.Index(fields=['profile', 'section', '-created_at'], name='section_result_latest_idx'),
+            # Resultados de una vertical (y sección) en un período
+            models.Index(fields=['vertical', 'section', 'created_at'], name='section_result_vertical_idx'),
+        ]
@@ -0,0 +1,95 @@
+from django.db import models
+from core.constants import VERTICAL_CHOICES
+
+
+def empty_histogram():
+    return [0] * 10
+
+
+class ResultRollup(models.Model):
+    """
+    Agregados de resultados por vertical, nivel y día de alta del perfil.
+
+    Cada perfil aporta a una sola fila: la de su vertical, su nivel actual
+    ('' si todavía no tiene) y el día de fecha_creacion. Por cada sección y
+    por el resultado general se guardan cuántos perfiles tienen puntaje, la
+    suma y un histograma de 10 tramos de 10 puntos. Se mantiene de forma
+    incremental desde core.utils.rollups y se reconstruye con rebuild_rollups.
+    """
+    vertical = models.IntegerField(choices=VERTICAL_CHOICES)
+    nivel = models.CharField(max_length=20, blank=True)
+    day = models.DateField()
+    profiles = models.IntegerField(default=0)
+
+    listening_count = models.IntegerField(default=0)
+    listening_sum = models.FloatField(default=0)
+    listening_hist = models.JSONField(default=empty_histogram)
+    speaking_count = models.IntegerField(default=0)
+    speaking_sum = models.FloatField(default=0)
+    speaking_hist = models.JSONField(default=empty_histogram)
+    reading_count = models.IntegerField(default=0)
+    reading_sum = models.FloatField(default=0)
+    reading_hist = models.JSONField(default=empty_histogram)
+    writing_count = models.IntegerField(default=0)
+    writing_sum = models.FloatField(default=0)
+    writing_hist = models.JSONField(default=empty_histogram)
+    general_count = models.IntegerField(default=0)
+    general_sum = models.FloatField(default=0)
+    general_hist = models.JSONField(default=empty_histogram)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_vertical_display()} / {self.nivel or '-'} / {self.day}: {self.profiles}"
+
+    class Meta:
+        verbose_name = "Result Rollup"
+        verbose_name_plural = "Result Rollups"
+        constraints = [
+            models.UniqueConstraint(fields=['vertical', 'nivel', 'day'], name='result_rollup_unique'),
+        ]
+
+
+class RollupChange(models.Model):
+    """
+    Cambio de un perfil pendiente de sumar a los rollups y a los histogramas
+    de percentiles: estado anterior y nuevo (None en un alta o una baja).
+
+    Se escribe en la misma transacción que el perfil, con un INSERT que no
+    bloquea a nadie, y lo agregan por lotes core.utils.rollups.apply_pending
+    y el comando apply_rollup_changes, así la request no espera los locks de
+    las filas compartidas de los rollups.
+    """
+    previous = models.JSONField(null=True)
+    current = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.pk} ({self.created_at})"
+
+    class Meta:
+        verbose_name = "Rollup Change"
+        verbose_name_plural = "Rollup Changes"
+
+
+class ScoreHistogramBin(models.Model):
+    """
+    Un tramo del histograma de resultado_general de una vertical: tramos de
+    0,1 puntos (1001 tramos, el último es el 100). Cada guardado de un perfil
+    suma o resta con F() solo en los tramos que toca, así que dos perfiles de
+    la misma vertical con puntajes distintos no se bloquean entre sí. Lo
+    mantiene core.utils.percentiles y lo corrige el comando reconcile_percentiles.
+    """
+    vertical = models.IntegerField(choices=VERTICAL_CHOICES)
+    bin = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.get_vertical_display()} / {self.bin}: {self.count}"
+
+    class Meta:
+        verbose_name = "Score Histogram Bin"
+        verbose_name_plural = "Score Histogram Bins"
+        constraints = [
+            models.UniqueConstraint(fields=['vertical', 'bin'], name='score_histogram_bin_unique'),
+        ]
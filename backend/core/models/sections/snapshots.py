@@ -0,0 +1,51 @@
+from django.db import models
+from core.constants import VERTICAL_CHOICES
+
+
+class TestSnapshot(models.Model):
+    """
+    JSON ya renderizado de un test. La variante full es lo que devuelve el
+    endpoint de detalle; candidate es la versión compacta sin respuestas
+    correctas (core.utils.candidate_payloads).
+
+    content_version es la versión de core.utils.content_cache con la que se
+    construyó; si ya no coincide, el snapshot está desactualizado y se
+    reconstruye al leerlo o con el comando rebuild_snapshots. Las versiones
+    viven en la cache compartida (CACHES), así que un snapshot construido
+    por el comando vale para todos los workers.
+    """
+    SECTION_CHOICES = [
+        ('listening', 'Listening'),
+        ('reading', 'Reading'),
+        ('writing', 'Writing'),
+        ('speaking', 'Speaking'),
+    ]
+
+    VARIANT_FULL = 'full'
+    VARIANT_CANDIDATE = 'candidate'
+
+    VARIANT_CHOICES = [
+        (VARIANT_FULL, 'Full'),
+        (VARIANT_CANDIDATE, 'Candidate'),
+    ]
+
+    section = models.CharField(max_length=20, choices=SECTION_CHOICES)
+    variant = models.CharField(max_length=20, choices=VARIANT_CHOICES, default=VARIANT_FULL)
+    test_id = models.PositiveIntegerField()
+    vertical = models.IntegerField(choices=VERTICAL_CHOICES)
+    content_version = models.CharField(max_length=64)
+    payload = models.BinaryField()
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.section} #{self.test_id} {self.variant} ({self.content_version})"
+
+    class Meta:
+        verbose_name = "Test Snapshot"
+        verbose_name_plural = "Test Snapshots"
+        constraints = [
+            models.UniqueConstraint(fields=['section', 'test_id', 'variant'], name='test_snapshot_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['section', 'vertical', 'test_id'], name='test_snapshot_vertical_idx'),
+        ]
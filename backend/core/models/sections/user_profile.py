@@ -1,26 +1,164 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Case, ExpressionWrapper, F, Q, Value, When
 from django.core.validators import MinValueValidator, MaxValueValidator
 from core.constants import VERTICAL_CHOICES
 from django.utils import timezone
 from datetime import timedelta
 
+# Intentos permitidos antes del bloqueo y duración del bloqueo
+MAX_INTENTOS = 3
+DIAS_BLOQUEO = 2
+
+# Columna de resultado de cada sección y su peso en el resultado general
+RESULTADO_FIELDS = {
+    'listening': 'resultado_listening',
+    'speaking': 'resultado_speaking',
+    'reading': 'resultado_reading',
+    'writing': 'resultado_writing',
+}
+PESOS_RESULTADO = {
+    'resultado_listening': 0.4,
+    'resultado_speaking': 0.4,
+    'resultado_reading': 0.1,
+    'resultado_writing': 0.1,
+}
+
+
+class UserProfileQuerySet(models.QuerySet):
+    """
+    Consultas sobre el bloqueo de intentos expresadas en SQL, con la misma
+    regla que UserProfile.puede_intentar: se puede intentar con menos de
+    MAX_INTENTOS o si el bloqueo tiene más de DIAS_BLOQUEO días.
+    """
+
+    @staticmethod
+    def _habilitado(now=None):
+        limite = (now or timezone.now()) - timedelta(days=DIAS_BLOQUEO)
+        return Q(intentos_realizados__lt=MAX_INTENTOS) | Q(fecha_bloqueo__lte=limite)
+
+    def with_intento_habilitado(self, now=None):
+        """
+        Anota intento_habilitado (bool) para filtrar u ordenar sin escribir
+        """
+        return self.annotate(intento_habilitado=ExpressionWrapper(
+            self._habilitado(now), output_field=models.BooleanField()
+        ))
+
+    def habilitados(self, now=None):
+        return self.filter(self._habilitado(now))
+
+    def bloqueados(self, now=None):
+        return self.exclude(self._habilitado(now))
+
+    def bloqueo_vencido(self, now=None):
+        limite = (now or timezone.now()) - timedelta(days=DIAS_BLOQUEO)
+        return self.filter(intentos_realizados__gte=MAX_INTENTOS, fecha_bloqueo__lte=limite)
+
+    def expirar_bloqueos(self, now=None):
+        """
+        Reinicia todos los bloqueos vencidos con un solo UPDATE. Devuelve
+        cuántos perfiles se liberaron.
+        """
+        from core.authentication import profile_cache
+
+        liberados = self.bloqueo_vencido(now).update(intentos_realizados=0, fecha_bloqueo=None)
+        if liberados:
+            # update() no emite post_save; la cache de perfiles es local y de TTL corto
+            profile_cache.clear()
+        return liberados
+
+    def bloquear_escrituras(self):
+        """
+        Dentro de una transacción, frena las escrituras sobre los perfiles
+        hasta el commit: espera a las que están en curso y deja leer a las
+        demás. Lo usan las reconstrucciones de rollups y percentiles para
+        leer los datos vivos y reemplazar los agregados sin perder cambios.
+        Solo actúa en PostgreSQL; en desarrollo, con SQLite, ya hay un solo
+        escritor a la vez.
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {self.model._meta.db_table} IN SHARE MODE')
+
+    def registrar_intento(self, pk, now=None):
+        """
+        Registra un intento con un único UPDATE condicional: suma uno con F()
+        si el perfil está bajo el límite, o arranca de nuevo si su bloqueo
+        venció, y fija fecha_bloqueo al llegar a MAX_INTENTOS. Dentro de la
+        misma transacción relee el estado, así que dos requests simultáneas
+        nunca pierden un incremento ni pasan el límite.
+
+        Devuelve (intentos_realizados, fecha_bloqueo) o None si el perfil no
+        existe o sigue bloqueado.
+        """
+        from core.authentication import profile_cache
+
+        now = now or timezone.now()
+        vencido = Q(intentos_realizados__gte=MAX_INTENTOS, fecha_bloqueo__lte=now - timedelta(days=DIAS_BLOQUEO))
+        with transaction.atomic():
+            updated = self.filter(self._habilitado(now), pk=pk).update(
+                intentos_realizados=Case(
+                    When(vencido, then=Value(1)),
+                    default=F('intentos_realizados') + 1,
+                ),
+                fecha_bloqueo=Case(
+                    When(vencido, then=Value(now if MAX_INTENTOS == 1 else None)),
+                    When(intentos_realizados__gte=MAX_INTENTOS - 1, then=Value(now)),
+                    default=F('fecha_bloqueo'),
+                    output_field=models.DateTimeField(),
+                ),
+            )
+            if not updated:
+                return None
+            email, intentos, fecha_bloqueo = (
+                self.model.objects.filter(pk=pk).values_list('email', 'intentos_realizados', 'fecha_bloqueo').get()
+            )
+        profile_cache.invalidate(email)
+        return intentos, fecha_bloqueo
+
+
 class UserProfile(models.Model):
     email = models.EmailField(unique=True)
+    auth0_sub = models.CharField(max_length=255, unique=True, null=True, blank=True)
     name = models.CharField(max_length=255, null=True, blank=True)
     vertical = models.IntegerField(choices=VERTICAL_CHOICES)
     intentos_realizados = models.IntegerField(default=0)
     fecha_bloqueo = models.DateTimeField(null=True, blank=True)
 
-    def puede_intentar_test(self):
-        if self.intentos_realizados < 3:
-            return True
-        if self.fecha_bloqueo and timezone.now() >= self.fecha_bloqueo + timedelta(days=2):
-            # Se cumplió el plazo, reiniciamos
-            self.intentos_realizados = 0
-            self.fecha_bloqueo = None
-            self.save(update_fields=["intentos_realizados", "fecha_bloqueo"])
+    objects = UserProfileQuerySet.as_manager()
+
+    def puede_intentar(self, now=None):
+        """
+        Evalúa si puede intentar el test solo con las columnas de la fila, sin escribir
+        """
+        if self.intentos_realizados < MAX_INTENTOS:
             return True
-        return False
+        now = now or timezone.now()
+        return bool(self.fecha_bloqueo and now >= self.fecha_bloqueo + timedelta(days=DIAS_BLOQUEO))
+
+    def puede_intentar_test(self):
+        # Compatibilidad: ya no reinicia el bloqueo; ver UserProfileQuerySet.expirar_bloqueos
+        return self.puede_intentar()
+
+    def bloqueo_vencido(self, now=None):
+        return self.intentos_realizados >= MAX_INTENTOS and self.puede_intentar(now)
+
+    def fecha_desbloqueo(self):
+        if self.fecha_bloqueo is None:
+            return None
+        return self.fecha_bloqueo + timedelta(days=DIAS_BLOQUEO)
+
+    def registrar_resultado(self, section, score):
+        """
+        Guarda el resultado de una sección con un UPDATE de solo esa columna,
+        resultado_general, nivel y fecha_actualizacion, en lugar de reescribir
+        toda la fila. Los
+        derivados se calculan con los demás resultados releídos bajo bloqueo
+        (ver save), no con los de esta instancia.
+        """
+        field = RESULTADO_FIELDS[section]
+        setattr(self, field, score)
+        self.save(update_fields=[field])
 
 
     resultado_listening = models.FloatField(
@@ -72,15 +210,8 @@ class UserProfile(models.Model):
             self.resultado_general = None
             self.nivel = None
             return  
-        pesos = {
-            'resultado_listening': 0.4,
-            'resultado_speaking': 0.4,
-            'resultado_reading': 0.1,
-            'resultado_writing': 0.1,
-        }
-
         total = 0
-        for campo, peso in pesos.items():
+        for campo, peso in PESOS_RESULTADO.items():
             total += getattr(self, campo) * peso
 
         self.resultado_general = total
@@ -98,9 +229,64 @@ class UserProfile(models.Model):
         else:
             self.nivel = 'beginner'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Valores leídos de la base, para core.utils.rollups.record_profiles
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not models.DEFERRED
+        }
+        return instance
+
+    def refrescar_resultados(self, excluir=()):
+        """
+        Relee con SELECT ... FOR UPDATE los resultados que no se están
+        guardando, para que otro guardado de la misma fila espere a este y
+        resultado_general no se calcule con valores viejos de la instancia.
+
+        La fila leída queda como estado anterior para los rollups, que así
+        no la vuelven a consultar.
+        """
+        from core.utils.rollups import STATE_FIELDS
+
+        actuales = type(self).objects.select_for_update().filter(pk=self.pk).values(*STATE_FIELDS).first()
+        if actuales is None:
+            return
+        self._estado_bloqueado = actuales
+        for campo in PESOS_RESULTADO:
+            if campo not in excluir:
+                setattr(self, campo, actuales[campo])
+
     def save(self, *args, **kwargs):
-        self.calcular_resultado_general()
-        super().save(*args, **kwargs)
+        # En una transacción: las señales de core.signals releen el estado
+        # anterior con bloqueo y actualizan los rollups antes del commit
+        with transaction.atomic(savepoint=False):
+            # Con update_fields solo se recalculan los derivados si cambia un
+            # resultado; fecha_actualizacion (auto_now) se escribe con ellos
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                self.calcular_resultado_general()
+            elif set(update_fields) & set(PESOS_RESULTADO):
+                kwargs['update_fields'] = set(update_fields) | {'resultado_general', 'nivel', 'fecha_actualizacion'}
+                self.refrescar_resultados(excluir=update_fields)
+                self.calcular_resultado_general()
+            try:
+                super().save(*args, **kwargs)
+            finally:
+                self.__dict__.pop('_estado_bloqueado', None)
+
+    # Compatibilidad con request.user cuando autentica core.authentication
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    @property
+    def is_staff(self):
+        return False
 
     def __str__(self):
         return f"{self.email} - {self.get_vertical_display()}"
@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class UserProfileCursorPagination(CursorPagination):
+    """
+    Paginación por cursor sobre la clave primaria: cada página es un SELECT
+    con WHERE id < cursor y LIMIT, sin COUNT ni OFFSET, así que el costo no
+    crece con el tamaño de la tabla ni con la página pedida.
+    """
+    ordering = '-id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -1,3 +1,4 @@
+from django.utils import timezone
 from rest_framework import serializers
 from core.models.sections.user_profile import UserProfile
 from core.constants import VERTICAL_CHOICES
@@ -6,6 +7,13 @@ class UserProfileSerializer(serializers.ModelSerializer):
     vertical_display = serializers.SerializerMethodField()
     nivel_display = serializers.SerializerMethodField()
 
+    # Columnas que necesita cada campo calculado, para cargar solo esas con ?fields=
+    FIELD_SOURCES = {
+        'vertical_display': ['vertical'],
+        'nivel_display': ['nivel'],
+        'puede_intentar_test': ['intentos_realizados', 'fecha_bloqueo'],
+    }
+
     class Meta:
         model = UserProfile
         fields = [
@@ -17,6 +25,37 @@ class UserProfileSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['resultado_general', 'nivel']
 
+    def __init__(self, *args, **kwargs):
+        # fields: subconjunto de campos a serializar (?fields= en el listado)
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def parse_fields(cls, value):
+        """
+        Valida el parámetro ?fields=a,b,c. Devuelve la lista o None si no se envió.
+        """
+        if not value:
+            return None
+        fields = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in cls.Meta.fields]
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Campos desconocidos: {', '.join(unknown)}"})
+        return fields
+
+    @classmethod
+    def columns_for(cls, fields):
+        """
+        Columnas del modelo que hay que cargar para serializar esos campos
+        """
+        columns = {'id'}
+        for name in fields:
+            columns.update(cls.FIELD_SOURCES.get(name, [name]))
+        return sorted(columns)
+
     def get_vertical_display(self, obj):
         return obj.get_vertical_display()
 
@@ -26,4 +65,6 @@ class UserProfileSerializer(serializers.ModelSerializer):
     puede_intentar_test = serializers.SerializerMethodField()
 
     def get_puede_intentar_test(self, obj):
-        return obj.puede_intentar_test()
\ No newline at end of file
+        # Solo lectura: no reinicia el bloqueo vencido mientras se serializa
+        now = self.context.get('now') or timezone.now()
+        return obj.puede_intentar(now)
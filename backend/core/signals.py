@@ -0,0 +1,60 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from core.models.sections.user_profile import UserProfile
+from core.utils import content_cache, rollups
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    from core.authentication import profile_cache
+    profile_cache.invalidate(instance.email)
+
+
+@receiver(pre_save, sender=UserProfile)
+def remember_rollup_state(sender, instance, update_fields=None, **kwargs):
+    # Guardados que no tocan columnas de los rollups (nombre, intentos) no los recalculan
+    if update_fields is not None and not set(update_fields) & set(rollups.STATE_FIELDS):
+        instance._rollup_previous = False
+        return
+    instance._rollup_previous = rollups.previous_state(instance)
+
+
+@receiver(post_save, sender=UserProfile)
+def update_rollups(sender, instance, update_fields=None, **kwargs):
+    previous = getattr(instance, '_rollup_previous', False)
+    if previous is False:
+        return
+    del instance._rollup_previous
+    fields = set(update_fields) if update_fields is not None and previous is not None else None
+    state = rollups.current_state(instance, previous or {}, fields)
+    rollups.enqueue([(previous, state)])
+    rollups.remember_state(instance, state)
+
+
+@receiver(pre_delete, sender=UserProfile)
+def remember_deleted_rollup_state(sender, instance, **kwargs):
+    instance._rollup_previous = rollups.previous_state(instance)
+
+
+@receiver(post_delete, sender=UserProfile)
+def remove_from_rollups(sender, instance, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is not None:
+        rollups.enqueue([(previous, None)])
+
+
+def invalidate_content_version(sender, instance, **kwargs):
+    content_cache.content_changed(instance)
+
+
+def remember_test_vertical(sender, instance, **kwargs):
+    content_cache.remember_vertical(instance)
+
+
+for content_model in content_cache.CONTENT_MODELS:
+    post_save.connect(invalidate_content_version, sender=content_model)
+    post_delete.connect(invalidate_content_version, sender=content_model)
+
+for test_model in content_cache.TEST_MODELS.values():
+    pre_save.connect(remember_test_vertical, sender=test_model)
@@ -1,3 +1,2020 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+import urllib3
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth.models import AnonymousUser, User
+from django.db import OperationalError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+
+from core.authentication import Auth0JWTAuthentication, ProfileCache, profile_cache
+from core.benchmarks.utils import quiet
+from core.management.commands.drain_auth0_outbox import Command as DrainCommand
+from core.management.commands.rebuild_snapshots import Command as RebuildSnapshotsCommand
+from core.models import (
+    ListeningTest, ListeningBlock, ListeningQuestion, ListeningOption,
+    ReadingTest, ReadingBlock, ReadingQuestion, ReadingOption,
+    WritingTest, WritingBlock,
+    SpeakingTest, SpeakingBlock,
+    UserProfile, TestSnapshot, TestAttempt, SectionResult, ResultRollup, RollupChange, ScoreHistogramBin,
+)
+from core.models.sections.auth0_sync import Auth0SyncOutbox
+from core.models.sections.user_profile import MAX_INTENTOS, DIAS_BLOQUEO
+from core.serializers.listening_serializers import ListeningTestSerializer
+from core.utils import content_cache, exports, http_client, legacy_format, percentiles, rollups, snapshots
+from core.utils.auth0 import (
+    JWKSKeyStore, ManagementTokenCache, SubjectEmailCache, VerifiedTokenCache,
+    get_email_from_token, link_auth0_subject, update_user_app_metadata, verify_jwt,
+)
+from core.utils.bulk_grading import grade_matrix, write_results
+from core.utils.cohere_eval import evaluate_writing
+from core.utils.grading import AnswerKeyCache, answer_keys, grade_answers
+from core.utils.querysets import with_test_tree
+from core.utils.speechace_eval import evaluate_speaking
+
+
+# Los conteos de consultas miden el trabajo sobre el contenido; con la cache
+# en la base (DatabaseCache) cada lectura de versión también sería una consulta
+LOCAL_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def build_listening_test(questions, options_per_question=4, vertical=1, blocks=1):
+    test = ListeningTest.objects.create(title="Listening", description="", vertical=vertical)
+    correct = {}
+    for b in range(blocks):
+        block = ListeningBlock.objects.create(test=test, instructions=f"B{b}")
+        for q in range(questions):
+            question = ListeningQuestion.objects.create(block=block, question_text=f"Q{q}")
+            for o in range(options_per_question):
+                option = ListeningOption.objects.create(question=question, option_text=f"O{o}", is_correct=o == 0)
+                if o == 0:
+                    correct[question.id] = option.id
+    return test, correct
+
+
+def build_reading_test(questions, options_per_question=4, vertical=1, blocks=1):
+    test = ReadingTest.objects.create(title="Reading", description="", vertical=vertical)
+    correct = {}
+    for b in range(blocks):
+        block = ReadingBlock.objects.create(reading_test=test, title=f"B{b}", content="")
+        for q in range(questions):
+            question = ReadingQuestion.objects.create(reading_block=block, question_text=f"Q{q}")
+            for o in range(options_per_question):
+                option = ReadingOption.objects.create(question=question, option_text=f"O{o}", is_correct=o == 0)
+                if o == 0:
+                    correct[question.id] = option.id
+    return test, correct
+
+
+def build_writing_test(blocks, vertical=1):
+    test = WritingTest.objects.create(title="Writing", description="", vertical=vertical)
+    WritingBlock.objects.bulk_create(
+        WritingBlock(writing_test=test, text=f"T{b}", instruction="", example="") for b in range(blocks)
+    )
+    return test
+
+
+def build_speaking_test(blocks, vertical=1):
+    test = SpeakingTest.objects.create(title="Speaking", description="", vertical=vertical)
+    SpeakingBlock.objects.bulk_create(
+        SpeakingBlock(speaking_test=test, text=f"T{b}", instruction="", example="") for b in range(blocks)
+    )
+    return test
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class SubmitAnswersGradingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        answer_keys.clear()
+        self.profile = UserProfile.objects.create(email="candidate@example.com", vertical=1)
+
+    def submit(self, section, test, answers):
+        return self.client.post(
+            f"/api/{section}/tests/{test.id}/submit_answers/",
+            {"user_email": self.profile.email, "answers": answers},
+            content_type="application/json",
+        )
+
+    def test_listening_grades_answers_and_returns_breakdown(self):
+        test, correct = build_listening_test(4)
+        question_ids = list(correct)
+        answers = {
+            str(question_ids[0]): correct[question_ids[0]],
+            str(question_ids[1]): correct[question_ids[1]] + 1,
+            # Opción correcta de otra pregunta: no cuenta
+            str(question_ids[2]): correct[question_ids[3]],
+        }
+
+        response = self.submit("listening", test, answers)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["total_questions"], 4)
+        self.assertEqual(data["correct_answers"], 1)
+        self.assertEqual(data["score"], 25)
+        self.assertEqual(data["question_results"], {
+            str(question_ids[0]): True,
+            str(question_ids[1]): False,
+            str(question_ids[2]): False,
+            str(question_ids[3]): False,
+        })
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.resultado_listening, 25)
+
+    def test_reading_grades_answers(self):
+        test, correct = build_reading_test(2)
+        answers = {str(question_id): option_id for question_id, option_id in correct.items()}
+
+        response = self.submit("reading", test, answers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["score"], 100)
+
+    def test_query_count_does_not_depend_on_test_size(self):
+        for section, build in (("listening", build_listening_test), ("reading", build_reading_test)):
+            small, small_correct = build(2)
+            large, large_correct = build(40)
+            with self.subTest(section=section):
+                # Clave de respuestas + perfil + relectura bloqueada y UPDATE del
+                # resultado + INSERT del historial + INSERT del cambio para los
+                # rollups, con los savepoints; ningún lock sobre los rollups
+                for test, correct in ((small, small_correct), (large, large_correct)):
+                    self.profile = UserProfile.objects.create(email=f"{section}{test.id}@example.com", vertical=1)
+                    with self.assertNumQueries(8):
+                        self.submit(section, test, {str(q): o for q, o in correct.items()})
+
+    def test_cached_answer_key_needs_no_content_queries(self):
+        test, correct = build_listening_test(10)
+        answers = {str(q): o for q, o in correct.items()}
+        self.submit("listening", test, answers)
+
+        # Solo perfil + relectura bloqueada y UPDATE del resultado + INSERT del
+        # historial (y savepoint)
+        with self.assertNumQueries(6):
+            response = self.submit("listening", test, answers)
+        self.assertEqual(response.json()["score"], 100)
+        self.assertGreater(answer_keys.stats()["local_hits"], 0)
+
+    def test_answer_key_is_invalidated_when_content_changes(self):
+        test, correct = build_listening_test(2)
+        answers = {str(q): o for q, o in correct.items()}
+        self.assertEqual(self.submit("listening", test, answers).json()["score"], 100)
+
+        option = ListeningOption.objects.get(pk=next(iter(correct.values())))
+        option.is_correct = False
+        option.save()
+        self.assertEqual(self.submit("listening", test, answers).json()["score"], 50)
+
+        ListeningQuestion.objects.filter(pk=option.question_id).first().delete()
+        data = self.submit("listening", test, answers).json()
+        self.assertEqual((data["total_questions"], data["score"]), (1, 100))
+
+    def test_unknown_test_returns_404(self):
+        response = self.client.post(
+            "/api/listening/tests/999999/submit_answers/",
+            {"user_email": self.profile.email, "answers": {}},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_writing_submit_does_not_load_test_tree(self):
+        test = build_writing_test(5)
+        criterios = json.dumps({"clarity_and_coherence": 80, "verb_tenses": 60,
+                                "technical_vocabulary": 70, "conciseness": 90})
+
+        def submit(test_id):
+            return self.client.post(
+                f"/api/writing/tests/{test_id}/submit_answers/",
+                {"user_email": self.profile.email, "texto": "Some text"},
+                content_type="application/json",
+            )
+
+        with mock.patch("core.viewsets.writing_viewsets.evaluate_writing", return_value=criterios), \
+                CaptureQueriesContext(connection) as queries:
+            response = submit(test.id)
+        self.assertEqual(response.json()["score"], 75)
+        self.assertFalse([q for q in queries.captured_queries if "core_writingblock" in q["sql"]])
+        with quiet():
+            self.assertEqual(submit(999999).status_code, 404)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TestTreeQueryCountTests(TestCase):
+    """
+    Fija el número de consultas de list/retrieve sin importar cuántos tests,
+    bloques, preguntas u opciones haya: en frío se arma el árbol con una
+    consulta por nivel y se guarda el snapshot; después solo se lee el snapshot.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.listening = [build_listening_test(6, blocks=3)[0] for _ in range(4)]
+        cls.reading = [build_reading_test(6, blocks=3)[0] for _ in range(4)]
+        cls.writing = [build_writing_test(5) for _ in range(4)]
+        cls.speaking = [build_speaking_test(5) for _ in range(4)]
+        # Tests de otra vertical que el filtro debe excluir
+        build_listening_test(2, vertical=2)
+        build_writing_test(2, vertical=2)
+
+    def assert_queries(self, url, cold, warm):
+        # Sin versiones en cache todos los snapshots quedan viejos
+        cache.clear()
+        with self.assertNumQueries(cold):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(warm):
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, response.content)
+        return response.json()
+
+    def test_listening(self):
+        data = self.assert_queries("/api/listening/tests/?vertical=1", 7, 2)
+        self.assertEqual([t["id"] for t in data], [t.id for t in self.listening])
+        self.assertEqual(sum(len(b["questions"]) for t in data for b in t["blocks"]), 4 * 3 * 6)
+
+        test = self.assert_queries(f"/api/listening/tests/{self.listening[1].id}/", 6, 1)
+        block_ids = [b["id"] for b in test["blocks"]]
+        self.assertEqual(block_ids, sorted(block_ids))
+        # Conteo de preguntas + una consulta por nivel; luego sale de la cache
+        with self.assertNumQueries(5):
+            self.client.get(f"/api/listening/tests/{self.listening[0].id}/legacy_format/")
+        with self.assertNumQueries(0):
+            self.client.get(f"/api/listening/tests/{self.listening[0].id}/legacy_format/")
+
+    def test_reading(self):
+        data = self.assert_queries("/api/reading/tests/?vertical=1", 7, 2)
+        self.assertEqual(len(data), 4)
+        self.assertEqual(sum(len(q["options"]) for t in data for b in t["reading_blocks"] for q in b["questions"]), 4 * 3 * 6 * 4)
+
+        test = self.assert_queries(f"/api/reading/tests/{self.reading[1].id}/", 6, 1)
+        block_ids = [b["id"] for b in test["reading_blocks"]]
+        self.assertEqual(block_ids, sorted(block_ids))
+
+    def test_writing(self):
+        data = self.assert_queries("/api/writing/tests/?vertical=1", 5, 2)
+        self.assertEqual([len(t["writing_blocks"]) for t in data], [5] * 4)
+        self.assert_queries(f"/api/writing/tests/{self.writing[1].id}/", 4, 1)
+
+    def test_speaking(self):
+        data = self.assert_queries("/api/speaking/tests/?vertical=1", 5, 2)
+        self.assertEqual([len(t["speaking_blocks"]) for t in data], [5] * 4)
+        self.assert_queries(f"/api/speaking/tests/{self.speaking[1].id}/", 4, 1)
+
+    def test_query_count_does_not_grow_with_fixture_size(self):
+        for _ in range(10):
+            build_listening_test(8, blocks=4)
+        self.assert_queries("/api/listening/tests/", 7, 2)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TestSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.test, self.correct = build_listening_test(3, blocks=2)
+
+    def test_snapshot_matches_live_serializer(self):
+        response = self.client.get(f"/api/listening/tests/{self.test.id}/")
+        live = ListeningTestSerializer(with_test_tree('listening', ListeningTest.objects.all()).get(pk=self.test.id)).data
+        self.assertEqual(response.json(), json.loads(json.dumps(live)))
+        self.assertEqual(TestSnapshot.objects.filter(section='listening', test_id=self.test.id).count(), 1)
+
+    def test_content_change_rebuilds_snapshot(self):
+        self.client.get(f"/api/listening/tests/{self.test.id}/")
+        ListeningQuestion.objects.filter(pk=next(iter(self.correct))).update(question_text="x")
+        # update() no dispara señales: sigue sirviendo el snapshot
+        data = self.client.get(f"/api/listening/tests/{self.test.id}/").json()
+        self.assertEqual(data["blocks"][0]["questions"][0]["question_text"], "Q0")
+
+        question = ListeningQuestion.objects.get(pk=next(iter(self.correct)))
+        question.question_text = "Editada"
+        question.save()
+        data = self.client.get(f"/api/listening/tests/{self.test.id}/").json()
+        self.assertEqual(data["blocks"][0]["questions"][0]["question_text"], "Editada")
+
+    def test_deleted_test_returns_404_and_drops_snapshot(self):
+        self.client.get(f"/api/listening/tests/{self.test.id}/")
+        test_id = self.test.id
+        self.test.delete()
+        self.assertEqual(self.client.get(f"/api/listening/tests/{test_id}/").status_code, 404)
+        self.assertEqual(self.client.get("/api/listening/tests/").json(), [])
+        self.assertFalse(TestSnapshot.objects.filter(section='listening', test_id=test_id).exists())
+
+    def test_rebuild_snapshots_command(self):
+        build_writing_test(2)
+        call_command('rebuild_snapshots', stdout=io.StringIO())
+        self.assertEqual(
+            sorted(TestSnapshot.objects.values_list('section', 'variant')),
+            [('listening', 'candidate'), ('listening', 'full'), ('writing', 'candidate'), ('writing', 'full')]
+        )
+        with self.assertNumQueries(1):
+            self.client.get(f"/api/listening/tests/{self.test.id}/")
+
+
+class CandidatePayloadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.listening, self.correct = build_listening_test(3, blocks=2)
+        self.reading = build_reading_test(2)[0]
+        build_listening_test(1, vertical=2)
+
+    def test_candidate_payload_omits_answer_key(self):
+        response = self.client.get(f"/api/listening/tests/{self.listening.id}/candidate/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b"is_correct", response.content)
+        self.assertNotIn(b"vertical_display", response.content)
+        self.assertIn("public", response["Cache-Control"])
+
+        data = response.json()
+        self.assertEqual(data["id"], self.listening.id)
+        block_ids = [b["id"] for b in data["b"]]
+        self.assertEqual(block_ids, sorted(block_ids))
+        question = data["b"][0]["q"][0]
+        self.assertEqual(set(question), {"id", "x", "k", "o"})
+        self.assertEqual(set(question["o"][0]), {"id", "x"})
+        self.assertEqual(len(data["b"][0]["q"][0]["o"]), 4)
+
+        # Más chico que la representación completa
+        full = self.client.get(f"/api/listening/tests/{self.listening.id}/")
+        self.assertLess(len(response.content), len(full.content))
+        self.assertIn(b"is_correct", full.content)
+
+    def test_candidate_list_filters_by_vertical(self):
+        data = self.client.get("/api/listening/tests/candidate/?vertical=1").json()
+        self.assertEqual([t["id"] for t in data], [self.listening.id])
+
+        reading = self.client.get("/api/reading/tests/candidate/").json()
+        self.assertEqual(reading[0]["b"][0]["t"], "B0")
+        self.assertNotIn("is_correct", json.dumps(reading))
+
+    def test_candidate_payload_follows_content_changes(self):
+        self.client.get(f"/api/listening/tests/{self.listening.id}/candidate/")
+        option = ListeningOption.objects.get(pk=next(iter(self.correct.values())))
+        option.option_text = "Nueva"
+        option.save()
+        data = self.client.get(f"/api/listening/tests/{self.listening.id}/candidate/").json()
+        self.assertEqual(data["b"][0]["q"][0]["o"][0]["x"], "Nueva")
+
+    def test_unknown_test_returns_404(self):
+        response = self.client.get("/api/listening/tests/999999/candidate/")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("Cache-Control", response)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.test, self.correct = build_listening_test(2)
+        self.other = build_listening_test(1, vertical=2)[0]
+
+    def revalidate(self, url, response, expected_queries=0):
+        with self.assertNumQueries(expected_queries):
+            return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_detail_returns_304_without_queries(self):
+        url = f"/api/listening/tests/{self.test.id}/"
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first["ETag"].startswith('"'))
+        self.assertIn("Last-Modified", first)
+
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second.content, b"")
+
+    def test_content_change_changes_etag(self):
+        url = f"/api/listening/tests/{self.test.id}/"
+        first = self.client.get(url)
+        option = ListeningOption.objects.get(pk=next(iter(self.correct.values())))
+        option.option_text = "Cambio"
+        option.save()
+
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second["ETag"], first["ETag"])
+
+    def test_list_version_is_per_vertical(self):
+        url = "/api/listening/tests/?vertical=1"
+        first = self.client.get(url)
+        self.other.title = "Otra vertical"
+        self.other.save()
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        self.test.title = "Editado"
+        self.test.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+    def test_moving_a_test_invalidates_both_verticals(self):
+        url_1 = "/api/listening/tests/?vertical=1"
+        url_2 = "/api/listening/tests/?vertical=2"
+        first_1 = self.client.get(url_1)
+        first_2 = self.client.get(url_2)
+
+        self.test.vertical = 2
+        self.test.save()
+
+        self.assertEqual(self.client.get(url_1, HTTP_IF_NONE_MATCH=first_1["ETag"]).json(), [])
+        moved = self.client.get(url_2, HTTP_IF_NONE_MATCH=first_2["ETag"])
+        self.assertEqual(len(moved.json()), 2)
+
+    def test_vertical_param_is_normalized(self):
+        urls = ["/api/listening/tests/?vertical=01", "/api/listening/tests/?vertical=%201"]
+        first = [self.client.get(url) for url in urls]
+        self.assertEqual([len(response.json()) for response in first], [1, 1])
+
+        self.test.title = "Editado"
+        self.test.save()
+        for url, response in zip(urls, first):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(again.status_code, 200)
+            self.assertEqual(again.json()[0]["title"], "Editado")
+
+        self.assertEqual(self.client.get("/api/listening/tests/?vertical=uno").status_code, 400)
+
+    def test_candidate_and_full_have_different_etags(self):
+        full = self.client.get(f"/api/listening/tests/{self.test.id}/")
+        candidate = self.client.get(f"/api/listening/tests/{self.test.id}/candidate/")
+        self.assertNotEqual(full["ETag"], candidate["ETag"])
+        self.assertEqual(self.revalidate(f"/api/listening/tests/{self.test.id}/candidate/", candidate).status_code, 304)
+
+    def test_block_detail_uses_its_test_version(self):
+        url = f"/api/listening/blocks/{self.test.blocks.first().id}/"
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        # Una consulta para ubicar el test del bloque, sin prefetch ni serializer
+        self.assertEqual(self.revalidate(url, first, expected_queries=1).status_code, 304)
+
+        self.other.title = "Otro test"
+        self.other.save()
+        self.assertEqual(self.revalidate(url, first, expected_queries=1).status_code, 304)
+
+        option = ListeningOption.objects.get(pk=next(iter(self.correct.values())))
+        option.option_text = "Cambio"
+        option.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+        self.assertEqual(self.client.get("/api/listening/blocks/999999/").status_code, 404)
+
+    def test_nested_routes_and_if_modified_since(self):
+        url = f"/api/listening/questions/?block_id={self.test.blocks.first().id}"
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+        ListeningQuestion.objects.create(block=self.test.blocks.first(), question_text="Nueva")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 200)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class DiagnosticBundleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.listening = build_listening_test(2)[0]
+        self.reading = build_reading_test(2)[0]
+        self.writing = build_writing_test(2)
+        self.speaking = build_speaking_test(2)
+        build_listening_test(1, vertical=2)
+
+    def test_bundle_matches_the_four_list_endpoints(self):
+        data = self.client.get("/api/diagnostic/1/").json()
+        self.assertEqual(data["vertical"], 1)
+        for section in ("listening", "reading", "writing", "speaking"):
+            self.assertEqual(data[section], self.client.get(f"/api/{section}/tests/?vertical=1").json())
+
+    def test_warm_bundle_and_revalidation_need_no_queries(self):
+        first = self.client.get("/api/diagnostic/1/")
+        with self.assertNumQueries(0):
+            again = self.client.get("/api/diagnostic/1/")
+        self.assertEqual(again.content, first.content)
+        with self.assertNumQueries(0):
+            revalidated = self.client.get("/api/diagnostic/1/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_content_change_invalidates_only_its_vertical(self):
+        first = self.client.get("/api/diagnostic/1/")
+        other = self.client.get("/api/diagnostic/2/")
+
+        self.speaking.title = "Editado"
+        self.speaking.save()
+
+        self.assertEqual(self.client.get("/api/diagnostic/2/", HTTP_IF_NONE_MATCH=other["ETag"]).status_code, 304)
+        response = self.client.get("/api/diagnostic/1/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["speaking"][0]["title"], "Editado")
+
+    def test_candidate_variant_and_validation(self):
+        candidate = self.client.get("/api/diagnostic/1/?variant=candidate")
+        self.assertNotIn(b"is_correct", candidate.content)
+        self.assertIn("public", candidate["Cache-Control"])
+        self.assertEqual(self.client.get("/api/diagnostic/4/").status_code, 404)
+        self.assertEqual(self.client.get("/api/diagnostic/1/?variant=x").status_code, 400)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class LegacyFormatTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.test, self.correct = build_listening_test(3, blocks=3)
+        self.url = f"/api/listening/tests/{self.test.id}/legacy_format/"
+
+    def test_format_and_answers_only_for_staff(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(list(data), ["id", "title", "description", "vertical", "blocks"])
+        block = data["blocks"][0]
+        self.assertEqual(list(block), ["id", "instructions", "video_url", "questions"])
+        self.assertEqual(list(block["questions"][0]), ["id", "text", "type", "options"])
+        self.assertEqual({o["is_correct"] for b in data["blocks"] for q in b["questions"] for o in q["options"]}, {None})
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        staff = self.client.get(self.url).json()
+        correct = [o["id"] for b in staff["blocks"] for q in b["questions"] for o in q["options"] if o["is_correct"]]
+        self.assertEqual(sorted(correct), sorted(self.correct.values()))
+
+    def test_streamed_output_matches_cached_output(self):
+        # Sin cache se envía por partes; con la salida ya cacheada se usa esa
+        streamed = self.client.get(self.url + "?stream=1")
+        self.assertTrue(streamed.streaming)
+        cached = self.client.get(self.url)
+        self.assertFalse(cached.streaming)
+        self.assertEqual(b"".join(streamed.streaming_content), cached.content)
+
+    @override_settings(LEGACY_FORMAT_STREAM_THRESHOLD=5)
+    def test_large_tests_are_streamed(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(json.loads(b"".join(response.streaming_content))["blocks"]), 3)
+
+    @override_settings(LEGACY_FORMAT_STREAM_THRESHOLD=100)
+    def test_streamed_output_below_threshold_is_cached(self):
+        test, _ = build_listening_test(2, blocks=45)
+        url = f"/api/listening/tests/{test.id}/legacy_format/?stream=1"
+        # Test, bloques, y preguntas y opciones por cada grupo de 20 bloques
+        with self.assertNumQueries(2 + 2 * 3):
+            streamed = b"".join(self.client.get(url).streaming_content)
+        self.assertEqual(len(json.loads(streamed)["blocks"]), 45)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertFalse(cached.streaming)
+        self.assertEqual(cached.content, streamed)
+
+    @override_settings(LEGACY_FORMAT_STREAM_THRESHOLD=5)
+    def test_large_streamed_output_is_not_cached(self):
+        first = b"".join(self.client.get(self.url).streaming_content)
+        again = self.client.get(self.url)
+        self.assertTrue(again.streaming)
+        self.assertEqual(b"".join(again.streaming_content), first)
+        version = content_cache.content_version("listening", self.test.id)
+        self.assertIsNone(legacy_format.get_cached_payload(self.test.id, False, version))
+
+    @override_settings(LEGACY_FORMAT_STREAM_THRESHOLD=5)
+    def test_stream_decision_is_cached_per_version(self):
+        version = content_cache.content_version("listening", self.test.id)
+        self.assertTrue(legacy_format.should_stream(self.test.id, version))
+        with self.assertNumQueries(0):
+            self.assertTrue(legacy_format.should_stream(self.test.id, version))
+
+        ListeningQuestion.objects.filter(block__test=self.test).first().delete()
+        version = content_cache.content_version("listening", self.test.id)
+        with self.assertNumQueries(1):
+            self.assertTrue(legacy_format.should_stream(self.test.id, version))
+
+    def test_cached_output_follows_content_changes(self):
+        self.client.get(self.url)
+        question = ListeningQuestion.objects.get(pk=next(iter(self.correct)))
+        question.question_text = "Editada"
+        question.save()
+        self.assertEqual(self.client.get(self.url).json()["blocks"][0]["questions"][0]["text"], "Editada")
+        self.assertEqual(self.client.get("/api/listening/tests/999999/legacy_format/").status_code, 404)
+
+
+class UserProfileListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        expired = timezone.now() - timedelta(days=DIAS_BLOQUEO + 1)
+        cls.profiles = [
+            UserProfile.objects.create(
+                email=f"user{i}@example.com", vertical=1,
+                intentos_realizados=MAX_INTENTOS, fecha_bloqueo=expired
+            )
+            for i in range(5)
+        ]
+
+    def test_list_is_one_select_and_never_writes(self):
+        with self.assertNumQueries(1):
+            data = self.client.get("/api/users/?page_size=2").json()
+        self.assertEqual([p["id"] for p in data["results"]], [p.id for p in self.profiles[::-1][:2]])
+        self.assertTrue(all(p["puede_intentar_test"] for p in data["results"]))
+        # El bloqueo vencido se informa sin reiniciarlo en la base
+        self.assertEqual(
+            set(UserProfile.objects.values_list("intentos_realizados", flat=True)), {MAX_INTENTOS}
+        )
+
+        ids = []
+        url = "/api/users/?page_size=2"
+        while url:
+            page = self.client.get(url).json()
+            ids.extend(p["id"] for p in page["results"])
+            url = page["next"]
+        self.assertEqual(ids, sorted((p.id for p in self.profiles), reverse=True))
+
+    def test_sparse_fieldset(self):
+        data = self.client.get("/api/users/?fields=id,email,puede_intentar_test").json()
+        self.assertEqual(list(data["results"][0]), ["id", "email", "puede_intentar_test"])
+        self.assertEqual(self.client.get("/api/users/?fields=id,password").status_code, 400)
+
+    def test_email_filter_returns_plain_list(self):
+        data = self.client.get("/api/users/?email=user1@example.com").json()
+        self.assertEqual([p["email"] for p in data], ["user1@example.com"])
+
+
+class AttemptLockExpiryTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.expired = UserProfile.objects.create(
+            email="expired@example.com", vertical=1,
+            intentos_realizados=MAX_INTENTOS, fecha_bloqueo=now - timedelta(days=DIAS_BLOQUEO, minutes=1)
+        )
+        self.locked = UserProfile.objects.create(
+            email="locked@example.com", vertical=1,
+            intentos_realizados=MAX_INTENTOS, fecha_bloqueo=now - timedelta(hours=1)
+        )
+        self.free = UserProfile.objects.create(email="free@example.com", vertical=1, intentos_realizados=1)
+
+    def test_annotation_matches_model_rule(self):
+        rows = UserProfile.objects.with_intento_habilitado()
+        for profile in rows:
+            self.assertEqual(profile.intento_habilitado, profile.puede_intentar())
+        self.assertEqual(
+            set(UserProfile.objects.habilitados().values_list("email", flat=True)),
+            {"expired@example.com", "free@example.com"}
+        )
+        self.assertEqual(list(UserProfile.objects.bloqueados().values_list("email", flat=True)), ["locked@example.com"])
+
+    def test_expiry_is_one_update(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(UserProfile.objects.expirar_bloqueos(), 1)
+        self.expired.refresh_from_db()
+        self.assertEqual((self.expired.intentos_realizados, self.expired.fecha_bloqueo), (0, None))
+        self.locked.refresh_from_db()
+        self.assertEqual(self.locked.intentos_realizados, MAX_INTENTOS)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command("expire_attempt_locks", "--dry-run", stdout=out)
+        self.assertIn("1 bloqueos vencidos", out.getvalue())
+        self.assertEqual(UserProfile.objects.bloqueo_vencido().count(), 1)
+        call_command("expire_attempt_locks", stdout=out)
+        self.assertEqual(UserProfile.objects.bloqueo_vencido().count(), 0)
+
+
+class RegisterAttemptTests(TestCase):
+    def setUp(self):
+        self.profile = UserProfile.objects.create(email="candidate@example.com", vertical=1)
+
+    def register(self):
+        with mock.patch("core.authentication.verify_jwt", return_value={"email": self.profile.email}), \
+                mock.patch("core.authentication.get_email_from_token", return_value=self.profile.email):
+            return self.client.post("/api/users/register-attempt/", HTTP_AUTHORIZATION="Bearer token")
+
+    def test_registers_until_locked(self):
+        for expected in range(1, MAX_INTENTOS + 1):
+            data = self.register().json()
+            self.assertEqual(data["intentos_realizados"], expected)
+        self.assertTrue(data["bloqueado"])
+
+        self.profile.refresh_from_db()
+        response = self.register()
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(
+            response.json()["fecha_desbloqueo"],
+            (self.profile.fecha_bloqueo + timedelta(days=DIAS_BLOQUEO)).date().isoformat()
+        )
+
+    def test_expired_lock_starts_over(self):
+        UserProfile.objects.filter(pk=self.profile.pk).update(
+            intentos_realizados=MAX_INTENTOS, fecha_bloqueo=timezone.now() - timedelta(days=DIAS_BLOQUEO + 1)
+        )
+        self.assertEqual(UserProfile.objects.registrar_intento(self.profile.pk), (1, None))
+        # Un solo UPDATE que toca solo las columnas del intento
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(UserProfile.objects.registrar_intento(self.profile.pk)[0], 2)
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn("resultado_general", updates[0])
+
+
+class RegisterAttemptConcurrencyTests(TransactionTestCase):
+    def test_parallel_registrations_are_exact(self):
+        profile = UserProfile.objects.create(email="parallel@example.com", vertical=1)
+        results = []
+        barrier = threading.Barrier(12)
+
+        def register():
+            try:
+                barrier.wait()
+                for _ in range(5):
+                    while True:
+                        try:
+                            results.append(UserProfile.objects.registrar_intento(profile.pk))
+                            break
+                        except OperationalError:
+                            # SQLite rechaza escrituras simultáneas en lugar de esperar
+                            time.sleep(0.001)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=register) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        accepted = sorted(result[0] for result in results if result is not None)
+        self.assertEqual(len(results), 60)
+        self.assertEqual(accepted, list(range(1, MAX_INTENTOS + 1)))
+        profile.refresh_from_db()
+        self.assertEqual(profile.intentos_realizados, MAX_INTENTOS)
+        self.assertIsNotNone(profile.fecha_bloqueo)
+
+
+class ProfileResultWriteTests(TestCase):
+    def setUp(self):
+        self.profile = UserProfile.objects.create(
+            email="writer@example.com", vertical=1,
+            resultado_listening=50, resultado_speaking=60, resultado_reading=70,
+        )
+
+    def capture_update(self, fn):
+        with CaptureQueriesContext(connection) as queries:
+            fn()
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith('UPDATE "core_userprofile"')]
+        self.assertEqual(len(updates), 1)
+        return updates[0].split(" WHERE ")[0]
+
+    def test_section_result_writes_only_derived_columns(self):
+        update = self.capture_update(lambda: self.profile.registrar_resultado("writing", 80))
+        for column in ("resultado_writing", "resultado_general", "nivel", "fecha_actualizacion"):
+            self.assertIn(f'"{column}"', update)
+        for column in ("resultado_listening", "email", "intentos_realizados"):
+            self.assertNotIn(f'"{column}"', update)
+
+        self.profile.refresh_from_db()
+        expected = UserProfile(
+            resultado_listening=50, resultado_speaking=60, resultado_reading=70, resultado_writing=80
+        )
+        expected.calcular_resultado_general()
+        self.assertEqual((self.profile.resultado_general, self.profile.nivel), (expected.resultado_general, expected.nivel))
+
+    def test_interleaved_section_writes_use_fresh_results(self):
+        profile = UserProfile.objects.create(
+            email="interleaved@example.com", vertical=1, resultado_listening=50,
+            resultado_speaking=50, resultado_reading=50, resultado_writing=50,
+        )
+        # Dos requests cargan el mismo perfil y guardan secciones distintas
+        first = UserProfile.objects.get(pk=profile.pk)
+        second = UserProfile.objects.get(pk=profile.pk)
+        first.registrar_resultado("listening", 95)
+        second.registrar_resultado("reading", 95)
+
+        profile.refresh_from_db()
+        self.assertEqual((profile.resultado_listening, profile.resultado_reading), (95, 95))
+        self.assertAlmostEqual(profile.resultado_general, 0.4 * 95 + 0.4 * 50 + 0.1 * 95 + 0.1 * 50)
+        self.assertEqual(profile.nivel, "intermediate")
+        self.assertEqual(second.resultado_listening, 95)
+
+        # save(update_fields=...) sigue la misma regla
+        first.resultado_writing = 95
+        first.save(update_fields=["resultado_writing"])
+        profile.refresh_from_db()
+        self.assertAlmostEqual(profile.resultado_general, 0.4 * 95 + 0.4 * 50 + 0.1 * 95 + 0.1 * 95)
+
+    def test_update_fields_without_results_skips_recalculation(self):
+        UserProfile.objects.filter(pk=self.profile.pk).update(resultado_writing=80)
+        self.profile.name = "Nuevo"
+        update = self.capture_update(lambda: self.profile.save(update_fields=["name"]))
+        self.assertNotIn("resultado_general", update)
+
+    def test_submit_answers_uses_targeted_update(self):
+        test, correct = build_listening_test(2)
+        answers = {str(question_id): option_id for question_id, option_id in correct.items()}
+        update = self.capture_update(lambda: self.client.post(
+            f"/api/listening/tests/{test.id}/submit_answers/",
+            {"user_email": self.profile.email, "answers": answers},
+            content_type="application/json",
+        ))
+        self.assertNotIn('"email"', update)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.resultado_listening, 100)
+
+
+class HistoryTests(TestCase):
+    def setUp(self):
+        self.profile = UserProfile.objects.create(email="history@example.com", vertical=2)
+
+    def test_submits_append_section_results(self):
+        test, correct = build_listening_test(3)
+        answers = {str(question_id): option_id for question_id, option_id in correct.items()}
+        answers[str(next(iter(correct)))] = None
+        for _ in range(2):
+            self.client.post(
+                f"/api/listening/tests/{test.id}/submit_answers/",
+                {"user_email": self.profile.email, "answers": answers},
+                content_type="application/json",
+            )
+
+        results = list(SectionResult.objects.filter(profile=self.profile).order_by("id"))
+        self.assertEqual(len(results), 2)
+        latest = results[-1]
+        self.assertEqual((latest.section, latest.test_id, latest.vertical), ("listening", test.id, 2))
+        self.assertEqual(latest.detail, {"correct": 2, "total": 3, "wrong": [next(iter(correct))]})
+        self.assertAlmostEqual(latest.score, 200 / 3)
+
+        with self.assertRaises(ValueError):
+            latest.save()
+
+    def test_register_attempt_appends_attempt(self):
+        with mock.patch("core.authentication.verify_jwt", return_value={"email": self.profile.email}), \
+                mock.patch("core.authentication.get_email_from_token", return_value=self.profile.email):
+            for _ in range(MAX_INTENTOS + 1):
+                self.client.post("/api/users/register-attempt/", HTTP_AUTHORIZATION="Bearer token")
+
+        # El intento rechazado no queda registrado
+        attempts = TestAttempt.objects.filter(profile=self.profile).order_by("id")
+        self.assertEqual([a.attempt_number for a in attempts], list(range(1, MAX_INTENTOS + 1)))
+        self.assertEqual({a.vertical for a in attempts}, {2})
+
+
+class ResultRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def assert_consistent(self):
+        rollups.apply_pending()
+        self.assertEqual(rollups.compare(rollups.stored_deltas(), rollups.live_deltas()), [])
+
+    def test_rollups_follow_profile_changes(self):
+        complete = UserProfile.objects.create(
+            email="complete@example.com", vertical=5,
+            resultado_listening=90, resultado_speaking=85, resultado_reading=70, resultado_writing=100,
+        )
+        partial = UserProfile.objects.create(email="partial@example.com", vertical=5, resultado_listening=40)
+        other = UserProfile.objects.create(email="other@example.com", vertical=2)
+        self.assert_consistent()
+
+        # Cambio de nivel: el perfil pasa de una fila a otra
+        complete = UserProfile.objects.get(pk=complete.pk)
+        complete.registrar_resultado("speaking", 10)
+        partial.registrar_resultado("writing", 55)
+        UserProfile.objects.get(pk=other.pk).delete()
+        self.assert_consistent()
+
+        # Calificación masiva (bulk_update, sin save())
+        rollups_before = rollups.stored_deltas()
+        write_results("listening", {"partial@example.com": 100.0, "complete@example.com": 20.0})
+        self.assert_consistent()
+        self.assertNotEqual(rollups.stored_deltas(), rollups_before)
+        self.assertFalse(ResultRollup.objects.filter(vertical=2).exists())
+
+    def test_interleaved_saves_do_not_drift(self):
+        profile = UserProfile.objects.create(
+            email="interleaved@example.com", vertical=5, resultado_listening=50,
+            resultado_speaking=50, resultado_reading=50, resultado_writing=50,
+        )
+        # Instancias cargadas antes de los cambios de las demás
+        first, second, third, fourth = (UserProfile.objects.get(pk=profile.pk) for _ in range(4))
+        first.registrar_resultado("listening", 95)
+        second.registrar_resultado("reading", 95)
+        self.assert_consistent()
+
+        # Un save() completo escribe todos los valores de su instancia
+        third.name = "Completo"
+        third.save()
+        self.assert_consistent()
+
+        # Bulk con la fila ya cambiada por save() desde otra instancia
+        fourth.registrar_resultado("speaking", 90)
+        write_results("listening", {profile.email: 10.0})
+        self.assert_consistent()
+        self.assertEqual(ResultRollup.objects.filter(vertical=5).get().profiles, 1)
+
+    def test_analytics_endpoint(self):
+        UserProfile.objects.create(
+            email="a@example.com", vertical=5,
+            resultado_listening=90, resultado_speaking=90, resultado_reading=90, resultado_writing=90,
+        )
+        UserProfile.objects.create(email="b@example.com", vertical=5, resultado_listening=30)
+        rollups.apply_pending()
+        url = "/api/analytics/verticals/5/"
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        data = self.client.get(url).json()
+        self.assertEqual(data["profiles"], 2)
+        self.assertEqual(data["niveles"], [{"nivel": None, "profiles": 1}, {"nivel": "advanced", "profiles": 1}])
+        self.assertEqual(data["sections"]["listening"]["count"], 2)
+        self.assertAlmostEqual(data["sections"]["listening"]["average"], 60)
+        self.assertEqual(data["sections"]["listening"]["histogram"][3], 1)
+        self.assertEqual(data["sections"]["general"]["count"], 1)
+
+        # Cacheado hasta el próximo cambio de la vertical: no lee los rollups
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse([q for q in queries.captured_queries if "core_resultrollup" in q["sql"]])
+        # El alta se ve cuando se aplica la cola
+        UserProfile.objects.create(email="c@example.com", vertical=5)
+        self.assertEqual(self.client.get(url).json()["profiles"], 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("apply_rollup_changes", stdout=io.StringIO())
+        self.assertEqual(self.client.get(url).json()["profiles"], 3)
+
+        self.assertEqual(self.client.get(url + "?from=2000-01-01&to=2000-12-31").json()["profiles"], 0)
+        self.assertEqual(self.client.get(url + "?from=ayer").status_code, 400)
+        self.assertEqual(self.client.get("/api/analytics/verticals/999/").status_code, 404)
+
+    def test_profile_writes_only_enqueue_changes(self):
+        profile = UserProfile.objects.create(email="a@example.com", vertical=5, resultado_listening=50)
+        rollups.apply_pending()
+        with CaptureQueriesContext(connection) as queries:
+            profile.registrar_resultado("reading", 70)
+        tables = " ".join(q["sql"] for q in queries.captured_queries)
+        self.assertNotIn("core_resultrollup", tables)
+        self.assertNotIn("core_scorehistogrambin", tables)
+        self.assertEqual(RollupChange.objects.count(), 1)
+
+        # Un cambio que no toca los rollups no encola nada
+        profile.name = "Sin cambios de estado"
+        profile.save()
+        self.assertEqual(RollupChange.objects.count(), 1)
+        self.assertEqual(rollups.apply_pending(), 1)
+        self.assertFalse(RollupChange.objects.exists())
+
+    def test_rebuild_absorbs_pending_changes(self):
+        UserProfile.objects.create(email="a@example.com", vertical=5, resultado_listening=50)
+        profile = UserProfile.objects.create(
+            email="b@example.com", vertical=5, resultado_listening=80,
+            resultado_speaking=80, resultado_reading=80, resultado_writing=80,
+        )
+        rollups.apply_pending()
+        # Cambios todavía en la cola al reconstruir: ya están en los datos vivos
+        profile.registrar_resultado("speaking", 20)
+        UserProfile.objects.create(email="c@example.com", vertical=2)
+        rollups.rebuild()
+        self.assertFalse(RollupChange.objects.exists())
+        self.assertEqual(rollups.compare(rollups.stored_deltas(), rollups.live_deltas()), [])
+        self.assertEqual(percentiles.reconcile(dry_run=True), {})
+
+    def test_rebuild_command_detects_and_repairs_drift(self):
+        UserProfile.objects.create(email="a@example.com", vertical=1, resultado_listening=50)
+        call_command("rebuild_rollups", "--check", stdout=io.StringIO())
+
+        ResultRollup.objects.update(profiles=99)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_rollups", "--check", stdout=io.StringIO())
+        out = io.StringIO()
+        call_command("rebuild_rollups", stdout=out)
+        self.assertIn("consistentes", out.getvalue())
+        self.assertEqual(ResultRollup.objects.get().profiles, 1)
+
+
+class PercentileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        percentiles.distributions.clear()
+
+    def create(self, email, vertical, score):
+        return UserProfile.objects.create(
+            email=email, vertical=vertical,
+            resultado_listening=score, resultado_speaking=score, resultado_reading=score, resultado_writing=score,
+        )
+
+    def stored(self):
+        rollups.apply_pending()
+        return {vertical: counts for vertical, counts in percentiles.stored_histograms().items() if any(counts)}
+
+    def test_histograms_follow_profile_changes(self):
+        first = self.create("a@example.com", 5, 40)
+        self.create("b@example.com", 5, 80)
+        self.create("c@example.com", 2, 55.55)
+        UserProfile.objects.create(email="d@example.com", vertical=5, resultado_listening=90)
+        self.assertEqual(self.stored(), percentiles.exact_histograms())
+        self.assertEqual(sum(percentiles.stored_counts(5)), 2)
+
+        first.registrar_resultado("speaking", 100)
+        UserProfile.objects.get(email="c@example.com").delete()
+        write_results("listening", {"b@example.com": 10.0})
+        self.assertEqual(self.stored(), percentiles.exact_histograms())
+        self.assertFalse(ScoreHistogramBin.objects.filter(vertical=2, count__gt=0).exists())
+
+    def test_rank(self):
+        for index, score in enumerate([20, 40, 40, 60, 80]):
+            self.create(f"u{index}@example.com", 5, score)
+        rollups.apply_pending()
+
+        data = percentiles.rank(5, 40)
+        self.assertEqual(data["total"], 5)
+        self.assertAlmostEqual(data["percentile"], 40)
+        self.assertAlmostEqual(data["top_percent"], 80)
+        self.assertAlmostEqual(percentiles.rank(5, 100)["percentile"], 100)
+        self.assertAlmostEqual(percentiles.rank(5, 0)["top_percent"], 100)
+        self.assertIsNone(percentiles.rank(3, 50)["percentile"])
+        self.assertEqual(percentiles.distributions.get(5).score_at(50), 40)
+
+        # Con la distribución en memoria no se consulta nada
+        with self.assertNumQueries(0):
+            for score in range(101):
+                percentiles.rank(5, score)
+
+        # El cambio se ve al aplicarse la cola
+        self.create("u9@example.com", 5, 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            rollups.apply_pending()
+        self.assertEqual(percentiles.rank(5, 40)["total"], 6)
+
+    def test_reconcile_fixes_drift(self):
+        self.create("a@example.com", 5, 70)
+        self.assertEqual(percentiles.reconcile(), {})
+        rollups.apply_pending()
+
+        ScoreHistogramBin.objects.filter(vertical=5).update(count=3)
+        ScoreHistogramBin.objects.create(vertical=5, bin=10, count=2)
+        out = io.StringIO()
+        call_command("reconcile_percentiles", "--dry-run", stdout=out)
+        self.assertIn("1 histogramas con diferencias", out.getvalue())
+        self.assertIn("vertical 5: 5 perfiles", out.getvalue())
+        call_command("reconcile_percentiles", stdout=io.StringIO())
+        self.assertEqual(self.stored(), percentiles.exact_histograms())
+        self.assertEqual(sum(percentiles.stored_counts(5)), 1)
+
+    def test_reconcile_writes_corrections_as_diffs(self):
+        self.create("a@example.com", 5, 70)
+        rollups.apply_pending()
+        ScoreHistogramBin.objects.filter(vertical=5, bin=700).update(count=4)
+        with CaptureQueriesContext(connection) as queries:
+            percentiles.reconcile()
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith('UPDATE "core_scorehistogrambin"')]
+        # Se corrige sumando la diferencia, no escribiendo el conteo absoluto
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"count" = ("core_scorehistogrambin"."count" + -3)', updates[0])
+        self.assertEqual(percentiles.stored_counts(5)[700], 1)
+
+    def test_updates_touch_only_changed_bins(self):
+        self.create("a@example.com", 5, 40)
+        profile = self.create("b@example.com", 5, 80)
+        rollups.apply_pending()
+        profile.registrar_resultado("writing", 60)
+        with CaptureQueriesContext(connection) as queries:
+            rollups.apply_pending()
+        updates = [q["sql"] for q in queries.captured_queries if q["sql"].startswith('UPDATE "core_scorehistogrambin"')]
+        # Un UPDATE con F() por tramo: sale del 80 y entra en el 78
+        self.assertEqual(len(updates), 2)
+        self.assertTrue(all('"count" = ("core_scorehistogrambin"."count"' in sql for sql in updates))
+        self.assertEqual(
+            dict(ScoreHistogramBin.objects.filter(vertical=5).values_list("bin", "count")),
+            {400: 1, 800: 0, 780: 1},
+        )
+
+    def test_reconcile_after_interleaved_saves(self):
+        profile = self.create("a@example.com", 5, 50)
+        first, second = UserProfile.objects.get(pk=profile.pk), UserProfile.objects.get(pk=profile.pk)
+        first.registrar_resultado("listening", 95)
+        second.registrar_resultado("reading", 95)
+        write_results("listening", {profile.email: 20.0})
+        self.assertEqual(percentiles.reconcile(dry_run=True), {})
+        self.assertEqual(self.stored(), percentiles.exact_histograms())
+
+    def test_percentile_endpoint(self):
+        self.create("a@example.com", 5, 50)
+        self.create("b@example.com", 5, 90)
+        rollups.apply_pending()
+        data = self.client.get("/api/percentile/5/?score=90").json()
+        self.assertEqual(data["total"], 2)
+        self.assertAlmostEqual(data["percentile"], 75)
+        self.assertAlmostEqual(data["top_percent"], 50)
+        self.assertEqual(self.client.get("/api/percentile/5/").status_code, 400)
+        self.assertEqual(self.client.get("/api/percentile/5/?score=101").status_code, 400)
+        self.assertEqual(self.client.get("/api/percentile/999/?score=50").status_code, 404)
+
+    def test_my_percentile(self):
+        profile = self.create("a@example.com", 5, 50)
+        self.create("b@example.com", 5, 90)
+        rollups.apply_pending()
+        with mock.patch("core.authentication.verify_jwt", return_value={"email": profile.email}), \
+                mock.patch("core.authentication.get_email_from_token", return_value=profile.email):
+            data = self.client.get("/api/users/me/percentile/", HTTP_AUTHORIZATION="Bearer token").json()
+        self.assertEqual(data["score"], 50)
+        self.assertAlmostEqual(data["percentile"], 25)
+
+
+class ResultsExportTests(TestCase):
+    url = "/api/exports/results/"
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        self.complete = UserProfile.objects.create(
+            email="a@example.com", name="Ana, B", vertical=5,
+            resultado_listening=90, resultado_speaking=90, resultado_reading=90, resultado_writing=90,
+        )
+        UserProfile.objects.create(email="b@example.com", vertical=5, resultado_listening=30)
+        UserProfile.objects.create(email="c@example.com", vertical=2)
+
+    def rows(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_export_with_filters(self):
+        text = self.rows(self.client.get(self.url))
+        records = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual([r["email"] for r in records], ["a@example.com", "b@example.com", "c@example.com"])
+        self.assertEqual(records[0]["name"], "Ana, B")
+        self.assertEqual(records[0]["nivel"], "advanced")
+        self.assertEqual(float(records[0]["resultado_general"]), 90)
+
+        records = list(csv.DictReader(io.StringIO(self.rows(self.client.get(self.url + "?vertical=5&nivel=advanced")))))
+        self.assertEqual([r["email"] for r in records], ["a@example.com"])
+
+        today = timezone.localdate()
+        response = self.client.get(self.url + f"?from={today}&to={today}")
+        self.assertEqual(len(list(csv.DictReader(io.StringIO(self.rows(response))))), 3)
+        response = self.client.get(self.url + f"?to={today - timedelta(days=1)}")
+        self.assertEqual(list(csv.DictReader(io.StringIO(self.rows(response)))), [])
+
+    def test_csv_escapes_formulas(self):
+        UserProfile.objects.create(email="@d@example.com", name='=HYPERLINK("x")', vertical=2)
+        UserProfile.objects.create(email="e@example.com", name="-1+2", vertical=2)
+        records = list(csv.DictReader(io.StringIO(self.rows(self.client.get(self.url + "?vertical=2")))))
+        self.assertEqual(
+            [(r["email"], r["name"]) for r in records],
+            [("c@example.com", ""), ("'@d@example.com", "'=HYPERLINK(\"x\")"), ("e@example.com", "'-1+2")],
+        )
+
+        # JSON Lines no se abre como planilla y conserva los valores
+        response = self.client.get(self.url + "?export_format=jsonl&vertical=2")
+        self.assertEqual(json.loads(self.rows(response).splitlines()[1])["name"], '=HYPERLINK("x")')
+
+    def test_jsonl_export(self):
+        response = self.client.get(self.url + "?export_format=jsonl&vertical=5")
+        lines = [json.loads(line) for line in self.rows(response).splitlines()]
+        self.assertEqual([line["email"] for line in lines], ["a@example.com", "b@example.com"])
+        self.assertEqual(lines[1]["resultado_listening"], 30)
+        self.assertIsNone(lines[1]["resultado_general"])
+
+    def test_reads_rows_in_chunks(self):
+        # La cabecera sale antes de consultar la base
+        rows = exports.export_queryset()
+        with self.assertNumQueries(0):
+            parts = exports.stream_results(rows, 'csv', chunk_size=2)
+            self.assertTrue(next(parts).startswith(b"id,email,name,vertical,vertical_nombre"))
+        self.assertEqual(len(list(parts)), 2)
+
+    def test_rejects_bad_filters(self):
+        self.assertEqual(self.client.get(self.url + "?export_format=xml").status_code, 400)
+        self.assertEqual(self.client.get(self.url + "?vertical=999").status_code, 400)
+        self.assertEqual(self.client.get(self.url + "?nivel=experto").status_code, 400)
+        self.assertEqual(self.client.get(self.url + "?from=ayer").status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_admin_action(self):
+        response = self.client.post("/admin/core/userprofile/", {
+            "action": "exportar_jsonl",
+            "_selected_action": [self.complete.pk],
+        })
+        lines = self.rows(response).splitlines()
+        self.assertEqual([json.loads(line)["email"] for line in lines], ["a@example.com"])
+
+
+def fake_response(status_code=200, data=None):
+    response = mock.Mock(status_code=status_code, text="")
+    response.json.return_value = data or {}
+    return response
+
+
+def jwks(*kids):
+    return {"keys": [{"kty": "RSA", "kid": kid, "use": "sig", "n": f"n-{kid}", "e": "AQAB"} for kid in kids]}
+
+
+class JWKSKeyStoreTests(TestCase):
+    def setUp(self):
+        self.clock = 1000.0
+        patcher = mock.patch("core.utils.auth0.time.monotonic", side_effect=lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = JWKSKeyStore(domain="tenant.example", ttl=600, min_refresh_interval=30)
+
+    def fetch(self, *kids):
+        return mock.patch("core.utils.auth0.http_client.get", return_value=fake_response(data=jwks(*kids)))
+
+    def test_keys_are_reused_until_ttl(self):
+        with self.fetch("a") as get:
+            self.assertEqual(self.store.get_key("a")["n"], "n-a")
+            self.clock += 599
+            self.store.get_key("a")
+            self.assertEqual(get.call_count, 1)
+
+            self.clock += 2
+            self.store.get_key("a")
+            self.assertEqual(get.call_count, 2)
+        self.assertEqual(self.store.stats(), {"hits": 1, "misses": 2, "fetches": 2, "keys": 1})
+
+    def test_unknown_kid_refreshes_at_most_once_per_interval(self):
+        with self.fetch("a"):
+            self.store.get_key("a")
+        with self.fetch("a", "b") as get:
+            # Recién descargado: un kid desconocido no fuerza otra descarga
+            self.assertIsNone(self.store.get_key("b"))
+            self.assertEqual(get.call_count, 0)
+
+            self.clock += 31
+            self.assertEqual(self.store.get_key("b")["n"], "n-b")
+            self.assertEqual(get.call_count, 1)
+
+            self.assertIsNone(self.store.get_key("basura"))
+            self.assertEqual(get.call_count, 1)
+
+    def test_expired_key_survives_failed_refresh(self):
+        with self.fetch("a"):
+            self.store.get_key("a")
+        self.clock += 601
+        with mock.patch("core.utils.auth0.http_client.get", return_value=fake_response(503)):
+            self.assertEqual(self.store.get_key("a")["n"], "n-a")
+            with self.assertRaises(Exception):
+                self.store.get_key("b")
+
+    def test_concurrent_misses_fetch_once(self):
+        def slow_get(*args, **kwargs):
+            time.sleep(0.05)
+            return fake_response(data=jwks("a"))
+
+        results = []
+        with mock.patch("core.utils.auth0.http_client.get", side_effect=slow_get) as get:
+            threads = [threading.Thread(target=lambda: results.append(self.store.get_key("a"))) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(key["kid"] == "a" for key in results))
+        self.assertEqual(self.store.stats()["misses"], 8)
+
+
+class VerifiedTokenCacheTests(TestCase):
+    def setUp(self):
+        self.now = 1_700_000_000.0
+        patcher = mock.patch("core.utils.auth0.time.time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_evicts_least_recently_used(self):
+        tokens = VerifiedTokenCache(max_entries=2)
+        payload = {"sub": "x", "exp": self.now + 60}
+        tokens.set("t1", payload)
+        tokens.set("t2", payload)
+        tokens.get("t1")
+        tokens.set("t3", payload)
+
+        self.assertIsNotNone(tokens.get("t1"))
+        self.assertIsNone(tokens.get("t2"))
+        self.assertIsNotNone(tokens.get("t3"))
+        self.assertEqual(tokens.stats()["evictions"], 1)
+        self.assertEqual(tokens.stats()["size"], 2)
+
+    def test_entries_expire_at_token_exp(self):
+        tokens = VerifiedTokenCache(max_entries=10)
+        tokens.set("t1", {"exp": self.now + 30})
+        tokens.set("expired", {"exp": self.now - 1})
+        tokens.set("no-exp", {"sub": "x"})
+        self.assertEqual(tokens.stats()["size"], 1)
+
+        self.now += 29
+        self.assertIsNotNone(tokens.get("t1"))
+        self.now += 1
+        self.assertIsNone(tokens.get("t1"))
+        self.assertEqual(tokens.stats()["expirations"], 1)
+        self.assertEqual(tokens.stats()["size"], 0)
+
+    def test_keys_are_token_hashes(self):
+        tokens = VerifiedTokenCache(max_entries=10)
+        tokens.set("secret-bearer-token", {"exp": self.now + 60})
+        (key,) = tokens._entries
+        self.assertNotIn(b"secret-bearer-token", key)
+        self.assertEqual(key, hashlib.sha256(b"secret-bearer-token").digest())
+
+    def test_verify_jwt_skips_signature_check_when_cached(self):
+        payload = {"sub": "auth0|1", "email": "a@example.com", "exp": self.now + 60}
+        with mock.patch("core.utils.auth0.verified_tokens", VerifiedTokenCache(max_entries=10)), \
+                mock.patch("core.utils.auth0.jwt.get_unverified_header", return_value={"kid": "a"}), \
+                mock.patch("core.utils.auth0.jwks_store.get_key", return_value={"kid": "a"}), \
+                mock.patch("core.utils.auth0.jwt.decode", return_value=payload) as decode:
+            self.assertEqual(verify_jwt("token"), payload)
+            self.assertEqual(verify_jwt("token"), payload)
+        self.assertEqual(decode.call_count, 1)
+
+
+class SubjectEmailTests(TestCase):
+    def setUp(self):
+        self.clock = 1000.0
+        patcher = mock.patch("core.utils.auth0.time.monotonic", side_effect=lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("core.utils.auth0.subject_emails", SubjectEmailCache(max_entries=10, ttl=300))
+        self.subjects = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def userinfo(self, email):
+        return mock.patch(
+            "core.utils.auth0.http_client.get", return_value=fake_response(data={"email": email} if email else {})
+        )
+
+    def test_claim_wins(self):
+        with self.userinfo(None) as get:
+            self.assertEqual(get_email_from_token("t", {"sub": "auth0|1", "email": "claim@example.com"}), "claim@example.com")
+        get.assert_not_called()
+
+    def test_userinfo_backfills_sub_then_cache_and_column_are_used(self):
+        profile = UserProfile.objects.create(email="a@example.com", vertical=1)
+        with self.userinfo("a@example.com") as get:
+            self.assertEqual(get_email_from_token("t", {"sub": "auth0|1"}), "a@example.com")
+        self.assertEqual(get.call_count, 1)
+        profile.refresh_from_db()
+        self.assertEqual(profile.auth0_sub, "auth0|1")
+
+        # En memoria: ni base ni /userinfo
+        with self.userinfo(None) as get, self.assertNumQueries(0):
+            self.assertEqual(get_email_from_token("t", {"sub": "auth0|1"}), "a@example.com")
+        get.assert_not_called()
+
+        # Otro proceso (cache vacía): sale de la columna auth0_sub
+        self.subjects.clear()
+        with self.userinfo(None) as get, self.assertNumQueries(1):
+            self.assertEqual(get_email_from_token("t", {"sub": "auth0|1"}), "a@example.com")
+        get.assert_not_called()
+
+    def test_backfill_does_not_steal_a_linked_sub(self):
+        UserProfile.objects.create(email="a@example.com", vertical=1, auth0_sub="auth0|1")
+        other = UserProfile.objects.create(email="b@example.com", vertical=1)
+        link_auth0_subject("b@example.com", "auth0|1")
+        other.refresh_from_db()
+        self.assertIsNone(other.auth0_sub)
+
+    def test_entries_expire(self):
+        profile = UserProfile.objects.create(email="old@example.com", vertical=1, auth0_sub="auth0|1")
+        self.assertEqual(get_email_from_token("t", {"sub": "auth0|1"}), "old@example.com")
+
+        UserProfile.objects.filter(pk=profile.pk).update(email="new@example.com")
+        self.clock += 299
+        self.assertEqual(get_email_from_token("t", {"sub": "auth0|1"}), "old@example.com")
+        self.clock += 1
+        self.assertEqual(get_email_from_token("t", {"sub": "auth0|1"}), "new@example.com")
+
+
+@override_settings(AUTH0_MANAGEMENT_TOKEN_LEEWAY=60)
+class ManagementTokenTests(TestCase):
+    def setUp(self):
+        self.clock = 1000.0
+        patcher = mock.patch("core.utils.auth0.time.monotonic", side_effect=lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("core.utils.auth0.management_token", ManagementTokenCache())
+        self.tokens = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.issued = 0
+
+    def issue_token(self, *args, **kwargs):
+        self.issued += 1
+        return fake_response(data={"access_token": f"mgmt-{self.issued}", "expires_in": 3600})
+
+    def test_token_reused_until_leeway(self):
+        with mock.patch("core.utils.auth0.http_client.post", side_effect=self.issue_token) as post:
+            self.assertEqual(self.tokens.get(), "mgmt-1")
+            self.clock += 3600 - 61
+            self.assertEqual(self.tokens.get(), "mgmt-1")
+            self.clock += 1
+            self.assertEqual(self.tokens.get(), "mgmt-2")
+        self.assertEqual(post.call_count, 2)
+        self.assertEqual(self.tokens.refreshes, 2)
+
+    def test_patch_retries_once_after_401(self):
+        patched = []
+
+        def patch(service, url, json=None, headers=None):
+            patched.append(headers["Authorization"])
+            return fake_response(401 if len(patched) == 1 else 200, {"app_metadata": json["app_metadata"]})
+
+        with mock.patch("core.utils.auth0.http_client.post", side_effect=self.issue_token), \
+                mock.patch("core.utils.auth0.http_client.patch", side_effect=patch), quiet():
+            self.assertEqual(update_user_app_metadata("auth0|1", {"vertical": 2}), {"app_metadata": {"vertical": 2}})
+        self.assertEqual(patched, ["Bearer mgmt-1", "Bearer mgmt-2"])
+
+    def test_second_401_is_raised(self):
+        rejected = fake_response(401)
+        rejected.raise_for_status.side_effect = Exception("401 Unauthorized")
+        with mock.patch("core.utils.auth0.http_client.post", side_effect=self.issue_token), \
+                mock.patch("core.utils.auth0.http_client.patch", return_value=rejected) as patch, quiet():
+            with self.assertRaises(Exception):
+                update_user_app_metadata("auth0|1", {"vertical": 2})
+        self.assertEqual(patch.call_count, 2)
+        self.assertEqual(self.issued, 2)
+
+
+class Auth0OutboxDrainTests(TestCase):
+    def setUp(self):
+        self.profile = UserProfile.objects.create(email="a@example.com", vertical=1)
+        self.other = UserProfile.objects.create(email="b@example.com", vertical=2)
+        self.sent = []
+
+    def enqueue(self, profile, sub, vertical, **fields):
+        row = Auth0SyncOutbox.enqueue(profile, sub, {"vertical": vertical})
+        if fields:
+            Auth0SyncOutbox.objects.filter(pk=row.pk).update(**fields)
+            row.refresh_from_db()
+        return row
+
+    def drain(self, *args, side_effect=None):
+        def send(user_id, app_metadata):
+            self.sent.append((user_id, app_metadata["vertical"]))
+            if side_effect:
+                raise side_effect
+        with mock.patch("core.management.commands.drain_auth0_outbox.update_user_app_metadata", side_effect=send):
+            call_command("drain_auth0_outbox", *args, stdout=io.StringIO())
+
+    def statuses(self):
+        return dict(Auth0SyncOutbox.objects.values_list("id", "status"))
+
+    def test_claim_leases_latest_row_per_user(self):
+        old = self.enqueue(self.profile, "auth0|a", 1)
+        new = self.enqueue(self.profile, "auth0|a", 2)
+        other = self.enqueue(self.other, "auth0|b", 3)
+
+        batch = DrainCommand().claim_batch(batch_size=10, lease=300)
+        self.assertEqual([row.id for row in batch["rows"]], [new.id, other.id])
+        self.assertEqual(batch["superseded"], 1)
+        self.assertEqual(self.statuses()[old.id], Auth0SyncOutbox.STATUS_SUPERSEDED)
+        new.refresh_from_db()
+        self.assertGreater(new.leased_until, timezone.now())
+
+        # Reclamadas: otro worker no las vuelve a tomar
+        self.assertEqual(DrainCommand().claim_batch(batch_size=10, lease=300)["rows"], [])
+
+    def test_coalesces_across_batches(self):
+        # La fila vieja entra en el primer lote y la nueva en el segundo
+        old = self.enqueue(self.profile, "auth0|a", 1)
+        self.enqueue(self.other, "auth0|b", 3)
+        new = self.enqueue(self.profile, "auth0|a", 2)
+        self.drain("--batch-size", "1")
+
+        self.assertEqual(sorted(self.sent), [("auth0|a", 2), ("auth0|b", 3)])
+        self.assertEqual(self.statuses()[old.id], Auth0SyncOutbox.STATUS_SUPERSEDED)
+        self.assertEqual(self.statuses()[new.id], Auth0SyncOutbox.STATUS_SENT)
+
+    def test_older_row_in_backoff_is_superseded(self):
+        old = self.enqueue(self.profile, "auth0|a", 1, next_attempt_at=timezone.now() + timedelta(hours=1), attempts=2)
+        new = self.enqueue(self.profile, "auth0|a", 2)
+        self.drain()
+        self.assertEqual(self.sent, [("auth0|a", 2)])
+        self.assertEqual(self.statuses(), {old.id: Auth0SyncOutbox.STATUS_SUPERSEDED, new.id: Auth0SyncOutbox.STATUS_SENT})
+
+    def test_newer_row_waits_for_row_in_flight(self):
+        self.enqueue(self.profile, "auth0|a", 1, leased_until=timezone.now() + timedelta(minutes=5),
+                     next_attempt_at=timezone.now() + timedelta(minutes=5))
+        new = self.enqueue(self.profile, "auth0|a", 2)
+        self.drain()
+        self.assertEqual(self.sent, [])
+        self.assertEqual(self.statuses()[new.id], Auth0SyncOutbox.STATUS_PENDING)
+
+    def test_claimed_row_is_skipped_when_newer_row_appears(self):
+        old = self.enqueue(self.profile, "auth0|a", 1)
+        command = DrainCommand()
+        batch = command.claim_batch(batch_size=10, lease=300)
+        new = self.enqueue(self.profile, "auth0|a", 2)
+
+        with mock.patch("core.management.commands.drain_auth0_outbox.update_user_app_metadata") as send:
+            result = command.process_batch(batch["rows"], {"max_attempts": 8, "base_delay": 5.0, "max_delay": 3600.0})
+        send.assert_not_called()
+        self.assertEqual(result["superseded"], 1)
+        self.assertEqual(self.statuses()[old.id], Auth0SyncOutbox.STATUS_SUPERSEDED)
+
+        # La nueva ya no espera a una fila en curso
+        self.drain()
+        self.assertEqual(self.sent, [("auth0|a", 2)])
+        self.assertEqual(self.statuses()[new.id], Auth0SyncOutbox.STATUS_SENT)
+
+    def test_backoff_then_failed(self):
+        row = self.enqueue(self.profile, "auth0|a", 1)
+        self.drain("--max-attempts", "2", "--base-delay", "60", side_effect=Exception("503"))
+        row.refresh_from_db()
+        self.assertEqual(row.status, Auth0SyncOutbox.STATUS_PENDING)
+        self.assertEqual(row.attempts, 1)
+        self.assertEqual(row.last_error, "503")
+        self.assertIsNone(row.leased_until)
+        self.assertGreater(row.next_attempt_at, timezone.now() + timedelta(seconds=29))
+
+        Auth0SyncOutbox.objects.filter(pk=row.pk).update(next_attempt_at=timezone.now())
+        self.drain("--max-attempts", "2", side_effect=Exception("503"))
+        row.refresh_from_db()
+        self.assertEqual(row.status, Auth0SyncOutbox.STATUS_FAILED)
+        self.assertEqual(row.attempts, 2)
+        self.assertIsNotNone(row.processed_at)
+        self.assertEqual(len(self.sent), 2)
+
+    def update_results(self, test_results):
+        with mock.patch("core.authentication.verify_jwt", return_value={"sub": "auth0|a"}), \
+                mock.patch("core.authentication.get_email_from_token", return_value=self.profile.email), quiet():
+            return self.client.post(
+                "/api/users/update-test-results/", {"test_results": test_results},
+                content_type="application/json", HTTP_AUTHORIZATION="Bearer token",
+            ).json()
+
+    def test_update_results_queues_sync_from_locked_row(self):
+        data = self.update_results({"listening": 80, "speaking": 70, "reading": 60})
+        self.assertEqual((data["auth0_updated"], data["auth0_sync_queued"]), (False, False))
+
+        # Otra escritura completa la fila después de que la request leyó el perfil
+        real_save = UserProfile.save
+
+        def save_with_concurrent_write(profile, *args, **kwargs):
+            UserProfile.objects.filter(pk=profile.pk).update(resultado_writing=90)
+            return real_save(profile, *args, **kwargs)
+
+        with mock.patch.object(UserProfile, "save", save_with_concurrent_write):
+            data = self.update_results({"listening": 85})
+        self.assertEqual((data["auth0_updated"], data["auth0_sync_queued"]), (True, True))
+        self.assertEqual(data["test_results"]["writing"], 90)
+        self.assertEqual(Auth0SyncOutbox.objects.count(), 1)
+
+    def test_update_results_without_changes_skips_writes(self):
+        # Solo las lecturas del perfil: autenticación y relectura
+        with self.assertNumQueries(2):
+            data = self.update_results({})
+        self.assertFalse(data["auth0_updated"])
+        self.assertFalse(Auth0SyncOutbox.objects.exists())
+
+
+class Auth0AuthenticationTests(TestCase):
+    def setUp(self):
+        profile_cache.clear()
+        self.profile = UserProfile.objects.create(email="a@example.com", vertical=1)
+        self.factory = RequestFactory()
+
+    def authenticate(self, header=None, email="a@example.com", error=None):
+        headers = {"HTTP_AUTHORIZATION": header} if header else {}
+        request = Request(self.factory.get("/", **headers))
+        verify = mock.patch("core.authentication.verify_jwt", side_effect=error, return_value={"sub": "auth0|1"})
+        resolve = mock.patch("core.authentication.get_email_from_token", return_value=email)
+        with verify, resolve:
+            return Auth0JWTAuthentication().authenticate(request)
+
+    def test_resolves_profile_and_identity(self):
+        user, identity = self.authenticate("Bearer token")
+        self.assertEqual(user.pk, self.profile.pk)
+        self.assertEqual((identity.token, identity.email, identity.sub), ("token", "a@example.com", "auth0|1"))
+
+    def test_token_without_profile_is_anonymous_with_identity(self):
+        user, identity = self.authenticate("Bearer token", email="new@example.com")
+        self.assertIsInstance(user, AnonymousUser)
+        self.assertEqual(identity.email, "new@example.com")
+
+    def test_missing_header_falls_through(self):
+        self.assertIsNone(self.authenticate())
+
+    def test_invalid_token_fails(self):
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate("Bearer token", error=Exception("Signature has expired"))
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate("Basic abc")
+
+    def test_public_views_ignore_invalid_tokens(self):
+        with mock.patch("core.authentication.verify_jwt", side_effect=Exception("Signature has expired")), quiet():
+            headers = {"HTTP_AUTHORIZATION": "Bearer expired"}
+            self.assertEqual(self.client.get("/api/listening/tests/", **headers).status_code, 200)
+            self.assertEqual(self.client.get("/api/reading/blocks/", **headers).status_code, 200)
+            self.assertEqual(self.client.get("/api/diagnostic/1/", **headers).status_code, 200)
+            self.assertEqual(self.client.get("/api/percentile/1/?score=50", **headers).status_code, 200)
+            # Las que dependen del usuario siguen rechazando el token
+            self.assertEqual(self.client.post("/api/users/register-attempt/", **headers).status_code, 401)
+
+    def test_submit_with_token_ignores_body_email(self):
+        test, correct = build_listening_test(1)
+        body = {"user_email": self.profile.email, "answers": {str(q): o for q, o in correct.items()}}
+
+        def submit(**headers):
+            return self.client.post(
+                f"/api/listening/tests/{test.id}/submit_answers/", body, content_type="application/json", **headers
+            )
+
+        with mock.patch("core.authentication.verify_jwt", side_effect=Exception("Signature has expired")), quiet():
+            self.assertEqual(submit(HTTP_AUTHORIZATION="Bearer expired").status_code, 401)
+        with mock.patch("core.authentication.verify_jwt", return_value={"sub": "auth0|2"}), \
+                mock.patch("core.authentication.get_email_from_token", return_value="other@example.com"):
+            self.assertEqual(submit(HTTP_AUTHORIZATION="Bearer token").status_code, 401)
+        self.profile.refresh_from_db()
+        self.assertIsNone(self.profile.resultado_listening)
+
+        # Sin header se mantiene el email del body para clientes sin token
+        self.assertEqual(submit().status_code, 200)
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.resultado_listening, 100)
+
+    def test_profile_cache_reuses_and_invalidates(self):
+        cache = ProfileCache(ttl=60)
+        with mock.patch("core.authentication.profile_cache", cache):
+            self.assertEqual(cache.get("a@example.com").name, None)
+            with self.assertNumQueries(0):
+                cached = cache.get("a@example.com")
+            # Las copias no comparten cambios con la entrada cacheada
+            cached.name = "Cambiado en memoria"
+            self.assertIsNone(cache.get("a@example.com").name)
+
+            self.profile.name = "Ana"
+            self.profile.save()
+            self.assertEqual(cache.get("a@example.com").name, "Ana")
+            self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_profile_cache_expires(self):
+        cache = ProfileCache(ttl=5)
+        clock = [100.0]
+        with mock.patch("core.authentication.time.monotonic", side_effect=lambda: clock[0]):
+            cache.get("a@example.com")
+            # Cambio hecho por otro proceso: no pasa por las señales de este
+            UserProfile.objects.filter(pk=self.profile.pk).update(name="Otro proceso")
+            self.assertIsNone(cache.get("a@example.com").name)
+            clock[0] += 5
+            self.assertEqual(cache.get("a@example.com").name, "Otro proceso")
+
+    def test_profile_cache_is_bounded_lru(self):
+        for index in range(3):
+            UserProfile.objects.create(email=f"lru{index}@example.com", vertical=1)
+        cache = ProfileCache(ttl=60, max_entries=2)
+        cache.get("lru0@example.com")
+        cache.get("lru1@example.com")
+        cache.get("lru0@example.com")
+        cache.get("lru2@example.com")
+        # lru1 era la menos usada
+        self.assertEqual(list(cache._entries), ["lru0@example.com", "lru2@example.com"])
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+        clock = [time.monotonic() + 60]
+        with mock.patch("core.authentication.time.monotonic", side_effect=lambda: clock[0]):
+            UserProfile.objects.filter(email="lru0@example.com").delete()
+            self.assertIsNone(cache.get("lru0@example.com"))
+        self.assertNotIn("lru0@example.com", cache._entries)
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+
+NO_BACKOFF = {
+    "auth0": {"backoff_factor": 0, "backoff_jitter": 0},
+    "speechace": {"backoff_factor": 0, "backoff_jitter": 0},
+}
+
+
+@override_settings(OUTBOUND_HTTP_SERVICES=NO_BACKOFF, API_SPEECH_ACE_URL="https://speechace.test/score")
+class HttpClientTests(TestCase):
+    def setUp(self):
+        # Sesiones y métricas nuevas por test (las sesiones se arman con la configuración vigente)
+        for patcher in (
+            mock.patch.dict(http_client._sessions, clear=True),
+            mock.patch.object(http_client, "metrics", http_client.OutboundMetrics()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def upstream(self, *outcomes):
+        """
+        Reemplaza la conexión de urllib3: cada llamada devuelve el siguiente
+        status o lanza la siguiente excepción, sin salir a la red
+        """
+        outcomes = list(outcomes)
+
+        def make_request(conn, method, url, **kwargs):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            status, body = outcome if isinstance(outcome, tuple) else (outcome, {})
+            return urllib3.HTTPResponse(
+                body=io.BytesIO(json.dumps(body).encode()), status=status,
+                headers={"Content-Type": "application/json"}, preload_content=False, request_method=method,
+            )
+
+        return mock.patch("urllib3.connectionpool.HTTPConnectionPool._make_request", side_effect=make_request)
+
+    @staticmethod
+    def refused():
+        return urllib3.exceptions.NewConnectionError(None, "Connection refused")
+
+    def test_session_is_reused_per_service(self):
+        session = http_client.get_session("auth0")
+        self.assertIs(http_client.get_session("auth0"), session)
+        self.assertIsNot(http_client.get_session("speechace"), session)
+        self.assertEqual(session.get_adapter("https://x.auth0.com")._pool_maxsize, 20)
+
+    def test_auth0_retries_server_errors_and_connection_errors(self):
+        with self.upstream(503, self.refused(), (200, {"keys": []})) as upstream:
+            response = http_client.get("auth0", "https://tenant.test/.well-known/jwks.json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(upstream.call_count, 3)
+
+        with self.upstream(503, 503, 503, 503) as upstream:
+            self.assertEqual(http_client.patch("auth0", "https://tenant.test/api/v2/users/1").status_code, 503)
+        self.assertEqual(upstream.call_count, 4)
+
+    def test_speechace_posts_are_not_retried_after_reaching_the_server(self):
+        with self.upstream(503) as upstream:
+            self.assertEqual(http_client.post("speechace", "https://speechace.test/score").status_code, 503)
+        self.assertEqual(upstream.call_count, 1)
+
+        with self.upstream(self.refused(), 200) as upstream:
+            self.assertEqual(http_client.post("speechace", "https://speechace.test/score").status_code, 200)
+        self.assertEqual(upstream.call_count, 2)
+
+        read_error = urllib3.exceptions.ReadTimeoutError(None, "https://speechace.test/score", "timed out")
+        with self.upstream(read_error, 200) as upstream, self.assertRaises(requests.exceptions.ConnectionError):
+            http_client.post("speechace", "https://speechace.test/score")
+        self.assertEqual(upstream.call_count, 1)
+
+    def test_metrics_histogram(self):
+        with self.upstream(200, 404), mock.patch("core.utils.http_client.time.perf_counter", side_effect=[0, 0.03, 0, 0.3]):
+            http_client.get("auth0", "https://tenant.test/a")
+            http_client.get("auth0", "https://tenant.test/b")
+        with self.upstream(*[self.refused()] * 4), self.assertRaises(requests.exceptions.ConnectionError):
+            http_client.get("auth0", "https://tenant.test/c")
+
+        data = http_client.metrics.snapshot()["auth0"]
+        self.assertEqual(data["calls"], 3)
+        # 30 ms y el error de conexión (sin demora real) en el primer bucket, 300 ms en el de 500
+        self.assertEqual(data["latency_buckets"]["50"], 2)
+        self.assertEqual(data["latency_buckets"]["500"], 1)
+        self.assertEqual(data["status"], {200: 1, 404: 1, "ConnectionError": 1})
+
+    def test_speechace_eval_uses_service_session(self):
+        audio = SimpleUploadedFile("audio.wav", b"RIFF" + b"\0" * 2048, content_type="audio/wav")
+        body = {"status": "success", "text_score": {"speechace_score": {"pronunciation": 81}}}
+        with self.upstream(self.refused(), (200, body)) as upstream, quiet():
+            result = evaluate_speaking("hello world", audio)
+        self.assertEqual(upstream.call_count, 2)
+        self.assertEqual(result["final_score"], 81)
+        self.assertEqual(http_client.metrics.snapshot()["speechace"]["status"], {200: 1})
+
+    def test_cohere_eval_goes_through_pooled_httpx_client(self):
+        text = json.dumps({"clarity_and_coherence": 80, "verb_tenses": 70, "technical_vocabulary": 60,
+                           "conciseness": 90, "overall_feedback": "ok"})
+        reply = {"id": "x", "finish_reason": "COMPLETE",
+                 "message": {"role": "assistant", "content": [{"type": "text", "text": text}]}}
+        with mock.patch("httpx.HTTPTransport.handle_request",
+                        side_effect=lambda request: httpx.Response(200, json=reply, request=request)) as transport, \
+                mock.patch.object(http_client.metrics, "record") as record, quiet():
+            self.assertEqual(evaluate_writing("Some text"), text)
+        self.assertEqual(transport.call_count, 1)
+        self.assertEqual(record.call_args.args[0], "cohere")
+        self.assertEqual(record.call_args.args[2], 200)
+
+
+class SharedCacheTests(TestCase):
+    """
+    Cada worker tiene su propia instancia del backend de cache; los cambios
+    de versión hechos por uno tienen que verse en los demás
+    """
+
+    def setUp(self):
+        cache.clear()
+
+    def other_worker(self):
+        other = caches.create_connection("default")
+        self.assertIsNot(other, caches["default"])
+        return mock.patch("core.utils.content_cache.cache", other), mock.patch("core.utils.grading.cache", other)
+
+    def test_settings_use_a_shared_backend(self):
+        self.assertNotIn("locmem", settings.CACHES["default"]["BACKEND"])
+
+    def test_version_bump_is_seen_by_other_instance(self):
+        content_patch, grading_patch = self.other_worker()
+        with content_patch:
+            before = content_cache.content_version("listening", 1)
+        content_cache.bump("listening", 1, verticals=[1])
+        with content_patch:
+            after = content_cache.content_version("listening", 1)
+        self.assertNotEqual(before, after)
+        self.assertEqual(after, content_cache.content_version("listening", 1))
+
+    def test_answer_key_edit_reaches_other_worker(self):
+        test, correct = build_listening_test(questions=1, options_per_question=2)
+        question_id, option_id = next(iter(correct.items()))
+        other_option = ListeningOption.objects.filter(question_id=question_id).exclude(pk=option_id).get()
+        worker = AnswerKeyCache()
+
+        content_patch, grading_patch = self.other_worker()
+        with content_patch, grading_patch:
+            self.assertEqual(worker.get("listening", test.id).correct_options[question_id], {option_id})
+
+        # La edición la atiende otro proceso (la cache por defecto de este)
+        with self.captureOnCommitCallbacks(execute=True):
+            ListeningOption.objects.filter(pk=option_id).update(is_correct=False)
+            other_option.is_correct = True
+            other_option.save()
+
+        with content_patch, grading_patch:
+            self.assertEqual(worker.get("listening", test.id).correct_options[question_id], {other_option.id})
+
+    def test_prewarmed_snapshot_is_valid_in_other_worker(self):
+        test, _ = build_listening_test(questions=2)
+        call_command("rebuild_snapshots", "--section", "listening", stdout=io.StringIO())
+
+        content_patch, _ = self.other_worker()
+        with content_patch, mock.patch("core.utils.snapshots.rebuild") as rebuild:
+            self.assertIsNotNone(snapshots.get_test_payload("listening", test.id))
+            stale = RebuildSnapshotsCommand().rebuild_stale("listening", TestSnapshot.VARIANT_FULL, [test.id])
+        rebuild.assert_not_called()
+        self.assertEqual(stale, {})
+
+        # Una edición atendida por este proceso deja viejo el snapshot para el otro
+        with self.captureOnCommitCallbacks(execute=True):
+            test.title = "Editado"
+            test.save()
+        with content_patch:
+            payload = snapshots.get_test_payload("listening", test.id)
+        self.assertEqual(json.loads(payload)["title"], "Editado")
+
+
+class BulkGradingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        answer_keys.clear()
+        profile_cache.clear()
+        self.test, self.correct = build_listening_test(questions=4, options_per_question=3)
+        # Una pregunta con dos opciones correctas
+        self.multi_question = list(self.correct)[1]
+        self.second_correct = ListeningOption.objects.filter(question_id=self.multi_question).exclude(
+            pk=self.correct[self.multi_question]
+        ).first()
+        self.second_correct.is_correct = True
+        self.second_correct.save()
+        self.options = {
+            question_id: list(ListeningOption.objects.filter(question_id=question_id).values_list("id", flat=True))
+            for question_id in self.correct
+        }
+
+    def random_sheet(self, rng):
+        sheet = {}
+        for question_id, options in self.options.items():
+            choice = rng.random()
+            if choice < 0.15:
+                continue
+            key = str(question_id) if choice < 0.5 else question_id
+            sheet[key] = rng.choice(options) if choice < 0.9 else str(rng.choice(options))
+        if rng.random() < 0.2:
+            sheet["999999"] = 1
+        return sheet
+
+    def test_grade_matrix_matches_grade_answers(self):
+        answer_key = answer_keys.get("listening", self.test.id)
+        rng = random.Random(7)
+        sheets = [self.random_sheet(rng) for _ in range(300)] + [{}, {str(self.multi_question): self.second_correct.id}]
+        correct_answers, scores = grade_matrix(answer_key, sheets)
+        for sheet, correct, score in zip(sheets, correct_answers.tolist(), scores.tolist()):
+            expected = grade_answers(answer_key, sheet)
+            self.assertEqual(correct, expected["correct_answers"])
+            self.assertEqual(score, expected["score"])
+        self.assertEqual(correct_answers[-1], 1)
+
+    def profiles(self, count):
+        return [
+            UserProfile.objects.create(
+                email=f"u{i}@example.com", vertical=1,
+                resultado_speaking=60, resultado_reading=70, resultado_writing=80,
+            )
+            for i in range(count)
+        ]
+
+    def captured_updates(self, scores):
+        with CaptureQueriesContext(connection) as queries:
+            write_results("listening", scores)
+        return [q["sql"] for q in queries.captured_queries if q["sql"].startswith('UPDATE "core_userprofile"')]
+
+    def assert_written(self, scores):
+        for profile in UserProfile.objects.filter(email__in=scores):
+            self.assertEqual(profile.resultado_listening, scores[profile.email])
+            expected = UserProfile(
+                resultado_listening=scores[profile.email], resultado_speaking=60,
+                resultado_reading=70, resultado_writing=80,
+            )
+            expected.calcular_resultado_general()
+            self.assertAlmostEqual(profile.resultado_general, expected.resultado_general)
+            self.assertEqual(profile.nivel, expected.nivel)
+
+    def test_grouped_update_for_few_distinct_scores(self):
+        profiles = self.profiles(8)
+        scores = {profile.email: (100.0 if i % 2 else 25.0) for i, profile in enumerate(profiles)}
+        updates = self.captured_updates(scores)
+        self.assertEqual(len(updates), 2)
+        self.assertTrue(all(" IN (" in sql and "CASE" not in sql for sql in updates))
+        for column in ("resultado_listening", "resultado_general", "nivel", "fecha_actualizacion"):
+            self.assertIn(f'"{column}"', updates[0])
+        self.assertNotIn('"resultado_speaking"', updates[0])
+        self.assert_written(scores)
+
+    def test_bulk_update_for_distinct_scores(self):
+        profiles = self.profiles(6)
+        scores = {profile.email: float(10 + i * 15) for i, profile in enumerate(profiles)}
+        updates = self.captured_updates(scores)
+        self.assertEqual(len(updates), 1)
+        self.assertIn("CASE", updates[0])
+        self.assertNotIn('"resultado_speaking"', updates[0])
+        self.assert_written(scores)
+
+    def test_write_results_updates_rollups_and_profile_cache(self):
+        profile = self.profiles(1)[0]
+        self.assertIsNone(profile_cache.get(profile.email).resultado_listening)
+        with self.captureOnCommitCallbacks(execute=True):
+            updated, missing = write_results("listening", {profile.email: 90.0, "nadie@example.com": 50.0})
+        self.assertEqual((updated, missing), (1, ["nadie@example.com"]))
+        self.assertEqual(profile_cache.get(profile.email).resultado_listening, 90.0)
+        rollups.apply_pending()
+        self.assertEqual(rollups.compare(rollups.stored_deltas(), rollups.live_deltas()), [])
+        self.assertEqual(ResultRollup.objects.get(vertical=1).general_count, 1)
+
+    def answers(self, right):
+        return {str(question_id): (option_id if right else 0) for question_id, option_id in self.correct.items()}
+
+    def test_endpoint(self):
+        profile = self.profiles(1)[0]
+        url = "/api/grading/bulk/"
+        payload = {"section": "listening", "records": [
+            {"email": profile.email, "test_id": self.test.id, "answers": self.answers(True)},
+            {"email": "nadie@example.com", "test_id": self.test.id, "answers": {}},
+            {"email": profile.email, "test_id": 999999, "answers": {}},
+            {"email": "", "test_id": self.test.id},
+        ]}
+        self.assertEqual(self.client.post(url, payload, content_type="application/json").status_code, 401)
+        self.client.force_login(User.objects.create_user("staffless", "s@example.com", "x"))
+        self.assertEqual(self.client.post(url, payload, content_type="application/json").status_code, 403)
+
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "x"))
+        self.assertEqual(self.client.post(url, {"section": "speaking"}, content_type="application/json").status_code, 400)
+
+        data = self.client.post(url, dict(payload, dry_run=True), content_type="application/json").json()
+        self.assertEqual(data["graded"], 2)
+        self.assertEqual(data["updated"], 0)
+        profile.refresh_from_db()
+        self.assertIsNone(profile.resultado_listening)
+
+        data = self.client.post(url, payload, content_type="application/json").json()
+        self.assertEqual(data["updated"], 1)
+        self.assertEqual(
+            sorted(error["error"] for error in data["errors"]),
+            ["Se requiere el email del usuario", "Test no encontrado", "Usuario no encontrado"],
+        )
+        profile.refresh_from_db()
+        self.assertEqual(profile.resultado_listening, 100.0)
+
+        rows = "email,test_id,answers\n" + f'{profile.email},{self.test.id},"{json.dumps(self.answers(False)).replace(chr(34), chr(34) * 2)}"\n'
+        upload = SimpleUploadedFile("cohorte.csv", rows.encode(), content_type="text/csv")
+        data = self.client.post(url, {"section": "listening", "file": upload}).json()
+        self.assertEqual(data["results"][0]["correct_answers"], 0)
+        profile.refresh_from_db()
+        self.assertEqual(profile.resultado_listening, 0.0)
+
+    def test_command(self):
+        profile = self.profiles(1)[0]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cohorte.jsonl")
+            output = os.path.join(directory, "detalle.jsonl")
+            with open(path, "w") as stream:
+                stream.write(json.dumps({"email": profile.email, "test_id": self.test.id, "answers": self.answers(True)}) + "\n")
+                stream.write("no es json\n")
+            err = io.StringIO()
+            call_command("bulk_grade", path, "--section", "listening", "--output", output,
+                         stdout=io.StringIO(), stderr=err)
+            with open(output) as stream:
+                self.assertEqual(json.loads(stream.readline())["score"], 100.0)
+        self.assertIn("Línea 2", err.getvalue())
+        profile.refresh_from_db()
+        self.assertEqual(profile.resultado_listening, 100.0)
+
+        with self.assertRaises(CommandError):
+            call_command("bulk_grade", "/no/existe.csv", "--section", "listening", stdout=io.StringIO())
@@ -8,6 +8,7 @@ from .viewsets import (
 )
 from core.viewsets.user_viewsets import UserProfileViewSet
 from core.viewsets.user_viewsets import auth0_login_view
+from core.views import metrics_view, bulk_grade_view, diagnostic_bundle_view, vertical_analytics_view, percentile_view, results_export_view
 
 router = DefaultRouter()
 
@@ -37,4 +38,10 @@ router.register(r'users', UserProfileViewSet)
 urlpatterns = [
     path('api/', include(router.urls)),
     path('api/auth/auth0-login/', auth0_login_view),
+    path('api/metrics/', metrics_view),
+    path('api/grading/bulk/', bulk_grade_view),
+    path('api/diagnostic/<int:vertical>/', diagnostic_bundle_view),
+    path('api/analytics/verticals/<int:vertical>/', vertical_analytics_view),
+    path('api/percentile/<int:vertical>/', percentile_view),
+    path('api/exports/results/', results_export_view),
 ]
\ No newline at end of file
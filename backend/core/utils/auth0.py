@@ -1,7 +1,16 @@
-import requests
 from jose import jwt
 from django.conf import settings
+from django.db import IntegrityError, transaction
 import json
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from core.models.sections.user_profile import UserProfile
+from core.utils import http_client
+
+logger = logging.getLogger(__name__)
 
 ALGORITHMS = ["RS256"]
 
@@ -21,11 +30,31 @@ def get_token_auth_header(request):
 
     return parts[1]
 
-def get_management_api_token():
+class ManagementTokenCache:
     """
-    Obtiene un token de acceso para la Management API de Auth0
+    Conserva el token de la Management API hasta poco antes de su expires_in.
+    La renovación se hace una sola vez detrás de un lock.
     """
-    try:
+
+    def __init__(self):
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    def _is_valid(self):
+        leeway = getattr(settings, "AUTH0_MANAGEMENT_TOKEN_LEEWAY", 60)
+        return self._token is not None and time.monotonic() < self._expires_at - leeway
+
+    def get(self):
+        if self._is_valid():
+            return self._token
+        with self._lock:
+            if not self._is_valid():
+                self._refresh()
+            return self._token
+
+    def _refresh(self):
         url = f"https://{settings.AUTH0_DOMAIN}/oauth/token"
         payload = {
             "client_id": settings.AUTH0_CLIENT_ID,
@@ -34,13 +63,32 @@ def get_management_api_token():
             "grant_type": "client_credentials"
         }
         headers = {"content-type": "application/json"}
-        
-        response = requests.post(url, json=payload, headers=headers)
+
+        response = http_client.post("auth0", url, json=payload, headers=headers)
         response.raise_for_status()
-        
-        return response.json()["access_token"]
+
+        data = response.json()
+        self._token = data["access_token"]
+        self._expires_at = time.monotonic() + data.get("expires_in", 86400)
+        self.refreshes += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._token = None
+            self._expires_at = 0
+
+
+management_token = ManagementTokenCache()
+
+
+def get_management_api_token():
+    """
+    Obtiene un token de acceso para la Management API de Auth0
+    """
+    try:
+        return management_token.get()
     except Exception as e:
-        print(f"=== DEBUG: Error obteniendo Management API token: {str(e)} ===")
+        logger.debug("[AUTH0] Error obteniendo Management API token: %s", e)
         raise e
 
 def update_user_app_metadata(user_id, app_metadata):
@@ -48,60 +96,239 @@ def update_user_app_metadata(user_id, app_metadata):
     Actualiza el app_metadata de un usuario en Auth0
     """
     try:
-        management_token = get_management_api_token()
-        
         url = f"https://{settings.AUTH0_DOMAIN}/api/v2/users/{user_id}"
-        headers = {
-            "Authorization": f"Bearer {management_token}",
-            "Content-Type": "application/json"
-        }
-        
         payload = {"app_metadata": app_metadata}
-        
-        response = requests.patch(url, json=payload, headers=headers)
+
+        for retry in (True, False):
+            management_token_value = get_management_api_token()
+            headers = {
+                "Authorization": f"Bearer {management_token_value}",
+                "Content-Type": "application/json"
+            }
+            response = http_client.patch("auth0", url, json=payload, headers=headers)
+            # Token revocado o rotado antes de tiempo: se renueva una vez
+            if response.status_code == 401 and retry:
+                management_token.invalidate()
+                continue
+            break
         response.raise_for_status()
         
-        print(f"=== DEBUG: App metadata actualizado para usuario {user_id} ===")
+        logger.debug("[AUTH0] App metadata actualizado para usuario %s", user_id)
         return response.json()
     except Exception as e:
-        print(f"=== DEBUG: Error actualizando app metadata: {str(e)} ===")
+        logger.debug("[AUTH0] Error actualizando app metadata: %s", e)
         raise e
 
-def verify_jwt(token):
-    try:
-        print(f"=== DEBUG: Verificando JWT con dominio: {settings.AUTH0_DOMAIN} ===")
-        print(f"=== DEBUG: Audience configurado: {settings.AUTH0_AUDIENCE} ===")
-        
-        jwks_url = f'https://{settings.AUTH0_DOMAIN}/.well-known/jwks.json'
-        print(f"=== DEBUG: JWKS URL: {jwks_url} ===")
-        
-        jwks_response = requests.get(jwks_url)
-        print(f"=== DEBUG: JWKS response status: {jwks_response.status_code} ===")
-        
+class JWKSKeyStore:
+    """
+    Cache de proceso para las llaves públicas del JWKS de Auth0.
+
+    Las llaves se parsean una sola vez y se conservan durante AUTH0_JWKS_TTL
+    segundos. Solo se vuelve a pedir el JWKS cuando expira el TTL o aparece un
+    kid desconocido (rotación de llaves); un lock evita que varios hilos hagan
+    la misma descarga a la vez.
+    """
+
+    def __init__(self, domain=None, ttl=None, min_refresh_interval=None):
+        self._domain = domain
+        self._ttl = ttl
+        self._min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        # Aparte del lock de refresco, para no esperar una descarga al contar un hit
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+
+    @property
+    def domain(self):
+        return self._domain or settings.AUTH0_DOMAIN
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "AUTH0_JWKS_TTL", 600)
+
+    @property
+    def min_refresh_interval(self):
+        if self._min_refresh_interval is not None:
+            return self._min_refresh_interval
+        return getattr(settings, "AUTH0_JWKS_MIN_REFRESH_INTERVAL", 30)
+
+    def _is_fresh(self, now):
+        return self._fetched_at is not None and now - self._fetched_at < self.ttl
+
+    def _fetch(self):
+        jwks_url = f"https://{self.domain}/.well-known/jwks.json"
+        jwks_response = http_client.get("auth0", jwks_url)
+        with self._stats_lock:
+            self.fetches += 1
+
         if jwks_response.status_code != 200:
-            print(f"=== DEBUG: Error obteniendo JWKS: {jwks_response.text} ===")
+            logger.error("[AUTH0] Error obteniendo JWKS: %s", jwks_response.text)
             raise Exception(f"Failed to fetch JWKS: {jwks_response.status_code}")
-            
-        jwks = jwks_response.json()
-        unverified_header = jwt.get_unverified_header(token)
-        print(f"=== DEBUG: Header no verificado: {unverified_header} ===")
 
-        rsa_key = {}
-        for key in jwks["keys"]:
-            if key["kid"] == unverified_header["kid"]:
-                rsa_key = {
+        keys = {}
+        for key in jwks_response.json().get("keys", []):
+            if key.get("kid"):
+                keys[key["kid"]] = {
                     "kty": key["kty"],
                     "kid": key["kid"],
-                    "use": key["use"],
+                    "use": key.get("use", "sig"),
                     "n": key["n"],
                     "e": key["e"]
                 }
-                print(f"=== DEBUG: RSA key encontrada para kid: {key['kid']} ===")
-                break
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        logger.info("[AUTH0] JWKS actualizado, kids disponibles: %s", list(keys))
+
+    def get_key(self, kid):
+        now = time.monotonic()
+        key = self._keys.get(kid)
+        if key is not None and self._is_fresh(now):
+            with self._stats_lock:
+                self.hits += 1
+            return key
+
+        with self._stats_lock:
+            self.misses += 1
+        with self._lock:
+            # Otro hilo pudo haber refrescado mientras esperábamos el lock
+            now = time.monotonic()
+            key = self._keys.get(kid)
+            if key is not None and self._is_fresh(now):
+                return key
+
+            # Un kid desconocido con llaves vigentes solo fuerza un refresco
+            # cada min_refresh_interval segundos, para no amplificar tokens basura
+            recently_fetched = (
+                self._fetched_at is not None and
+                now - self._fetched_at < self.min_refresh_interval
+            )
+            if key is None and self._is_fresh(now) and recently_fetched:
+                return None
+
+            try:
+                self._fetch()
+            except Exception:
+                # Si Auth0 no responde seguimos usando la llave conocida
+                if key is not None:
+                    logger.warning("[AUTH0] Usando llave JWKS expirada para kid %s", kid)
+                    return key
+                raise
+            return self._keys.get(kid)
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = None
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "fetches": self.fetches,
+                "keys": len(self._keys),
+            }
+
+
+jwks_store = JWKSKeyStore()
+
 
+class VerifiedTokenCache:
+    """
+    LRU acotado de payloads ya verificados, indexado por el hash del token.
+
+    Cada entrada vence en el `exp` del propio token, así que una segunda
+    llamada con el mismo bearer se resuelve con un lookup en vez de volver a
+    verificar la firma RSA.
+    """
+
+    def __init__(self, max_entries=None):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, "AUTH0_TOKEN_CACHE_SIZE", 10000)
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, exp = entry
+            if exp <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def set(self, token, payload):
+        exp = payload.get("exp")
+        if not isinstance(exp, (int, float)) or exp <= time.time():
+            return
+        max_entries = self.max_entries
+        if max_entries <= 0:
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (payload, exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+verified_tokens = VerifiedTokenCache()
+
+
+def verify_jwt(token):
+    cached_payload = verified_tokens.get(token)
+    if cached_payload is not None:
+        return dict(cached_payload)
+
+    try:
+        unverified_header = jwt.get_unverified_header(token)
+        kid = unverified_header.get("kid")
+
+        rsa_key = jwks_store.get_key(kid) if kid else None
         if not rsa_key:
-            print(f"=== DEBUG: No se encontró RSA key para kid: {unverified_header.get('kid')} ===")
-            print(f"=== DEBUG: Keys disponibles: {[k['kid'] for k in jwks['keys']]} ===")
+            logger.warning("[AUTH0] No se encontró RSA key para kid: %s", kid)
             raise Exception("Public key not found.")
 
         payload = jwt.decode(
@@ -111,11 +338,122 @@ def verify_jwt(token):
             audience=settings.AUTH0_AUDIENCE,
             issuer=f"https://{settings.AUTH0_DOMAIN}/"
         )
-        print(f"=== DEBUG: Token decodificado exitosamente ===")
-        return payload
-        
+        verified_tokens.set(token, payload)
+        return dict(payload)
+
     except Exception as e:
-        print(f"=== DEBUG: Error en verify_jwt: {str(e)} ===")
-        import traceback
-        print(f"=== DEBUG: Traceback: {traceback.format_exc()} ===")
+        logger.debug("[AUTH0] Error en verify_jwt: %s", e)
         raise e
+
+
+class SubjectEmailCache:
+    """
+    LRU acotado de sub de Auth0 -> email, para no consultar la base de datos
+    ni /userinfo en cada request del mismo usuario. Las entradas vencen a los
+    AUTH0_SUBJECT_CACHE_TTL segundos, así un cambio de email en Auth0 se
+    termina viendo sin reiniciar el proceso.
+    """
+
+    def __init__(self, max_entries=None, ttl=None):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, "AUTH0_SUBJECT_CACHE_SIZE", 10000)
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, "AUTH0_SUBJECT_CACHE_TTL", 300)
+
+    def get(self, sub):
+        with self._lock:
+            entry = self._entries.get(sub)
+            if entry is None:
+                return None
+            email, stored_at = entry
+            if time.monotonic() - stored_at >= self.ttl:
+                del self._entries[sub]
+                return None
+            self._entries.move_to_end(sub)
+            return email
+
+    def set(self, sub, email):
+        with self._lock:
+            self._entries[sub] = (email, time.monotonic())
+            self._entries.move_to_end(sub)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+subject_emails = SubjectEmailCache()
+
+
+def link_auth0_subject(email, sub):
+    """
+    Guarda el sub de Auth0 en el perfil con ese email si aún no lo tiene
+    """
+    if not email or not sub:
+        return
+    try:
+        # Savepoint: si el sub ya está en otro perfil no se rompe la transacción de la request
+        with transaction.atomic():
+            UserProfile.objects.filter(email=email, auth0_sub__isnull=True).update(auth0_sub=sub)
+    except IntegrityError:
+        logger.warning("[AUTH0] El sub %s ya está asociado a otro perfil", sub)
+
+
+def fetch_userinfo_email(token):
+    """
+    Obtiene el email desde el endpoint /userinfo de Auth0 (camino frío)
+    """
+    try:
+        userinfo_url = f"https://{settings.AUTH0_DOMAIN}/userinfo"
+        headers = {"Authorization": f"Bearer {token}"}
+        userinfo_response = http_client.get("auth0", userinfo_url, headers=headers)
+        if userinfo_response.status_code == 200:
+            return userinfo_response.json().get("email")
+        logger.warning("[AUTH0] Error en userinfo: %s", userinfo_response.status_code)
+    except Exception as userinfo_error:
+        logger.warning("[AUTH0] Error obteniendo userinfo: %s", userinfo_error)
+    return None
+
+
+def get_email_from_token(token, payload):
+    """
+    Resuelve el email del usuario: claim del token, cache en memoria, columna
+    auth0_sub del perfil y, como último recurso, /userinfo (que además
+    completa la columna para las siguientes llamadas).
+    """
+    email = payload.get("email")
+    if email:
+        return email
+
+    sub = payload.get("sub")
+    if not sub:
+        return None
+
+    email = subject_emails.get(sub)
+    if email:
+        return email
+
+    email = UserProfile.objects.filter(auth0_sub=sub).values_list("email", flat=True).first()
+    if email:
+        subject_emails.set(sub, email)
+        return email
+
+    email = fetch_userinfo_email(token)
+    if email:
+        subject_emails.set(sub, email)
+        link_auth0_subject(email, sub)
+    return email
@@ -0,0 +1,264 @@
+import csv
+import io
+import json
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from core.authentication import profile_cache
+from core.models.sections.user_profile import UserProfile
+from core.utils import rollups
+from core.utils.grading import SECTION_QUESTIONS, answer_keys, _to_int
+
+# Campo del perfil donde se guarda el puntaje de cada sección calificable
+RESULT_FIELDS = {
+    'listening': 'resultado_listening',
+    'reading': 'resultado_reading',
+}
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Con menos de un grupo de valores distintos por cada N perfiles conviene
+# un UPDATE por grupo en lugar de bulk_update
+GROUPED_UPDATE_RATIO = 4
+
+
+def detect_format(filename, default='jsonl'):
+    """
+    Deduce el formato (csv o jsonl) a partir de la extensión del archivo
+    """
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return default
+
+
+def normalize_record(raw, line):
+    """
+    Valida un registro {email, test_id, answers}. Devuelve (registro, error).
+    En CSV la columna answers es un objeto JSON {question_id: option_id}.
+    """
+    if not isinstance(raw, dict):
+        return None, {'line': line, 'error': 'Registro inválido'}
+
+    email = (raw.get('email') or '').strip()
+    test_id = _to_int(raw.get('test_id'))
+    answers = raw.get('answers') or {}
+    if isinstance(answers, str):
+        try:
+            answers = json.loads(answers)
+        except ValueError:
+            return None, {'line': line, 'email': email, 'error': 'answers no es JSON válido'}
+
+    if not email:
+        return None, {'line': line, 'error': 'Se requiere el email del usuario'}
+    if test_id is None:
+        return None, {'line': line, 'email': email, 'error': 'test_id inválido'}
+    if not isinstance(answers, dict):
+        return None, {'line': line, 'email': email, 'error': 'answers debe ser un objeto'}
+
+    return {'line': line, 'email': email, 'test_id': test_id, 'answers': answers}, None
+
+
+def _csv_rows(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _jsonl_rows(stream):
+    for line, text in enumerate(stream, start=1):
+        text = text.strip()
+        if not text:
+            continue
+        try:
+            yield line, json.loads(text)
+        except ValueError:
+            yield line, None
+
+
+def parse_records(stream, fmt):
+    """
+    Lee registros desde un stream de texto en JSON lines o CSV.
+    Devuelve (registros, errores); las líneas con error no detienen la lectura.
+    """
+    records = []
+    errors = []
+    rows = _csv_rows(stream) if fmt == 'csv' else _jsonl_rows(stream)
+
+    for line, raw in rows:
+        record, error = normalize_record(raw, line)
+        if error:
+            errors.append(error)
+        else:
+            records.append(record)
+    return records, errors
+
+
+def grade_matrix(answer_key, answer_sheets):
+    """
+    Califica muchas hojas de un mismo test de una vez.
+
+    Arma una matriz hojas x preguntas con la opción elegida y la compara
+    contra la matriz de opciones correctas (rellenada con -1 cuando una
+    pregunta tiene menos opciones correctas que el máximo). Devuelve los
+    arrays de respuestas correctas y de puntajes, uno por hoja.
+    """
+    question_index = {question_id: col for col, question_id in enumerate(answer_key.question_ids)}
+    total_questions = answer_key.total_questions
+
+    selected = np.zeros((len(answer_sheets), total_questions), dtype=np.int64)
+    for row, answers in enumerate(answer_sheets):
+        for question_id, option_id in answers.items():
+            col = question_index.get(_to_int(question_id))
+            option_id = _to_int(option_id)
+            if col is not None and option_id:
+                selected[row, col] = option_id
+
+    width = max((len(options) for options in answer_key.correct_options.values()), default=0) or 1
+    correct = np.full((total_questions, width), -1, dtype=np.int64)
+    for col, question_id in enumerate(answer_key.question_ids):
+        options = sorted(answer_key.correct_options[question_id])
+        correct[col, :len(options)] = options
+
+    hits = (selected[:, :, None] == correct[None, :, :]).any(axis=2)
+    correct_answers = hits.sum(axis=1)
+    if total_questions > 0:
+        # Mismo orden de operaciones que grade_answers para obtener el mismo float
+        scores = (correct_answers / total_questions) * 100
+    else:
+        scores = np.zeros(len(answer_sheets))
+    return correct_answers, scores
+
+
+def _save_chunk(profiles, fields):
+    """
+    Escribe un lote de perfiles ya calculados.
+
+    bulk_update arma un CASE WHEN por fila y campo, cuyo costo crece con el
+    lote. Como los puntajes de una cohorte toman pocos valores distintos, se
+    agrupan los perfiles por valores y se emite un UPDATE ... WHERE id IN por
+    grupo; si casi todos los valores son distintos se usa bulk_update.
+    """
+    groups = {}
+    for profile in profiles:
+        values = tuple(getattr(profile, name) for name in fields)
+        groups.setdefault(values, []).append(profile.pk)
+
+    if len(groups) * GROUPED_UPDATE_RATIO > len(profiles):
+        UserProfile.objects.bulk_update(profiles, fields, batch_size=len(profiles) or None)
+        return
+
+    for values, ids in groups.items():
+        UserProfile.objects.filter(pk__in=ids).update(**dict(zip(fields, values)))
+
+
+def write_results(section, scores_by_email, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Guarda los puntajes en los perfiles por lotes de chunk_size.
+
+    No se llama a save(), así que aquí se recalculan el resultado general y el
+    nivel, se fija fecha_actualizacion, se actualizan los rollups y se
+    invalida la cache de perfiles.
+    Devuelve (perfiles actualizados, emails sin perfil).
+    """
+    field = RESULT_FIELDS[section]
+    fields = [field, 'resultado_general', 'nivel', 'fecha_actualizacion']
+    emails = list(scores_by_email)
+    updated = 0
+    missing = []
+
+    for start in range(0, len(emails), chunk_size):
+        chunk = emails[start:start + chunk_size]
+        now = timezone.now()
+        with transaction.atomic():
+            profiles = list(
+                UserProfile.objects
+                .select_for_update()
+                .filter(email__in=chunk)
+                .order_by('id')
+                .only('id', 'email', *rollups.STATE_FIELDS)
+            )
+            for profile in profiles:
+                setattr(profile, field, scores_by_email[profile.email])
+                profile.calcular_resultado_general()
+                profile.fecha_actualizacion = now
+            _save_chunk(profiles, fields)
+            rollups.record_profiles(profiles)
+
+        found = {profile.email for profile in profiles}
+        missing.extend(email for email in chunk if email not in found)
+        for email in found:
+            profile_cache.invalidate(email)
+        updated += len(profiles)
+
+    return updated, missing
+
+
+def grade_records(section, records, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """
+    Califica registros {email, test_id, answers} agrupados por test y guarda
+    los puntajes. Si un email aparece más de una vez gana la última hoja.
+    """
+    if section not in SECTION_QUESTIONS:
+        raise ValueError(f"Sección no calificable: {section}")
+
+    by_test = {}
+    for record in records:
+        by_test.setdefault(record['test_id'], []).append(record)
+
+    results = []
+    errors = []
+    for test_id, sheets in by_test.items():
+        answer_key = answer_keys.get(section, test_id)
+        if answer_key is None:
+            errors.extend(
+                {'line': r['line'], 'email': r['email'], 'error': 'Test no encontrado'} for r in sheets
+            )
+            continue
+
+        correct_answers, scores = grade_matrix(answer_key, [r['answers'] for r in sheets])
+        for record, correct, score in zip(sheets, correct_answers.tolist(), scores.tolist()):
+            results.append({
+                'line': record['line'],
+                'email': record['email'],
+                'test_id': test_id,
+                'total_questions': answer_key.total_questions,
+                'correct_answers': correct,
+                'score': score,
+            })
+
+    results.sort(key=lambda r: r['line'])
+    scores_by_email = {r['email']: r['score'] for r in results}
+
+    updated = 0
+    if not dry_run:
+        updated, missing = write_results(section, scores_by_email, chunk_size)
+        missing = set(missing)
+        errors.extend(
+            {'line': r['line'], 'email': r['email'], 'error': 'Usuario no encontrado'}
+            for r in results if r['email'] in missing
+        )
+
+    errors.sort(key=lambda e: e.get('line', 0))
+    return {
+        'graded': len(results),
+        'updated': updated,
+        'errors': errors,
+        'results': results,
+    }
+
+
+def grade_file(section, stream, fmt, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """
+    Atajo para parsear y calificar un archivo de texto completo
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.StringIO(stream.decode('utf-8-sig'))
+    records, parse_errors = parse_records(stream, fmt)
+    summary = grade_records(section, records, chunk_size=chunk_size, dry_run=dry_run)
+    summary['errors'] = sorted(parse_errors + summary['errors'], key=lambda e: e.get('line', 0))
+    return summary
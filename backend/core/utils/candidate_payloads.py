@@ -0,0 +1,88 @@
+import json
+
+# Representación de los tests para candidatos: sin is_correct ni campos que
+# solo usa el admin (vertical_display), con claves cortas y listas ordenadas
+# por id. Claves:
+#
+#   test:      id, t (title), d (description), v (vertical), b (bloques)
+#   listening: bloque  id, i (instructions), u (url del video), q (preguntas)
+#              pregunta id, x (texto), k (tipo), o (opciones)
+#   reading:   bloque  id, t (title), c (content), q (preguntas)
+#              pregunta id, x (texto), o (opciones)
+#   writing / speaking: bloque id, x (text), i (instruction), e (example)
+#   opción:    id, x (texto)
+
+
+def _options(question):
+    return [{'id': option.id, 'x': option.option_text} for option in question.options.all()]
+
+
+def _test(test, blocks):
+    return {
+        'id': test.id,
+        't': test.title,
+        'd': test.description,
+        'v': test.vertical,
+        'b': blocks,
+    }
+
+
+def listening_candidate(test):
+    return _test(test, [
+        {
+            'id': block.id,
+            'i': block.instructions,
+            'u': block.video_file.url if block.video_file else None,
+            'q': [
+                {'id': question.id, 'x': question.question_text, 'k': question.question_type, 'o': _options(question)}
+                for question in block.questions.all()
+            ],
+        }
+        for block in test.blocks.all()
+    ])
+
+
+def reading_candidate(test):
+    return _test(test, [
+        {
+            'id': block.id,
+            't': block.title,
+            'c': block.content,
+            'q': [
+                {'id': question.id, 'x': question.question_text, 'o': _options(question)}
+                for question in block.questions.all()
+            ],
+        }
+        for block in test.reading_blocks.all()
+    ])
+
+
+def _prompt_blocks(blocks):
+    return [
+        {'id': block.id, 'x': block.text, 'i': block.instruction, 'e': block.example}
+        for block in blocks
+    ]
+
+
+def writing_candidate(test):
+    return _test(test, _prompt_blocks(test.writing_blocks.all()))
+
+
+def speaking_candidate(test):
+    return _test(test, _prompt_blocks(test.speaking_blocks.all()))
+
+
+CANDIDATE_BUILDERS = {
+    'listening': listening_candidate,
+    'reading': reading_candidate,
+    'writing': writing_candidate,
+    'speaking': speaking_candidate,
+}
+
+
+def render_candidate(section, test):
+    """
+    JSON compacto (sin espacios, UTF-8) del test para candidatos
+    """
+    data = CANDIDATE_BUILDERS[section](test)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
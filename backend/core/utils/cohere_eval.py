@@ -1,7 +1,12 @@
 import cohere
 from django.conf import settings
+from core.utils.http_client import get_httpx_client, get_service_config
 
-co = cohere.ClientV2(settings.COHERE_API_KEY)
+co = cohere.ClientV2(
+    settings.COHERE_API_KEY,
+    httpx_client=get_httpx_client("cohere"),
+    timeout=get_service_config("cohere").get("timeout")
+)
 
 def evaluate_writing(student_text):
     prompt = f"""
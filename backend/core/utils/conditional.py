@@ -0,0 +1,28 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from core.utils.content_cache import version_timestamp
+
+
+def conditional_response(request, version, build, extra=''):
+    """
+    GET condicional con ETag fuerte y Last-Modified derivados de una versión
+    de core.utils.content_cache.
+
+    Responde 304/412 si los validadores del cliente siguen vigentes; si no,
+    arma la respuesta con build(). `extra` distingue representaciones de una
+    misma URL (por ejemplo, según el usuario sea staff).
+    """
+    key = f"{request.get_full_path()}|{getattr(request, 'accepted_media_type', '')}|{extra}|{version}"
+    etag = '"%s"' % hashlib.sha1(key.encode('utf-8')).hexdigest()
+    last_modified = version_timestamp(version)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+    return response
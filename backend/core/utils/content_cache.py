@@ -0,0 +1,186 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from core.models.sections.listening import ListeningTest, ListeningBlock, ListeningQuestion, ListeningOption
+from core.models.sections.reading import ReadingTest, ReadingBlock, ReadingQuestion, ReadingOption
+from core.models.sections.writing import WritingTest, WritingBlock
+from core.models.sections.speaking import SpeakingTest, SpeakingBlock
+
+KEY_PREFIX = "content"
+
+# Por cada modelo de contenido: sección y cómo llegar al id de su test
+CONTENT_MODELS = {
+    ListeningTest: ('listening', lambda obj: obj.pk),
+    ListeningBlock: ('listening', lambda obj: obj.test_id),
+    ListeningQuestion: ('listening', lambda obj: ListeningBlock.objects.filter(pk=obj.block_id).values_list('test_id', flat=True).first()),
+    ListeningOption: ('listening', lambda obj: ListeningQuestion.objects.filter(pk=obj.question_id).values_list('block__test_id', flat=True).first()),
+    ReadingTest: ('reading', lambda obj: obj.pk),
+    ReadingBlock: ('reading', lambda obj: obj.reading_test_id),
+    ReadingQuestion: ('reading', lambda obj: ReadingBlock.objects.filter(pk=obj.reading_block_id).values_list('reading_test_id', flat=True).first()),
+    ReadingOption: ('reading', lambda obj: ReadingQuestion.objects.filter(pk=obj.question_id).values_list('reading_block__reading_test_id', flat=True).first()),
+    WritingTest: ('writing', lambda obj: obj.pk),
+    WritingBlock: ('writing', lambda obj: obj.writing_test_id),
+    SpeakingTest: ('speaking', lambda obj: obj.pk),
+    SpeakingBlock: ('speaking', lambda obj: obj.speaking_test_id),
+}
+
+
+# Modelo de test de cada sección
+TEST_MODELS = {
+    'listening': ListeningTest,
+    'reading': ReadingTest,
+    'writing': WritingTest,
+    'speaking': SpeakingTest,
+}
+
+
+def _section_key(section):
+    return f"{KEY_PREFIX}:{section}:gen"
+
+
+def _test_key(section, test_id):
+    return f"{KEY_PREFIX}:{section}:test:{test_id}"
+
+
+def _vertical_key(section, vertical):
+    # Siempre como entero: ?vertical=01 o " 1" comparten clave con la vertical 1
+    return f"{KEY_PREFIX}:{section}:vertical:{int(vertical)}"
+
+
+def _all_key(section):
+    return f"{KEY_PREFIX}:{section}:all"
+
+
+def _new_token():
+    return time.time_ns()
+
+
+def _tokens(keys):
+    """
+    Lee los tokens de las claves con una sola consulta a la cache
+    """
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        # Sin versión (cache vacía o expulsada): se inicia una nueva, nunca se reutiliza
+        token = _new_token()
+        for key in missing:
+            cache.add(key, token, timeout=None)
+        values = cache.get_many(keys)
+    return values
+
+
+def content_versions(section, test_ids):
+    """
+    Versiones de varios tests de una sección con una sola lectura de la cache.
+    Devuelve {test_id: versión}.
+    """
+    section_key = _section_key(section)
+    test_keys = {test_id: _test_key(section, test_id) for test_id in test_ids}
+    values = _tokens([section_key, *test_keys.values()])
+    generation = values.get(section_key, 0)
+    return {
+        test_id: f"{generation}.{values.get(key, 0)}"
+        for test_id, key in test_keys.items()
+    }
+
+
+def content_version(section, test_id):
+    """
+    Versión del contenido de un test: cambia cada vez que se modifica el test
+    o cualquiera de sus bloques, preguntas u opciones.
+    """
+    return content_versions(section, [test_id])[test_id]
+
+
+def list_version(section, vertical=None):
+    """
+    Versión de los listados de una sección: la de una vertical cambia cuando
+    se modifica cualquier test de esa vertical; sin vertical, con cualquier
+    cambio de la sección. La vertical se normaliza con int() y lanza
+    ValueError si no es un número.
+    """
+    scope_key = _all_key(section) if vertical is None else _vertical_key(section, vertical)
+    values = _tokens([_section_key(section), scope_key])
+    return f"{values.get(_section_key(section), 0)}.{values.get(scope_key, 0)}"
+
+
+def list_versions(sections, vertical):
+    """
+    Versiones de los listados de una vertical en varias secciones con una
+    sola lectura de la cache. Devuelve {sección: versión}.
+    """
+    keys = {section: (_section_key(section), _vertical_key(section, vertical)) for section in sections}
+    values = _tokens([key for pair in keys.values() for key in pair])
+    return {
+        section: f"{values.get(generation_key, 0)}.{values.get(scope_key, 0)}"
+        for section, (generation_key, scope_key) in keys.items()
+    }
+
+
+def version_timestamp(version):
+    """
+    Los tokens son time_ns del momento del cambio: el mayor sirve como Last-Modified (en segundos)
+    """
+    return max(int(token) for token in version.split('.')) // 1_000_000_000
+
+
+def bump(section, test_id=None, verticals=()):
+    """
+    Invalida un test junto con los listados de sus verticales, o toda la
+    sección si no se pudo resolver el test
+    """
+    if test_id is None:
+        cache.set(_section_key(section), _new_token(), timeout=None)
+        return
+    token = _new_token()
+    keys = [_test_key(section, test_id), _all_key(section)]
+    keys += [_vertical_key(section, vertical) for vertical in verticals]
+    cache.set_many({key: token for key in keys}, timeout=None)
+
+
+def remember_vertical(instance):
+    """
+    Antes de guardar un test se anota su vertical anterior, para invalidar
+    también el listado del que sale si se lo cambia de vertical
+    """
+    if instance.pk is None:
+        return
+    instance._content_previous_vertical = (
+        type(instance).objects.filter(pk=instance.pk).values_list('vertical', flat=True).first()
+    )
+
+
+def resolve(instance):
+    """
+    Devuelve (sección, test_id, verticales) para una instancia de contenido
+    """
+    section, resolver = CONTENT_MODELS[type(instance)]
+    try:
+        test_id = resolver(instance)
+    except Exception:
+        return section, None, set()
+
+    if isinstance(instance, TEST_MODELS[section]):
+        verticals = {instance.vertical, getattr(instance, '_content_previous_vertical', None)}
+    elif test_id is not None:
+        verticals = set(TEST_MODELS[section].objects.filter(pk=test_id).values_list('vertical', flat=True))
+    else:
+        verticals = set()
+    verticals.discard(None)
+    return section, test_id, verticals
+
+
+def content_changed(instance):
+    """
+    Invalida la versión del test al que pertenece la instancia y la de los
+    listados de su vertical.
+
+    Se invalida de inmediato y otra vez al confirmar la transacción, para que
+    una lectura concurrente no deje cacheado el contenido anterior al commit.
+    """
+    section, test_id, verticals = resolve(instance)
+    bump(section, test_id, verticals)
+    transaction.on_commit(lambda: bump(section, test_id, verticals))
@@ -0,0 +1,46 @@
+from django.core.cache import cache
+
+from core.models.sections.snapshots import TestSnapshot
+from core.utils import snapshots
+from core.utils.content_cache import list_versions
+
+# Orden de las secciones dentro del bundle
+BUNDLE_SECTIONS = ('listening', 'reading', 'writing', 'speaking')
+
+# Las entradas viejas quedan huérfanas al cambiar la versión; expiran solas
+BUNDLE_TIMEOUT = 60 * 60 * 24
+
+
+def bundle_version(vertical):
+    """
+    Versión del bundle de una vertical: combina las versiones de listado de
+    las cuatro secciones, así que cambia con cualquier edición de sus tests.
+    """
+    versions = list_versions(BUNDLE_SECTIONS, vertical)
+    return '.'.join(versions[section] for section in BUNDLE_SECTIONS)
+
+
+def render_bundle(vertical, variant):
+    """
+    Arma el JSON {"vertical": v, "listening": [...], ...} concatenando los
+    listados ya renderizados de cada sección (core.utils.snapshots)
+    """
+    parts = [b'{"vertical":' + str(vertical).encode('ascii')]
+    for section in BUNDLE_SECTIONS:
+        payload = snapshots.get_list_payload(section, vertical, variant)
+        parts.append(b'"' + section.encode('ascii') + b'":' + payload)
+    return b','.join(parts) + b'}'
+
+
+def get_bundle(vertical, variant=TestSnapshot.VARIANT_FULL, version=None):
+    """
+    Bundle de una vertical. El resultado armado se guarda en la cache de
+    Django con la versión en la clave: en caliente no toca la base.
+    """
+    version = version or bundle_version(vertical)
+    key = f"diagnostic:{vertical}:{variant}:{version}"
+    payload = cache.get(key)
+    if payload is None:
+        payload = render_bundle(vertical, variant)
+        cache.set(key, payload, timeout=BUNDLE_TIMEOUT)
+    return payload
@@ -0,0 +1,169 @@
+import csv
+import datetime
+import io
+import json
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.constants import VERTICAL_CHOICES
+from core.models.sections.user_profile import UserProfile
+
+# Columnas exportadas, en orden; se leen con values_list sin crear instancias
+EXPORT_FIELDS = (
+    'id',
+    'email',
+    'name',
+    'vertical',
+    'nivel',
+    'resultado_listening',
+    'resultado_speaking',
+    'resultado_reading',
+    'resultado_writing',
+    'resultado_general',
+    'intentos_realizados',
+    'fecha_creacion',
+    'fecha_actualizacion',
+)
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+# Filas por vuelta del cursor (en Postgres un cursor del lado del servidor)
+# y por cada parte enviada al cliente
+EXPORT_CHUNK_SIZE = 2000
+
+VERTICALS = dict(VERTICAL_CHOICES)
+NIVELES = dict(UserProfile.NIVEL_CHOICES)
+
+
+def parse_filters(params):
+    """
+    Valida vertical, nivel, from y to (YYYY-MM-DD, sobre el día de alta).
+    Devuelve los filtros como dict o lanza ValueError con el motivo.
+    """
+    filters = {}
+    vertical = params.get('vertical')
+    if vertical:
+        try:
+            filters['vertical'] = int(vertical)
+        except ValueError:
+            filters['vertical'] = None
+        if filters['vertical'] not in VERTICALS:
+            raise ValueError("vertical inválida")
+
+    nivel = params.get('nivel')
+    if nivel:
+        if nivel not in NIVELES:
+            raise ValueError(f"nivel debe ser uno de: {', '.join(NIVELES)}")
+        filters['nivel'] = nivel
+
+    for name in ('from', 'to'):
+        value = params.get(name)
+        if value:
+            filters[name] = parse_date(value)
+            if filters[name] is None:
+                raise ValueError(f"{name} debe tener formato YYYY-MM-DD")
+    return filters
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def export_queryset(queryset=None, vertical=None, nivel=None, start=None, end=None):
+    """
+    Filas de la exportación ordenadas por id. El rango de fechas se aplica
+    como límites de fecha_creacion para no calcular el día de cada fila.
+    """
+    queryset = UserProfile.objects.all() if queryset is None else queryset
+    if vertical is not None:
+        queryset = queryset.filter(vertical=vertical)
+    if nivel is not None:
+        queryset = queryset.filter(nivel=nivel)
+    if start is not None:
+        queryset = queryset.filter(fecha_creacion__gte=_day_start(start))
+    if end is not None:
+        queryset = queryset.filter(fecha_creacion__lt=_day_start(end + datetime.timedelta(days=1)))
+    return queryset.order_by('id').values_list(*EXPORT_FIELDS)
+
+
+HEADER = (*EXPORT_FIELDS[:4], 'vertical_nombre', *EXPORT_FIELDS[4:])
+
+
+def _record(row):
+    record = dict(zip(EXPORT_FIELDS, row))
+    record['vertical_nombre'] = VERTICALS.get(record['vertical'])
+    for name in ('fecha_creacion', 'fecha_actualizacion'):
+        if record[name] is not None:
+            record[name] = record[name].isoformat()
+    return record
+
+
+# Un texto que empieza con estos caracteres se interpreta como fórmula al
+# abrir el CSV en una planilla; se antepone ' para que quede como texto
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_parts(rows, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADER)
+    # La cabecera sale antes de ejecutar la consulta
+    yield _drain(buffer)
+
+    for index, row in enumerate(rows, start=1):
+        record = _record(row)
+        writer.writerow([_csv_cell(record[name]) for name in HEADER])
+        if index % chunk_size == 0:
+            yield _drain(buffer)
+    tail = _drain(buffer)
+    if tail:
+        yield tail
+
+
+def _jsonl_parts(rows, chunk_size):
+    lines = []
+    for index, row in enumerate(rows):
+        lines.append(json.dumps(_record(row), ensure_ascii=False, separators=(',', ':')))
+        # La primera fila sale sola para que el cliente reciba datos enseguida
+        if index == 0 or len(lines) >= chunk_size:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines = []
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _drain(buffer):
+    data = buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def stream_results(rows, fmt='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Genera la exportación por partes de chunk_size filas. rows es un
+    values_list de export_queryset() y se recorre con iterator(), así que
+    la memoria no depende de la cantidad de perfiles.
+    """
+    rows = rows.iterator(chunk_size=chunk_size)
+    if fmt == 'csv':
+        return _csv_parts(rows, chunk_size)
+    return _jsonl_parts(rows, chunk_size)
+
+
+def export_response(rows, fmt='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    response = StreamingHttpResponse(stream_results(rows, fmt, chunk_size), content_type=EXPORT_FORMATS[fmt])
+    filename = f"resultados-{timezone.localdate().isoformat()}.{fmt}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,174 @@
+import threading
+
+from django.core.cache import cache
+from django.db.models import FilteredRelation, Q
+
+from core.models.sections.listening import ListeningTest
+from core.models.sections.reading import ReadingTest
+from core.utils.content_cache import content_version
+
+# Las claves viejas quedan huérfanas al cambiar la versión; expiran solas
+ANSWER_KEY_TIMEOUT = 60 * 60 * 24
+
+# Modelo de test y ruta hasta sus preguntas para cada sección calificable
+SECTION_QUESTIONS = {
+    'listening': (ListeningTest, 'blocks__questions'),
+    'reading': (ReadingTest, 'reading_blocks__questions'),
+}
+
+
+class AnswerKey:
+    """
+    Clave de respuestas compacta de un test: ids de pregunta en orden y, por
+    pregunta, el conjunto de ids de opciones correctas.
+    """
+
+    def __init__(self, question_ids, correct_options):
+        self.question_ids = tuple(question_ids)
+        self.correct_options = correct_options
+
+    @property
+    def total_questions(self):
+        return len(self.question_ids)
+
+
+def build_answer_key(section, test_id):
+    """
+    Carga la clave de respuestas de un test en una sola consulta: un LEFT JOIN
+    del test con sus preguntas y sus opciones correctas. Devuelve None si el
+    test no existe.
+    """
+    model, questions_path = SECTION_QUESTIONS[section]
+    options_path = f'{questions_path}__options'
+    rows = list(
+        model.objects
+        .filter(pk=test_id)
+        .annotate(correct_option=FilteredRelation(
+            options_path, condition=Q(**{f'{options_path}__is_correct': True})
+        ))
+        .order_by(f'{questions_path}__id')
+        .values_list(f'{questions_path}__id', 'correct_option__id')
+    )
+    if not rows:
+        return None
+
+    question_ids = []
+    correct_options = {}
+    for question_id, option_id in rows:
+        if question_id is None:
+            continue
+        if question_id not in correct_options:
+            question_ids.append(question_id)
+            correct_options[question_id] = set()
+        if option_id is not None:
+            correct_options[question_id].add(option_id)
+
+    return AnswerKey(
+        question_ids,
+        {question_id: frozenset(options) for question_id, options in correct_options.items()}
+    )
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def grade_answers(answer_key, answers):
+    """
+    Califica un dict {question_id: option_id} contra la clave de respuestas.
+    Devuelve los totales, el puntaje (0-100) y el detalle por pregunta.
+    """
+    selected = {}
+    for question_id, option_id in (answers or {}).items():
+        question_id = _to_int(question_id)
+        option_id = _to_int(option_id)
+        if question_id is not None and option_id:
+            selected[question_id] = option_id
+
+    question_results = {}
+    correct_answers = 0
+    for question_id in answer_key.question_ids:
+        is_correct = selected.get(question_id) in answer_key.correct_options[question_id]
+        question_results[str(question_id)] = is_correct
+        if is_correct:
+            correct_answers += 1
+
+    total_questions = answer_key.total_questions
+    score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
+
+    return {
+        'total_questions': total_questions,
+        'correct_answers': correct_answers,
+        'score': score,
+        'question_results': question_results,
+    }
+
+
+class AnswerKeyCache:
+    """
+    Cache de claves de respuestas: L1 en memoria del proceso y L2 en la cache
+    de Django, ambas indexadas por la versión de contenido del test (que se
+    invalida con señales al editar tests, bloques, preguntas u opciones).
+    """
+
+    def __init__(self):
+        self._local = {}
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get(self, section, test_id):
+        version = content_version(section, test_id)
+        local_key = (section, test_id)
+
+        entry = self._local.get(local_key)
+        if entry is not None and entry[0] == version:
+            self.local_hits += 1
+            return entry[1]
+
+        shared_key = f"answer_key:{section}:{test_id}:{version}"
+        answer_key = cache.get(shared_key)
+        if answer_key is not None:
+            self.shared_hits += 1
+        else:
+            self.misses += 1
+            answer_key = build_answer_key(section, test_id)
+            if answer_key is None:
+                return None
+            cache.set(shared_key, answer_key, timeout=ANSWER_KEY_TIMEOUT)
+
+        with self._lock:
+            self._local[local_key] = (version, answer_key)
+        return answer_key
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self):
+        lookups = self.local_hits + self.shared_hits + self.misses
+        hits = self.local_hits + self.shared_hits
+        return {
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+
+answer_keys = AnswerKeyCache()
+
+
+def grade_submission(section, test_id, answers):
+    """
+    Califica usando la clave cacheada. Devuelve None si el test no existe.
+    """
+    test_id = _to_int(test_id)
+    answer_key = answer_keys.get(section, test_id) if test_id is not None else None
+    if answer_key is None:
+        return None
+    return grade_answers(answer_key, answers)
@@ -0,0 +1,25 @@
+from django.db import transaction
+
+from core.models.sections.history import SectionResult
+
+
+def multiple_choice_detail(result):
+    """
+    Resumen compacto de una sección de opción múltiple: aciertos, total y
+    las preguntas falladas
+    """
+    return {
+        'correct': result['correct_answers'],
+        'total': result['total_questions'],
+        'wrong': [int(question_id) for question_id, ok in result['question_results'].items() if not ok],
+    }
+
+
+def record_section_result(profile, section, test_id, score, detail=None):
+    """
+    Guarda el resultado en el perfil (solo las columnas que cambian) y agrega
+    la fila de historial en la misma transacción
+    """
+    with transaction.atomic():
+        profile.registrar_resultado(section, score)
+        return SectionResult.record(profile, section, test_id, score, detail)
@@ -0,0 +1,197 @@
+import bisect
+import logging
+import threading
+import time
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Políticas por servicio externo. Se pueden sobrescribir por clave con
+# settings.OUTBOUND_HTTP_SERVICES = {"auth0": {"timeout": (2, 5)}, ...}
+DEFAULT_SERVICES = {
+    "auth0": {
+        "timeout": (3.05, 10),
+        "retries": 3,
+        "backoff_factor": 0.2,
+        "backoff_jitter": 0.3,
+        "status_forcelist": (429, 500, 502, 503, 504),
+        "allowed_methods": ("GET", "POST", "PATCH"),
+        "pool_maxsize": 20,
+    },
+    "speechace": {
+        # Solo se reintentan errores de conexión: un POST ya recibido se cobra
+        "timeout": (3.05, 50),
+        "retries": 2,
+        "retry_reads": False,
+        "backoff_factor": 0.5,
+        "backoff_jitter": 0.5,
+        "status_forcelist": (),
+        "allowed_methods": (),
+        "pool_maxsize": 20,
+    },
+    "cohere": {
+        "timeout": 60,
+        "pool_maxsize": 20,
+    },
+}
+
+# Límites superiores (ms) de los buckets del histograma de latencia
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float("inf"))
+
+
+def get_service_config(service):
+    config = dict(DEFAULT_SERVICES.get(service, {}))
+    config.update(getattr(settings, "OUTBOUND_HTTP_SERVICES", {}).get(service, {}))
+    return config
+
+
+class OutboundMetrics:
+    """
+    Histogramas de latencia y conteo de status por servicio externo
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._services = {}
+
+    def record(self, service, elapsed_ms, status):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)
+        with self._lock:
+            data = self._services.setdefault(service, {
+                "calls": 0,
+                "total_ms": 0.0,
+                "latency_buckets": [0] * len(LATENCY_BUCKETS_MS),
+                "status": {},
+            })
+            data["calls"] += 1
+            data["total_ms"] += elapsed_ms
+            data["latency_buckets"][bucket] += 1
+            data["status"][status] = data["status"].get(status, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for service, data in self._services.items():
+                result[service] = {
+                    "calls": data["calls"],
+                    "mean_ms": data["total_ms"] / data["calls"] if data["calls"] else 0,
+                    "latency_buckets": dict(zip(
+                        [str(b) for b in LATENCY_BUCKETS_MS], data["latency_buckets"]
+                    )),
+                    "status": dict(data["status"]),
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._services.clear()
+
+
+metrics = OutboundMetrics()
+
+_sessions = {}
+_httpx_clients = {}
+_lock = threading.Lock()
+
+
+def _build_retry(config):
+    retries = config.get("retries", 0)
+    return Retry(
+        total=retries,
+        connect=retries,
+        read=retries if config.get("retry_reads", True) else 0,
+        status=retries,
+        allowed_methods=frozenset(config.get("allowed_methods", ())),
+        status_forcelist=config.get("status_forcelist", ()),
+        backoff_factor=config.get("backoff_factor", 0),
+        backoff_jitter=config.get("backoff_jitter", 0.0),
+        raise_on_status=False,
+    )
+
+
+def get_session(service):
+    """
+    Sesión keep-alive compartida del servicio, con pool y política de reintentos
+    """
+    session = _sessions.get(service)
+    if session is not None:
+        return session
+    with _lock:
+        session = _sessions.get(service)
+        if session is None:
+            config = get_service_config(service)
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=config.get("pool_maxsize", 10),
+                max_retries=_build_retry(config),
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[service] = session
+    return session
+
+
+def request(service, method, url, **kwargs):
+    """
+    Hace la llamada con la sesión del servicio, su timeout por defecto y
+    registra latencia y status en `metrics`.
+    """
+    kwargs.setdefault("timeout", get_service_config(service).get("timeout"))
+    started = time.perf_counter()
+    try:
+        response = get_session(service).request(method, url, **kwargs)
+    except requests.exceptions.RequestException as e:
+        metrics.record(service, (time.perf_counter() - started) * 1000, type(e).__name__)
+        raise
+    metrics.record(service, (time.perf_counter() - started) * 1000, response.status_code)
+    return response
+
+
+def get(service, url, **kwargs):
+    return request(service, "GET", url, **kwargs)
+
+
+def post(service, url, **kwargs):
+    return request(service, "POST", url, **kwargs)
+
+
+def patch(service, url, **kwargs):
+    return request(service, "PATCH", url, **kwargs)
+
+
+def get_httpx_client(service):
+    """
+    Cliente httpx con pool propio para SDKs que lo aceptan (p.ej. Cohere).
+    Las métricas se registran con event hooks.
+    """
+    client = _httpx_clients.get(service)
+    if client is not None:
+        return client
+    with _lock:
+        client = _httpx_clients.get(service)
+        if client is None:
+            config = get_service_config(service)
+
+            def on_request(req):
+                req.extensions["started_at"] = time.perf_counter()
+
+            def on_response(resp):
+                started = resp.request.extensions.get("started_at", time.perf_counter())
+                metrics.record(service, (time.perf_counter() - started) * 1000, resp.status_code)
+
+            client = httpx.Client(
+                timeout=config.get("timeout"),
+                limits=httpx.Limits(
+                    max_connections=config.get("pool_maxsize", 10),
+                    max_keepalive_connections=config.get("pool_maxsize", 10),
+                ),
+                event_hooks={"request": [on_request], "response": [on_response]},
+            )
+            _httpx_clients[service] = client
+    return client
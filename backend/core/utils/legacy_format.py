@@ -0,0 +1,154 @@
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.models.sections.listening import ListeningTest, ListeningBlock, ListeningQuestion
+from core.utils.content_cache import content_version
+from core.utils.querysets import listening_blocks, listening_questions
+
+# Las entradas viejas quedan huérfanas al cambiar la versión; expiran solas
+LEGACY_FORMAT_TIMEOUT = 60 * 60 * 24
+
+# Bloques por grupo al enviar por partes
+LEGACY_STREAM_BLOCKS = 20
+
+
+def _dumps(data):
+    # Mismo formato que el JSONRenderer de DRF: compacto y en UTF-8
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _question(question, include_answers):
+    return {
+        "id": question.id,
+        "text": question.question_text,
+        "type": question.question_type,
+        "options": [
+            {
+                "id": option.id,
+                "text": option.option_text,
+                "is_correct": option.is_correct if include_answers else None
+            }
+            for option in question.options.all()
+        ]
+    }
+
+
+def _block(block, questions, include_answers):
+    return {
+        "id": block.id,
+        "instructions": block.instructions,
+        "video_url": block.video_file.url if block.video_file else None,
+        "questions": [_question(question, include_answers) for question in questions]
+    }
+
+
+def _head(test):
+    return {
+        'id': test.id,
+        'title': test.title,
+        'description': test.description,
+        'vertical': test.vertical,
+    }
+
+
+def render_legacy(test, include_answers):
+    """
+    Formato anterior de un test ya cargado con listening_blocks(). Los
+    is_correct solo se incluyen para staff.
+    """
+    data = _head(test)
+    data['blocks'] = [
+        _block(block, block.questions.all(), include_answers)
+        for block in test.blocks.all()
+    ]
+    return _dumps(data)
+
+
+def stream_legacy(test, include_answers, version=None):
+    """
+    Genera el mismo JSON por partes para que un test muy grande no se arme
+    completo en memoria. Los bloques se cargan de a LEGACY_STREAM_BLOCKS con
+    sus preguntas y opciones prefetcheadas (dos consultas por grupo).
+
+    Con version, si el test no pasa de LEGACY_FORMAT_STREAM_THRESHOLD
+    preguntas (p.ej. pedido con ?stream=1) guarda lo enviado en la cache,
+    igual que build_payload. Al pasar el límite deja de acumular: los tests
+    grandes no se guardan completos ni en memoria ni en la cache.
+    """
+    limit = settings.LEGACY_FORMAT_STREAM_THRESHOLD
+    head = _dumps(_head(test))
+    parts = [] if version is not None else None
+    questions = 0
+
+    def emit(part):
+        if parts is not None:
+            parts.append(part)
+        return part
+
+    yield emit(head[:-1] + b',"blocks":[')
+
+    blocks = (
+        ListeningBlock.objects
+        .filter(test_id=test.id)
+        .order_by('id')
+        .prefetch_related(listening_questions())
+    )
+    for index, block in enumerate(blocks.iterator(chunk_size=LEGACY_STREAM_BLOCKS)):
+        block_questions = block.questions.all()
+        questions += len(block_questions)
+        if questions > limit:
+            parts = None
+        chunk = _dumps(_block(block, block_questions, include_answers))
+        yield emit(chunk if index == 0 else b',' + chunk)
+
+    yield emit(b']}')
+    if parts is not None:
+        cache.set(_cache_key(test.id, include_answers, version), b''.join(parts), timeout=LEGACY_FORMAT_TIMEOUT)
+
+
+def should_stream(test_id, version=None):
+    """
+    Los tests con más preguntas que LEGACY_FORMAT_STREAM_THRESHOLD se envían
+    por partes. Con version, la decisión se cachea junto a la salida para no
+    contar las preguntas en cada pedido.
+    """
+    key = f"legacy_format:stream:{test_id}:{version}" if version is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    questions = ListeningQuestion.objects.filter(block__test_id=test_id).count()
+    result = questions > settings.LEGACY_FORMAT_STREAM_THRESHOLD
+    if key is not None:
+        cache.set(key, result, timeout=LEGACY_FORMAT_TIMEOUT)
+    return result
+
+
+def _cache_key(test_id, include_answers, version):
+    return f"legacy_format:{test_id}:{int(include_answers)}:{version}"
+
+
+def get_cached_payload(test_id, include_answers, version=None):
+    version = version or content_version('listening', test_id)
+    return cache.get(_cache_key(test_id, include_answers, version))
+
+
+def build_payload(test_id, include_answers, version=None):
+    """
+    Arma el JSON con una sola carga prefetcheada y lo guarda en la cache con
+    la versión del contenido en la clave. None si el test no existe.
+    """
+    version = version or content_version('listening', test_id)
+    test = (
+        ListeningTest.objects
+        .filter(pk=test_id)
+        .prefetch_related(listening_blocks())
+        .first()
+    )
+    if test is None:
+        return None
+    payload = render_legacy(test, include_answers)
+    cache.set(_cache_key(test_id, include_answers, version), payload, timeout=LEGACY_FORMAT_TIMEOUT)
+    return payload
@@ -0,0 +1,315 @@
+import bisect
+import threading
+import time
+from itertools import accumulate
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from core.models.sections.rollups import RollupChange, ScoreHistogramBin
+from core.models.sections.user_profile import UserProfile
+
+# Tramos de 0,1 puntos entre 0 y 100
+BINS_PER_POINT = 10
+BINS = 100 * BINS_PER_POINT + 1
+
+
+def score_bin(score):
+    return min(BINS - 1, max(0, int(score * BINS_PER_POINT)))
+
+
+def diff(changes):
+    """
+    {vertical: {tramo: delta}} de una lista de cambios (estado anterior,
+    estado nuevo) con vertical y resultado_general
+    """
+    deltas = {}
+    for state, sign in ((state, sign) for old, new in changes for state, sign in ((old, -1), (new, 1))):
+        if state is None or state.get('resultado_general') is None:
+            continue
+        bins = deltas.setdefault(state['vertical'], {})
+        index = score_bin(state['resultado_general'])
+        bins[index] = bins.get(index, 0) + sign
+    return {
+        vertical: {index: delta for index, delta in bins.items() if delta}
+        for vertical, bins in deltas.items()
+        if any(bins.values())
+    }
+
+
+def _add(vertical, index, delta):
+    """
+    Suma delta al tramo con un UPDATE ... SET count = count + delta, que solo
+    bloquea esa fila hasta el commit. Si el tramo todavía no existe se crea.
+    """
+    rows = ScoreHistogramBin.objects.filter(vertical=vertical, bin=index)
+    if rows.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            ScoreHistogramBin.objects.create(vertical=vertical, bin=index, count=delta)
+    except IntegrityError:
+        # Otra transacción creó el tramo en el medio
+        rows.update(count=F('count') + delta)
+
+
+def apply(deltas):
+    """
+    Aplica {vertical: {tramo: delta}} tramo por tramo, en orden de
+    (vertical, tramo) para no generar deadlocks
+    """
+    if not deltas:
+        return
+    with transaction.atomic():
+        for vertical in sorted(deltas):
+            for index in sorted(deltas[vertical]):
+                _add(vertical, index, deltas[vertical][index])
+        verticals = list(deltas)
+        transaction.on_commit(lambda: bump(verticals))
+
+
+def stored_counts(vertical):
+    """
+    Conteos guardados de una vertical como lista de BINS tramos
+    """
+    counts = [0] * BINS
+    for index, count in ScoreHistogramBin.objects.filter(vertical=vertical).values_list('bin', 'count'):
+        counts[index] = count
+    return counts
+
+
+def stored_histograms():
+    # {vertical: [conteos]} de todas las verticales con tramos guardados
+    histograms = {}
+    for vertical, index, count in ScoreHistogramBin.objects.values_list('vertical', 'bin', 'count'):
+        histograms.setdefault(vertical, [0] * BINS)[index] = count
+    return histograms
+
+
+def _version_key(vertical):
+    return f"percentiles:version:{vertical}"
+
+
+def bump(verticals):
+    """
+    Cambia la versión de las verticales; las demás instancias releen el
+    histograma cuando vence su ttl, este proceso en la próxima consulta
+    """
+    token = time.time_ns()
+    cache.set_many({_version_key(vertical): token for vertical in verticals}, timeout=None)
+    distributions.discard(verticals)
+
+
+def version(vertical):
+    key = _version_key(vertical)
+    token = cache.get(key)
+    if token is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        token = cache.get(key)
+    return token
+
+
+class Distribution:
+    """
+    Histograma acumulado de una vertical: below(i) es cuántos perfiles
+    quedaron en tramos anteriores a i
+    """
+
+    def __init__(self, counts):
+        self.counts = counts or [0] * BINS
+        self.cumulative = list(accumulate(self.counts))
+        self.total = self.cumulative[-1] if self.cumulative else 0
+
+    def rank(self, score):
+        """
+        Devuelve (percentil, porcentaje superior). El percentil cuenta la mitad
+        de los empates del tramo; el porcentaje superior es la parte de la
+        vertical con un resultado igual o mayor (el "top X%").
+        """
+        if not self.total:
+            return None, None
+        index = score_bin(score)
+        below = self.cumulative[index - 1] if index else 0
+        same = self.counts[index]
+        percentile = 100 * (below + same / 2) / self.total
+        top = 100 * (self.total - below) / self.total
+        return percentile, top
+
+    def score_at(self, percentile):
+        """
+        Puntaje (límite inferior del tramo) en el que se alcanza un percentil
+        """
+        if not self.total:
+            return None
+        index = bisect.bisect_left(self.cumulative, self.total * percentile / 100)
+        return min(index, BINS - 1) / BINS_PER_POINT
+
+
+class DistributionCache:
+    """
+    Distribuciones por vertical en memoria del proceso. Durante ttl segundos
+    se usan sin consultar nada; después se compara la versión, que vive en
+    la cache compartida, y solo se releen los tramos si cambió.
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return settings.PERCENTILE_CACHE_TTL
+
+    def get(self, vertical):
+        now = time.monotonic()
+        entry = self._entries.get(vertical)
+        if entry is not None and now - entry[2] < self.ttl:
+            self.hits += 1
+            return entry[0]
+
+        current = version(vertical)
+        if entry is not None and entry[1] == current:
+            self.hits += 1
+            distribution = entry[0]
+        else:
+            self.misses += 1
+            distribution = Distribution(stored_counts(vertical))
+        with self._lock:
+            self._entries[vertical] = (distribution, current, now)
+        return distribution
+
+    def discard(self, verticals):
+        with self._lock:
+            for vertical in verticals:
+                self._entries.pop(vertical, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'verticals': len(self._entries)}
+
+
+distributions = DistributionCache()
+
+
+def rank(vertical, score):
+    """
+    Posición de un puntaje dentro de su vertical. Con la distribución ya en
+    memoria no hace consultas. Refleja los cambios que ya aplicó
+    apply_rollup_changes (core.utils.rollups.apply_pending). percentile y top_percent son None si la
+    vertical no tiene resultados.
+    """
+    distribution = distributions.get(vertical)
+    percentile, top = distribution.rank(score)
+    return {
+        'vertical': vertical,
+        'score': score,
+        'percentile': percentile,
+        'top_percent': top,
+        'total': distribution.total,
+    }
+
+
+def record_changes(changes):
+    """
+    Aplica a los histogramas una lista de (estado anterior, estado nuevo)
+    """
+    apply(diff(changes))
+
+
+def exact_histograms(chunk_size=5000):
+    """
+    Histogramas exactos desde UserProfile, recorriendo la tabla por partes
+    y contando cada lote con numpy. Devuelve {vertical: [conteos]}.
+    """
+    histograms = {}
+    rows = (
+        UserProfile.objects
+        .filter(resultado_general__isnull=False)
+        .order_by()
+        .values_list('vertical', 'resultado_general')
+        .iterator(chunk_size=chunk_size)
+    )
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _count_chunk(histograms, chunk)
+            chunk = []
+    _count_chunk(histograms, chunk)
+    return {vertical: counts.tolist() for vertical, counts in histograms.items()}
+
+
+def _count_chunk(histograms, chunk):
+    if not chunk:
+        return
+    data = np.array(chunk, dtype=np.float64)
+    verticals = data[:, 0].astype(np.int64)
+    # Mismo cálculo de tramo que score_bin
+    bins = np.clip((data[:, 1] * BINS_PER_POINT).astype(np.int64), 0, BINS - 1)
+    for vertical in np.unique(verticals):
+        counts = np.bincount(bins[verticals == vertical], minlength=BINS)
+        vertical = int(vertical)
+        histograms[vertical] = histograms.get(vertical, 0) + counts
+
+
+def pending_deltas(lock=False):
+    """
+    Deltas de los cambios encolados en RollupChange que todavía no se
+    aplicaron. Con lock las filas quedan tomadas hasta el commit y
+    apply_pending (que usa SKIP LOCKED) no las aplica en el medio.
+    """
+    rows = RollupChange.objects.select_for_update() if lock else RollupChange.objects.all()
+    return diff(rows.values_list('previous', 'current'))
+
+
+def reconcile(chunk_size=5000, dry_run=False):
+    """
+    Compara los histogramas guardados (más los cambios todavía encolados)
+    con los exactos y corrige los tramos que difieran; con dry_run solo los
+    informa. Devuelve {vertical: (total guardado, total exacto)} de las
+    verticales que no coincidían.
+
+    Las correcciones se suman con F() como diferencias, y la lectura y la
+    corrección ocurren con las escrituras de perfiles frenadas
+    (UserProfile.objects.bloquear_escrituras), así no se pisa ningún cambio
+    hecho en el medio.
+    """
+    with transaction.atomic():
+        if not dry_run:
+            UserProfile.objects.bloquear_escrituras()
+        # La cola primero: un lote que se esté aplicando termina antes de leer los tramos
+        pending = pending_deltas(lock=not dry_run)
+        exact = exact_histograms(chunk_size)
+        stored = stored_histograms()
+        for vertical, bins in pending.items():
+            counts = stored.setdefault(vertical, [0] * BINS)
+            for index, delta in bins.items():
+                counts[index] += delta
+
+        fixed = {}
+        corrections = {}
+        for vertical in sorted(set(exact) | set(stored)):
+            counts = exact.get(vertical, [0] * BINS)
+            current = stored.get(vertical, [0] * BINS)
+            if current == counts:
+                continue
+            fixed[vertical] = (sum(current), sum(counts))
+            corrections[vertical] = {
+                index: count - previous
+                for index, (count, previous) in enumerate(zip(counts, current))
+                if count != previous
+            }
+        if not dry_run:
+            apply(corrections)
+    return fixed
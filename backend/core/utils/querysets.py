@@ -0,0 +1,70 @@
+from django.db.models import Prefetch
+
+from core.models.sections.listening import ListeningBlock, ListeningQuestion, ListeningOption
+from core.models.sections.reading import ReadingBlock, ReadingQuestion, ReadingOption
+from core.models.sections.writing import WritingBlock
+from core.models.sections.speaking import SpeakingBlock
+
+# Planes de prefetch para serializar los árboles de tests con un número fijo
+# de consultas: una por nivel (test, bloques, preguntas, opciones) sin importar
+# cuántos tests, bloques o preguntas haya. Cada nivel se ordena por id para
+# que el orden de la respuesta sea estable.
+
+
+def listening_options():
+    return Prefetch('options', queryset=ListeningOption.objects.order_by('id'))
+
+
+def listening_questions():
+    return Prefetch(
+        'questions',
+        queryset=ListeningQuestion.objects.order_by('id').prefetch_related(listening_options())
+    )
+
+
+def listening_blocks():
+    return Prefetch(
+        'blocks',
+        queryset=ListeningBlock.objects.order_by('id').prefetch_related(listening_questions())
+    )
+
+
+def reading_options():
+    return Prefetch('options', queryset=ReadingOption.objects.order_by('id'))
+
+
+def reading_questions():
+    return Prefetch(
+        'questions',
+        queryset=ReadingQuestion.objects.order_by('id').prefetch_related(reading_options())
+    )
+
+
+def reading_blocks():
+    return Prefetch(
+        'reading_blocks',
+        queryset=ReadingBlock.objects.order_by('id').prefetch_related(reading_questions())
+    )
+
+
+def writing_blocks():
+    return Prefetch('writing_blocks', queryset=WritingBlock.objects.order_by('id'))
+
+
+def speaking_blocks():
+    return Prefetch('speaking_blocks', queryset=SpeakingBlock.objects.order_by('id'))
+
+
+TEST_TREE_PREFETCHES = {
+    'listening': listening_blocks,
+    'reading': reading_blocks,
+    'writing': writing_blocks,
+    'speaking': speaking_blocks,
+}
+
+
+def with_test_tree(section, queryset):
+    """
+    Ordena los tests por id y les agrega el prefetch del árbol completo de la sección
+    """
+    return queryset.order_by('id').prefetch_related(TEST_TREE_PREFETCHES[section]())
@@ -0,0 +1,416 @@
+import datetime
+import time
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from core.models.sections.rollups import ResultRollup, RollupChange
+from core.models.sections.user_profile import UserProfile
+from core.utils import percentiles
+
+# Métrica del rollup -> columna de UserProfile
+ROLLUP_METRICS = {
+    'listening': 'resultado_listening',
+    'speaking': 'resultado_speaking',
+    'reading': 'resultado_reading',
+    'writing': 'resultado_writing',
+    'general': 'resultado_general',
+}
+
+# Columnas del perfil que definen su aporte a los rollups
+STATE_FIELDS = ('vertical', 'nivel', 'fecha_creacion', *ROLLUP_METRICS.values())
+
+HISTOGRAM_BINS = 10
+
+SUMMARY_TIMEOUT = 60 * 60
+
+# Cambios encolados que se agregan por transacción
+PENDING_BATCH_SIZE = 1000
+
+
+def histogram_bin(score):
+    # Tramos de 10 puntos; el 100 cae en el último
+    return min(HISTOGRAM_BINS - 1, max(0, int(score // 10)))
+
+
+def _day(value):
+    if isinstance(value, datetime.datetime):
+        return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+    return value
+
+
+def rollup_key(state):
+    return (state['vertical'], state['nivel'] or '', _day(state['fecha_creacion']))
+
+
+def _empty_delta():
+    delta = {'profiles': 0}
+    for metric in ROLLUP_METRICS:
+        delta[metric] = [0, 0.0, [0] * HISTOGRAM_BINS]
+    return delta
+
+
+def accumulate(deltas, state, sign):
+    """
+    Suma (sign=1) o resta (sign=-1) el aporte de un perfil a {clave: delta}
+    """
+    if state is None:
+        return
+    delta = deltas.setdefault(rollup_key(state), _empty_delta())
+    delta['profiles'] += sign
+    for metric, field in ROLLUP_METRICS.items():
+        score = state[field]
+        if score is None:
+            continue
+        entry = delta[metric]
+        entry[0] += sign
+        entry[1] += sign * score
+        entry[2][histogram_bin(score)] += sign
+
+
+def _is_zero(delta):
+    return delta['profiles'] == 0 and all(
+        delta[metric][0] == 0 and delta[metric][1] == 0 and not any(delta[metric][2])
+        for metric in ROLLUP_METRICS
+    )
+
+
+def diff(changes):
+    """
+    Deltas de una lista de cambios (estado anterior, estado nuevo); None
+    como estado anterior es un alta y como estado nuevo una baja
+    """
+    deltas = {}
+    for old, new in changes:
+        accumulate(deltas, old, -1)
+        accumulate(deltas, new, 1)
+    return {key: delta for key, delta in deltas.items() if not _is_zero(delta)}
+
+
+def _locked_row(vertical, nivel, day):
+    rows = ResultRollup.objects.select_for_update()
+    row = rows.filter(vertical=vertical, nivel=nivel, day=day).first()
+    if row is not None:
+        return row
+    try:
+        with transaction.atomic():
+            return ResultRollup.objects.create(vertical=vertical, nivel=nivel, day=day)
+    except IntegrityError:
+        # Otra transacción creó la fila en el medio
+        return rows.get(vertical=vertical, nivel=nivel, day=day)
+
+
+def apply(deltas):
+    """
+    Aplica los deltas a la tabla. Cada fila se bloquea mientras se modifica
+    (en orden de clave, para no generar deadlocks) y se borra si queda sin
+    perfiles.
+    """
+    if not deltas:
+        return
+    with transaction.atomic():
+        for key in sorted(deltas):
+            delta = deltas[key]
+            row = _locked_row(*key)
+            row.profiles += delta['profiles']
+            changed = ['profiles', 'updated_at']
+            for metric in ROLLUP_METRICS:
+                count, total, histogram = delta[metric]
+                if not count and not total and not any(histogram):
+                    continue
+                setattr(row, f"{metric}_count", getattr(row, f"{metric}_count") + count)
+                setattr(row, f"{metric}_sum", getattr(row, f"{metric}_sum") + total)
+                setattr(row, f"{metric}_hist", [a + b for a, b in zip(getattr(row, f"{metric}_hist"), histogram)])
+                changed += [f"{metric}_count", f"{metric}_sum", f"{metric}_hist"]
+            if row.profiles <= 0:
+                row.delete()
+            else:
+                row.save(update_fields=changed)
+        verticals = {key[0] for key in deltas}
+        transaction.on_commit(lambda: bump(verticals))
+
+
+def saved_state(profile):
+    """
+    Estado con el que el perfil se leyó o se guardó por última vez (solo
+    las columnas que se cargaron)
+    """
+    loaded = getattr(profile, '_loaded_values', {})
+    return {field: loaded[field] for field in STATE_FIELDS if field in loaded}
+
+
+def current_state(profile, previous, fields=None):
+    """
+    Estado que queda en la base tras guardar. Con fields (los update_fields
+    del guardado) solo esas columnas salen de la instancia; el resto no se
+    escribió y sigue como estaba.
+    """
+    if fields is not None:
+        return {field: profile.__dict__[field] if field in fields else previous.get(field) for field in STATE_FIELDS}
+    # Sin tocar campos diferidos: lo que no se cargó no cambió
+    return {field: profile.__dict__.get(field, previous.get(field)) for field in STATE_FIELDS}
+
+
+def remember_state(profile, state):
+    # Dict nuevo: las copias de la cache de perfiles comparten el original
+    profile._loaded_values = {**getattr(profile, '_loaded_values', {}), **state}
+
+
+def previous_state(profile):
+    """
+    Estado guardado de un perfil que se va a modificar, releído con
+    SELECT ... FOR UPDATE: otro guardado del mismo perfil espera a que esta
+    transacción termine, así que el delta nunca parte de valores viejos de
+    la instancia. Debe llamarse dentro de una transacción (UserProfile.save
+    y delete ya la abren). Si save() ya releyó la fila con bloqueo
+    (UserProfile.refrescar_resultados) se usa esa lectura.
+    """
+    if profile._state.adding:
+        return None
+    locked = profile.__dict__.pop('_estado_bloqueado', None)
+    if locked is not None:
+        return locked
+    return UserProfile.objects.select_for_update().filter(pk=profile.pk).values(*STATE_FIELDS).first()
+
+
+def record_profiles(profiles):
+    """
+    Encola los cambios de perfiles modificados en memoria y guardados sin
+    save() (p.ej. con bulk_update); deben haberse leído con STATE_FIELDS y
+    select_for_update() en la misma transacción, para que el estado leído
+    siga siendo el de la base.
+    """
+    changes = []
+    for profile in profiles:
+        old = saved_state(profile)
+        new = current_state(profile, old)
+        changes.append((old, new))
+        remember_state(profile, new)
+    enqueue(changes)
+
+
+def _encode(state):
+    # En JSON la fecha de alta se guarda como el día, que es lo que usa la clave
+    if state is None:
+        return None
+    return {**state, 'fecha_creacion': _day(state['fecha_creacion']).isoformat()}
+
+
+def _decode(state):
+    if state is None:
+        return None
+    return {**state, 'fecha_creacion': datetime.date.fromisoformat(state['fecha_creacion'])}
+
+
+def enqueue(changes):
+    """
+    Guarda una lista de (estado anterior, estado nuevo) en RollupChange, en
+    la transacción del que llama. Solo un INSERT: los rollups y percentiles
+    se actualizan después con apply_pending.
+    """
+    changes = [(old, new) for old, new in changes if old != new]
+    if changes:
+        RollupChange.objects.bulk_create(
+            [RollupChange(previous=_encode(old), current=_encode(new)) for old, new in changes]
+        )
+
+
+def apply_pending(batch_size=PENDING_BATCH_SIZE):
+    """
+    Agrega los cambios encolados a los rollups y a los histogramas de
+    percentiles, de a batch_size por transacción. Las filas se toman con
+    SKIP LOCKED, así varios procesos pueden drenar a la vez. Devuelve
+    cuántos cambios se aplicaron.
+    """
+    applied = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                RollupChange.objects
+                .select_for_update(skip_locked=True)
+                .order_by('id')
+                .values_list('id', 'previous', 'current')[:batch_size]
+            )
+            if not rows:
+                return applied
+            changes = [(_decode(previous), _decode(current)) for _, previous, current in rows]
+            apply(diff(changes))
+            percentiles.record_changes(changes)
+            RollupChange.objects.filter(id__in=[row[0] for row in rows]).delete()
+        applied += len(rows)
+
+
+def iter_live_states(chunk_size=2000):
+    rows = (
+        UserProfile.objects
+        .order_by()
+        .values_list(*STATE_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield dict(zip(STATE_FIELDS, row))
+
+
+def live_deltas(chunk_size=2000):
+    """
+    Rollups calculados desde cero a partir de UserProfile, recorriendo la
+    tabla por partes. Devuelve {clave: delta}.
+    """
+    deltas = {}
+    for state in iter_live_states(chunk_size):
+        accumulate(deltas, state, 1)
+    return deltas
+
+
+def stored_deltas():
+    deltas = {}
+    for row in ResultRollup.objects.all():
+        delta = {'profiles': row.profiles}
+        for metric in ROLLUP_METRICS:
+            delta[metric] = [
+                getattr(row, f"{metric}_count"),
+                getattr(row, f"{metric}_sum"),
+                list(getattr(row, f"{metric}_hist")),
+            ]
+        deltas[(row.vertical, row.nivel, row.day)] = delta
+    return deltas
+
+
+def compare(stored, live, tolerance=1e-6):
+    """
+    Diferencias entre los rollups guardados y los calculados. Las sumas se
+    comparan con tolerancia porque acumulan restas y sumas de floats.
+    """
+    problems = []
+    for key in sorted(set(stored) | set(live)):
+        a = stored.get(key, _empty_delta())
+        b = live.get(key, _empty_delta())
+        if a['profiles'] != b['profiles']:
+            problems.append((key, 'profiles', a['profiles'], b['profiles']))
+        for metric in ROLLUP_METRICS:
+            (count_a, sum_a, hist_a), (count_b, sum_b, hist_b) = a[metric], b[metric]
+            if count_a != count_b:
+                problems.append((key, f"{metric}_count", count_a, count_b))
+            if abs(sum_a - sum_b) > tolerance * max(1.0, abs(sum_b)):
+                problems.append((key, f"{metric}_sum", sum_a, sum_b))
+            if list(hist_a) != list(hist_b):
+                problems.append((key, f"{metric}_hist", hist_a, hist_b))
+    return problems
+
+
+def rebuild(chunk_size=2000):
+    """
+    Reemplaza todos los rollups por los calculados desde UserProfile.
+    Devuelve cuántas filas quedaron.
+
+    Todo ocurre en una transacción que frena las escrituras de perfiles
+    (UserProfile.objects.bloquear_escrituras): los cambios encolados ya
+    están en los datos vivos y se descartan, y ningún guardado puede caer
+    entre la lectura y el reemplazo. Los percentiles se concilian aparte.
+    """
+    with transaction.atomic():
+        UserProfile.objects.bloquear_escrituras()
+        pending = [
+            (_decode(previous), _decode(current))
+            for previous, current in RollupChange.objects.select_for_update().values_list('previous', 'current')
+        ]
+        # Los histogramas de percentiles no se reconstruyen: reciben lo encolado antes de descartarlo
+        percentiles.record_changes(pending)
+        live = live_deltas(chunk_size)
+        rows = []
+        for (vertical, nivel, day), delta in live.items():
+            row = ResultRollup(vertical=vertical, nivel=nivel, day=day, profiles=delta['profiles'])
+            for metric in ROLLUP_METRICS:
+                count, total, histogram = delta[metric]
+                setattr(row, f"{metric}_count", count)
+                setattr(row, f"{metric}_sum", total)
+                setattr(row, f"{metric}_hist", histogram)
+            rows.append(row)
+        RollupChange.objects.all().delete()
+        ResultRollup.objects.all().delete()
+        ResultRollup.objects.bulk_create(rows, batch_size=1000)
+        transaction.on_commit(lambda: bump({row.vertical for row in rows}, everything=True))
+    return len(rows)
+
+
+# Versiones por vertical para cachear los resúmenes hasta el próximo cambio
+
+def _version_key(vertical):
+    return f"rollups:version:{vertical}"
+
+
+def _all_versions_key():
+    return "rollups:version:all"
+
+
+def bump(verticals, everything=False):
+    token = time.time_ns()
+    cache.set_many({_version_key(vertical): token for vertical in verticals}, timeout=None)
+    if everything:
+        cache.set(_all_versions_key(), token, timeout=None)
+
+
+def version(vertical):
+    keys = [_all_versions_key(), _version_key(vertical)]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), timeout=None)
+    values = cache.get_many(keys)
+    return f"{values.get(keys[0])}-{values.get(keys[1])}"
+
+
+def summarize(vertical, start=None, end=None):
+    """
+    Resumen de una vertical a partir de sus rollups (opcionalmente entre dos
+    días de alta): perfiles por nivel y, por sección, cantidad, promedio e
+    histograma. El costo depende de la cantidad de días, no de perfiles.
+    """
+    rows = ResultRollup.objects.filter(vertical=vertical)
+    if start is not None:
+        rows = rows.filter(day__gte=start)
+    if end is not None:
+        rows = rows.filter(day__lte=end)
+
+    niveles = {}
+    totals = {metric: [0, 0.0, [0] * HISTOGRAM_BINS] for metric in ROLLUP_METRICS}
+    profiles = 0
+    for row in rows:
+        profiles += row.profiles
+        niveles[row.nivel or None] = niveles.get(row.nivel or None, 0) + row.profiles
+        for metric in ROLLUP_METRICS:
+            entry = totals[metric]
+            entry[0] += getattr(row, f"{metric}_count")
+            entry[1] += getattr(row, f"{metric}_sum")
+            entry[2] = [a + b for a, b in zip(entry[2], getattr(row, f"{metric}_hist"))]
+
+    return {
+        'vertical': vertical,
+        'from': start.isoformat() if start else None,
+        'to': end.isoformat() if end else None,
+        'profiles': profiles,
+        'niveles': [{'nivel': nivel, 'profiles': count} for nivel, count in sorted(niveles.items(), key=lambda item: item[0] or '')],
+        'sections': {
+            metric: {
+                'count': count,
+                'average': total / count if count else None,
+                'histogram': histogram,
+            }
+            for metric, (count, total, histogram) in totals.items()
+        },
+    }
+
+
+def get_summary(vertical, start=None, end=None):
+    """
+    summarize() cacheado hasta que cambien los rollups de la vertical. La
+    versión y el resumen viven en la cache compartida, así que un cambio
+    hecho en un worker invalida el resumen en todos.
+    """
+    key = f"rollups:summary:{vertical}:{start}:{end}:{version(vertical)}"
+    summary = cache.get(key)
+    if summary is None:
+        summary = summarize(vertical, start, end)
+        cache.set(key, summary, timeout=SUMMARY_TIMEOUT)
+    return summary
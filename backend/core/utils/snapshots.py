@@ -0,0 +1,137 @@
+from rest_framework.renderers import JSONRenderer
+
+from core.models.sections.listening import ListeningTest
+from core.models.sections.reading import ReadingTest
+from core.models.sections.writing import WritingTest
+from core.models.sections.speaking import SpeakingTest
+from core.models.sections.snapshots import TestSnapshot
+from core.serializers.listening_serializers import ListeningTestSerializer
+from core.serializers.reading_serializers import ReadingTestSerializer
+from core.serializers.writing_serializers import WritingTestSerializer
+from core.serializers.speaking_serializers import SpeakingTestSerializer
+from core.utils.candidate_payloads import render_candidate
+from core.utils.content_cache import content_versions
+from core.utils.querysets import with_test_tree
+
+# Modelo y serializer de detalle de cada sección
+SNAPSHOT_SECTIONS = {
+    'listening': (ListeningTest, ListeningTestSerializer),
+    'reading': (ReadingTest, ReadingTestSerializer),
+    'writing': (WritingTest, WritingTestSerializer),
+    'speaking': (SpeakingTest, SpeakingTestSerializer),
+}
+
+
+def render_test(section, test):
+    """
+    Renderiza un test igual que su endpoint de detalle (mismo serializer y renderer)
+    """
+    _, serializer_class = SNAPSHOT_SECTIONS[section]
+    return JSONRenderer().render(serializer_class(test).data)
+
+
+# Cómo se renderiza cada variante de snapshot
+RENDERERS = {
+    TestSnapshot.VARIANT_FULL: render_test,
+    TestSnapshot.VARIANT_CANDIDATE: render_candidate,
+}
+
+
+def rebuild(section, test_ids=None, variant=TestSnapshot.VARIANT_FULL):
+    """
+    Reconstruye los snapshots de una variante para una sección, o solo para
+    los tests indicados.
+
+    La versión se lee antes que el contenido: si alguien edita el test en el
+    medio, el snapshot queda guardado con la versión anterior y se vuelve a
+    construir en la próxima lectura. Borra los snapshots de tests que ya no
+    existen. Devuelve {test_id: payload}.
+    """
+    model, _ = SNAPSHOT_SECTIONS[section]
+    full = test_ids is None
+    if full:
+        test_ids = model.objects.order_by('id').values_list('id', flat=True)
+    test_ids = list(test_ids)
+    if full:
+        TestSnapshot.objects.filter(section=section, variant=variant).exclude(test_id__in=test_ids).delete()
+    if not test_ids:
+        return {}
+
+    versions = content_versions(section, test_ids)
+    tests = with_test_tree(section, model.objects.filter(pk__in=test_ids))
+
+    render = RENDERERS[variant]
+    snapshots = []
+    payloads = {}
+    for test in tests:
+        payload = render(section, test)
+        payloads[test.id] = payload
+        snapshots.append(TestSnapshot(
+            section=section,
+            variant=variant,
+            test_id=test.id,
+            vertical=test.vertical,
+            content_version=versions[test.id],
+            payload=payload,
+        ))
+
+    TestSnapshot.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        unique_fields=['section', 'test_id', 'variant'],
+        update_fields=['vertical', 'content_version', 'payload', 'built_at'],
+    )
+
+    gone = [test_id for test_id in test_ids if test_id not in payloads]
+    if gone:
+        TestSnapshot.objects.filter(section=section, variant=variant, test_id__in=gone).delete()
+    return payloads
+
+
+def get_payloads(section, test_ids, variant=TestSnapshot.VARIANT_FULL):
+    """
+    Devuelve {test_id: payload} usando los snapshots vigentes y reconstruyendo
+    solo los que faltan o quedaron viejos. Los tests inexistentes no aparecen.
+    """
+    test_ids = list(test_ids)
+    if not test_ids:
+        return {}
+
+    versions = content_versions(section, test_ids)
+    rows = (
+        TestSnapshot.objects
+        .filter(section=section, variant=variant, test_id__in=test_ids)
+        .values_list('test_id', 'content_version', 'payload')
+    )
+    payloads = {
+        test_id: bytes(payload)
+        for test_id, version, payload in rows
+        if version == versions[test_id]
+    }
+
+    stale = [test_id for test_id in test_ids if test_id not in payloads]
+    if stale:
+        payloads.update(rebuild(section, stale, variant))
+    return payloads
+
+
+def get_test_payload(section, test_id, variant=TestSnapshot.VARIANT_FULL):
+    """
+    JSON del detalle de un test, o None si no existe
+    """
+    return get_payloads(section, [test_id], variant).get(test_id)
+
+
+def get_list_payload(section, vertical=None, variant=TestSnapshot.VARIANT_FULL):
+    """
+    JSON del listado de tests de una sección (opcionalmente de una vertical),
+    armado concatenando los snapshots en orden de id.
+    """
+    model, _ = SNAPSHOT_SECTIONS[section]
+    queryset = model.objects.order_by('id')
+    if vertical is not None:
+        queryset = queryset.filter(vertical=vertical)
+    test_ids = list(queryset.values_list('id', flat=True))
+
+    payloads = get_payloads(section, test_ids, variant)
+    return b'[' + b','.join(payloads[test_id] for test_id in test_ids if test_id in payloads) + b']'
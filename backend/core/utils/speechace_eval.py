@@ -2,6 +2,7 @@ import requests
 import json
 from django.conf import settings
 import logging
+from core.utils import http_client
 
 def evaluate_speaking(student_text, audio_file):
     try:
@@ -37,10 +38,11 @@ def evaluate_speaking(student_text, audio_file):
         print(f"📏 Tamaño del archivo: {file_size} bytes")
         # NO consumir el archivo con .read() aquí
 
-        response = requests.post(
+        # Sesión compartida: keep-alive, timeout y reintentos de conexión del servicio
+        response = http_client.post(
+            "speechace",
             settings.API_SPEECH_ACE_URL,
-            files=files,
-            timeout=50  # Agregar timeout
+            files=files
         )
 
         logging.info(f"[SPEAKING] Status code de Speechace: {response.status_code}")
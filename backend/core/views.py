@@ -0,0 +1,176 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date
+from rest_framework import status
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.response import Response
+
+from core.authentication import PUBLIC_AUTHENTICATION_CLASSES, profile_cache
+from core.constants import VERTICAL_CHOICES
+from core.models.sections.snapshots import TestSnapshot
+from core.utils import exports, http_client, percentiles, rollups
+from core.utils.bulk_grading import (
+    RESULT_FIELDS, DEFAULT_CHUNK_SIZE, detect_format, grade_file, grade_records, normalize_record
+)
+from core.utils.auth0 import jwks_store, verified_tokens
+from core.utils.conditional import conditional_response
+from core.utils.diagnostic import bundle_version, get_bundle
+from core.utils.grading import answer_keys
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """
+    Contadores de las caches y del cliente HTTP saliente de este proceso
+    """
+    return Response({
+        "jwks": jwks_store.stats(),
+        "verified_tokens": verified_tokens.stats(),
+        "profile_cache": profile_cache.stats(),
+        "answer_keys": answer_keys.stats(),
+        "percentiles": percentiles.distributions.stats(),
+        "outbound_http": http_client.metrics.snapshot(),
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def bulk_grade_view(request):
+    """
+    Califica hojas de respuestas de una cohorte completa.
+
+    Acepta un archivo `file` (CSV o JSON lines con email, test_id, answers) o
+    un JSON {"section": ..., "records": [...]}. Con dry_run=true solo califica
+    sin guardar los resultados en los perfiles.
+    """
+    section = request.data.get('section')
+    if section not in RESULT_FIELDS:
+        return Response(
+            {'error': f"section debe ser una de: {', '.join(RESULT_FIELDS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+    upload = request.FILES.get('file')
+    if upload is not None:
+        fmt = request.data.get('format') or detect_format(upload.name)
+        summary = grade_file(section, upload.read(), fmt, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=dry_run)
+    else:
+        raw_records = request.data.get('records')
+        if not isinstance(raw_records, list):
+            return Response(
+                {'error': 'Se requiere un archivo o una lista de registros'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        records = []
+        parse_errors = []
+        for line, raw in enumerate(raw_records, start=1):
+            record, error = normalize_record(raw, line)
+            if error:
+                parse_errors.append(error)
+            else:
+                records.append(record)
+        summary = grade_records(section, records, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=dry_run)
+        summary['errors'] = sorted(parse_errors + summary['errors'], key=lambda e: e.get('line', 0))
+
+    return Response(summary)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@authentication_classes(PUBLIC_AUTHENTICATION_CLASSES)
+def diagnostic_bundle_view(request, vertical):
+    """
+    Contenido de listening, reading, writing y speaking de una vertical en
+    una sola respuesta, con el mismo formato que los cuatro listados
+    ?vertical=. Con ?variant=candidate usa la versión sin respuestas correctas.
+    """
+    if vertical not in dict(VERTICAL_CHOICES):
+        return Response({'error': 'Vertical no encontrada'}, status=status.HTTP_404_NOT_FOUND)
+
+    variant = request.query_params.get('variant', TestSnapshot.VARIANT_FULL)
+    if variant not in dict(TestSnapshot.VARIANT_CHOICES):
+        return Response({'error': 'variant inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+    version = bundle_version(vertical)
+    response = conditional_response(
+        request,
+        version,
+        lambda: HttpResponse(get_bundle(vertical, variant, version), content_type='application/json')
+    )
+    if variant == TestSnapshot.VARIANT_CANDIDATE and response.status_code in (200, 304):
+        patch_cache_control(response, public=True, max_age=settings.CANDIDATE_PAYLOAD_MAX_AGE)
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def vertical_analytics_view(request, vertical):
+    """
+    Resumen de resultados de una vertical desde los rollups (core.utils.rollups),
+    sin recorrer UserProfile. Acepta ?from= y ?to= (YYYY-MM-DD) sobre el día
+    de alta de los perfiles.
+    """
+    if vertical not in dict(VERTICAL_CHOICES):
+        return Response({'error': 'Vertical no encontrada'}, status=status.HTTP_404_NOT_FOUND)
+
+    bounds = {}
+    for name in ('from', 'to'):
+        value = request.query_params.get(name)
+        bounds[name] = parse_date(value) if value else None
+        if value and bounds[name] is None:
+            return Response({'error': f"{name} debe tener formato YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(rollups.get_summary(vertical, bounds['from'], bounds['to']))
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def results_export_view(request):
+    """
+    Exporta los resultados de los perfiles en CSV (por defecto) o con
+    ?export_format=jsonl, enviándolos por partes a medida que se leen.
+    Filtros: ?vertical=, ?nivel=, ?from= y ?to= (YYYY-MM-DD, día de alta).
+    """
+    fmt = request.query_params.get('export_format', 'csv')
+    if fmt not in exports.EXPORT_FORMATS:
+        return Response(
+            {'error': f"export_format debe ser uno de: {', '.join(exports.EXPORT_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        filters = exports.parse_filters(request.query_params)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = exports.export_queryset(
+        vertical=filters.get('vertical'),
+        nivel=filters.get('nivel'),
+        start=filters.get('from'),
+        end=filters.get('to'),
+    )
+    return exports.export_response(rows, fmt)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@authentication_classes(PUBLIC_AUTHENTICATION_CLASSES)
+def percentile_view(request, vertical):
+    """
+    Percentil de ?score= (0 a 100) dentro de una vertical. Se responde desde
+    el histograma en memoria, sin consultar UserProfile.
+    """
+    if vertical not in dict(VERTICAL_CHOICES):
+        return Response({'error': 'Vertical no encontrada'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        score = float(request.query_params.get('score', ''))
+    except ValueError:
+        score = None
+    if score is None or not 0 <= score <= 100:
+        return Response({'error': 'score debe ser un número entre 0 y 100'}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(percentiles.rank(vertical, score))
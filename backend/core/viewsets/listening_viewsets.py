@@ -1,9 +1,16 @@
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from core.models.sections.listening import ListeningTest, ListeningBlock, ListeningQuestion, ListeningOption
 from core.models.sections.user_profile import UserProfile
+from core.authentication import PUBLIC_AUTHENTICATION_CLASSES, get_submitting_profile
+from core.utils.history import record_section_result, multiple_choice_detail
+from core.viewsets.mixins import SnapshotReadMixin, ConditionalGetMixin, test_id_from
+from core.utils.querysets import with_test_tree, listening_questions, listening_options
+from core.utils import content_cache, legacy_format
+from core.utils.grading import grade_submission
 from core.serializers.listening_serializers import (
     ListeningTestSerializer,
     ListeningBlockSerializer,
@@ -11,16 +18,18 @@ from core.serializers.listening_serializers import (
     ListeningOptionSerializer
 )
 
-class ListeningTestViewSet(viewsets.ModelViewSet):
+class ListeningTestViewSet(SnapshotReadMixin, viewsets.ModelViewSet):
     queryset = ListeningTest.objects.all()
     serializer_class = ListeningTestSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'listening'
 
     def get_queryset(self):
         """
         Filtra los tests por vertical si se proporciona en los parámetros de consulta
         """
-        queryset = super().get_queryset()
+        queryset = with_test_tree('listening', super().get_queryset())
         vertical = self.request.query_params.get('vertical', None)
         if vertical is not None:
             queryset = queryset.filter(vertical=vertical)
@@ -29,46 +38,41 @@ class ListeningTestViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def legacy_format(self, request, pk=None):
         """
-        Endpoint compatible con el formato anterior para obtener un test específico
+        Endpoint compatible con el formato anterior para obtener un test específico.
+        Sale de la cache mientras el contenido no cambie; si no está cacheado y
+        se pide ?stream=1 (o el test es muy grande) el JSON se envía por partes
+        y se guarda en la cache al terminar.
         """
+        test_id = test_id_from({'pk': pk})
+        if test_id is None:
+            return Response({'error': 'Test no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+        include_answers = request.user.is_staff
+        version = content_cache.content_version('listening', test_id)
+        return self.conditional_response(
+            request,
+            version,
+            lambda: self.build_legacy_format(request, test_id, include_answers, version),
+            extra=f"staff={include_answers}"
+        )
+
+    def build_legacy_format(self, request, test_id, include_answers, version):
         try:
-            test = self.get_object()
-            response_data = {
-                'id': test.id,
-                'title': test.title,
-                'description': test.description,
-                'vertical': test.vertical,
-                'blocks': []
-            }
-            
-            for block in test.blocks.all():
-                block_data = {
-                    "id": block.id,
-                    "instructions": block.instructions,
-                    "video_url": block.video_file.url if block.video_file else None,
-                    "questions": []
-                }
-                
-                for question in block.questions.all():
-                    question_data = {
-                        "id": question.id,
-                        "text": question.question_text,
-                        "type": question.question_type,
-                        "options": []
-                    }
-                    
-                    for option in question.options.all():
-                        question_data["options"].append({
-                            "id": option.id,
-                            "text": option.option_text,
-                            "is_correct": option.is_correct if request.user.is_staff else None
-                        })
-                        
-                    block_data["questions"].append(question_data)
-                
-                response_data["blocks"].append(block_data)
-                
-            return Response(response_data)
+            payload = legacy_format.get_cached_payload(test_id, include_answers, version)
+            if payload is None:
+                if request.query_params.get('stream') == '1' or legacy_format.should_stream(test_id, version):
+                    test = ListeningTest.objects.filter(pk=test_id).first()
+                    if test is None:
+                        return Response({'error': 'Test no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+                    return StreamingHttpResponse(
+                        legacy_format.stream_legacy(test, include_answers, version),
+                        content_type='application/json'
+                    )
+                payload = legacy_format.build_payload(test_id, include_answers, version)
+
+            if payload is None:
+                return Response({'error': 'Test no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+            return HttpResponse(payload, content_type='application/json')
         except Exception as e:
             return Response(
                 {"error": "Server error", "message": str(e)},
@@ -77,113 +81,76 @@ class ListeningTestViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def submit_answers(self, request, pk=None):
-        test = self.get_object()
         user_email = request.data.get('user_email')
         answers = request.data.get('answers', {})
         
-        if not user_email:
+        # El perfil sale del token (401 si no es válido); user_email solo se usa para clientes sin token
+        user_profile = get_submitting_profile(request, user_email)
+        if user_profile is None and not user_email:
             return Response(
                 {'error': 'Se requiere el email del usuario'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            user_profile = UserProfile.objects.get(email=user_email)
-        except UserProfile.DoesNotExist:
+        if user_profile is None:
             return Response(
                 {'error': 'Usuario no encontrado'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Obtener todas las preguntas del test
-        total_questions = 0
-        correct_answers = 0
-
-        for block in test.blocks.all():
-            for question in block.questions.all():
-                total_questions += 1
-                selected_option_id = answers.get(str(question.id))
-                
-                if selected_option_id:
-                    try:
-                        selected_option = ListeningOption.objects.get(
-                            id=selected_option_id,
-                            question=question
-                        )
-                        if selected_option.is_correct:
-                            correct_answers += 1
-                    except ListeningOption.DoesNotExist:
-                        continue
-
-        # Calcular porcentaje
-        if total_questions > 0:
-            score = (correct_answers / total_questions) * 100
-        else:
-            score = 0
-
-        # Actualizar el resultado en el perfil del usuario
-        user_profile.resultado_listening = score
-        user_profile.save()
+        # La clave de respuestas sale de cache; en frío es una sola consulta
+        result = grade_submission('listening', pk, answers)
+        if result is None:
+            return Response(
+                {'error': 'Test no encontrado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        # Actualizar el resultado en el perfil del usuario y el historial
+        record_section_result(user_profile, 'listening', int(pk), result['score'], multiple_choice_detail(result))
 
         return Response({
-            'total_questions': total_questions,
-            'correct_answers': correct_answers,
-            'score': score,
+            'total_questions': result['total_questions'],
+            'correct_answers': result['correct_answers'],
+            'score': result['score'],
+            'question_results': result['question_results'],
             'message': 'Respuestas procesadas correctamente'
         })
 
-    def list(self, request, *args, **kwargs):
-        """
-        Sobrescribimos el método list para manejar errores de manera consistente
-        """
-        try:
-            return super().list(request, *args, **kwargs)
-        except Exception as e:
-            return Response(
-                {"error": "Server error", "message": str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
-    def retrieve(self, request, *args, **kwargs):
-        """
-        Sobrescribimos el método retrieve para manejar errores de manera consistente
-        """
-        try:
-            return super().retrieve(request, *args, **kwargs)
-        except Exception as e:
-            return Response(
-                {"error": "Server error", "message": str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
-class ListeningBlockViewSet(viewsets.ModelViewSet):
+class ListeningBlockViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ListeningBlock.objects.all()
     serializer_class = ListeningBlockSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'listening'
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().order_by('id').prefetch_related(listening_questions())
         test_id = self.request.query_params.get('test_id', None)
         if test_id is not None:
             queryset = queryset.filter(test_id=test_id)
         return queryset
 
-class ListeningQuestionViewSet(viewsets.ModelViewSet):
+class ListeningQuestionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ListeningQuestion.objects.all()
     serializer_class = ListeningQuestionSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'listening'
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().order_by('id').prefetch_related(listening_options())
         block_id = self.request.query_params.get('block_id', None)
         if block_id is not None:
             queryset = queryset.filter(block_id=block_id)
         return queryset
 
-class ListeningOptionViewSet(viewsets.ModelViewSet):
+class ListeningOptionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ListeningOption.objects.all()
     serializer_class = ListeningOptionSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'listening'
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from core.models.sections.snapshots import TestSnapshot
+from core.utils import content_cache, snapshots
+from core.utils.conditional import conditional_response
+
+
+class ConditionalGetMixin:
+    """
+    GET condicional (ETag fuerte y Last-Modified) para los endpoints de contenido.
+
+    Los validadores salen de las versiones de core.utils.content_cache, que
+    se leen de la cache compartida sin tocar la base: todos los workers dan
+    el mismo ETag y, con If-None-Match vigente, se responde 304 sin ejecutar
+    serializers ni consultas (el detalle solo consulta a qué test pertenece
+    el objeto).
+    """
+    content_section = None
+
+    def conditional_response(self, request, version, build, extra=''):
+        return conditional_response(request, version, build, extra)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request,
+            content_cache.list_version(self.content_section),
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        # El detalle de un bloque, pregunta u opción se valida con la versión
+        # del test al que pertenece: editar otro test de la sección no lo invalida
+        build = lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        test_id = self.owner_test_id(kwargs.get('pk'))
+        if test_id is None:
+            return build()
+        return self.conditional_response(
+            request,
+            content_cache.content_version(self.content_section, test_id),
+            build
+        )
+
+    def owner_test_id(self, pk):
+        """
+        Id del test dueño del objeto según los resolvers de
+        content_cache.CONTENT_MODELS, sin los prefetch de get_queryset.
+        None si el objeto no existe.
+        """
+        model = self.get_queryset().model
+        try:
+            instance = model._default_manager.filter(pk=pk).first()
+        except (TypeError, ValueError):
+            return None
+        if instance is None:
+            return None
+        return content_cache.CONTENT_MODELS[model][1](instance)
+
+
+def test_id_from(kwargs):
+    try:
+        return int(kwargs.get('pk'))
+    except (TypeError, ValueError):
+        return None
+
+
+def vertical_from(query_params):
+    """
+    ?vertical= como entero, None si no vino o False si no es un número
+    """
+    vertical = query_params.get('vertical', None)
+    if vertical is None:
+        return None
+    try:
+        return int(vertical)
+    except ValueError:
+        return False
+
+
+class SnapshotReadMixin(ConditionalGetMixin):
+    """
+    Sirve list y retrieve de los tests desde los snapshots JSON guardados
+    (core.utils.snapshots) en lugar de recorrer el ORM y los serializers.
+
+    Agrega las rutas candidate/ y {id}/candidate/ con la variante compacta
+    sin respuestas correctas, que se puede guardar en caches compartidas.
+    """
+
+    def snapshot_list(self, request, variant):
+        vertical = vertical_from(request.query_params)
+        if vertical is False:
+            return Response({'error': 'vertical inválida'}, status=status.HTTP_400_BAD_REQUEST)
+        return self.conditional_response(
+            request,
+            content_cache.list_version(self.content_section, vertical),
+            lambda: self.render_list(vertical, variant)
+        )
+
+    def render_list(self, vertical, variant):
+        try:
+            payload = snapshots.get_list_payload(self.content_section, vertical, variant)
+            return HttpResponse(payload, content_type='application/json')
+        except Exception as e:
+            return Response(
+                {"error": "Server error", "message": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+    def snapshot_detail(self, request, variant, **kwargs):
+        test_id = test_id_from(kwargs)
+        if test_id is None:
+            return Response({'error': 'Test no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return self.conditional_response(
+            request,
+            content_cache.content_version(self.content_section, test_id),
+            lambda: self.render_detail(test_id, variant)
+        )
+
+    def render_detail(self, test_id, variant):
+        try:
+            payload = snapshots.get_test_payload(self.content_section, test_id, variant)
+        except Exception as e:
+            return Response(
+                {"error": "Server error", "message": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        if payload is None:
+            return Response({'error': 'Test no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return HttpResponse(payload, content_type='application/json')
+
+    def list(self, request, *args, **kwargs):
+        return self.snapshot_list(request, TestSnapshot.VARIANT_FULL)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.snapshot_detail(request, TestSnapshot.VARIANT_FULL, **kwargs)
+
+    @action(detail=False, methods=['get'], url_path='candidate')
+    def candidate_list(self, request):
+        return self.public(self.snapshot_list(request, TestSnapshot.VARIANT_CANDIDATE))
+
+    @action(detail=True, methods=['get'], url_path='candidate')
+    def candidate(self, request, pk=None):
+        return self.public(self.snapshot_detail(request, TestSnapshot.VARIANT_CANDIDATE, pk=pk))
+
+    @staticmethod
+    def public(response):
+        if response.status_code in (200, 304):
+            patch_cache_control(response, public=True, max_age=settings.CANDIDATE_PAYLOAD_MAX_AGE)
+        return response
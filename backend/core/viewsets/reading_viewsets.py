@@ -4,6 +4,11 @@ from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny
 from core.models.sections.reading import ReadingTest, ReadingBlock, ReadingQuestion, ReadingOption
 from core.models.sections.user_profile import UserProfile
+from core.authentication import PUBLIC_AUTHENTICATION_CLASSES, get_submitting_profile
+from core.utils.history import record_section_result, multiple_choice_detail
+from core.viewsets.mixins import SnapshotReadMixin, ConditionalGetMixin
+from core.utils.querysets import with_test_tree, reading_questions, reading_options
+from core.utils.grading import grade_submission
 from core.serializers.reading_serializers import (
     ReadingTestSerializer,
     ReadingBlockSerializer,
@@ -11,16 +16,18 @@ from core.serializers.reading_serializers import (
     ReadingOptionSerializer
 )
 
-class ReadingTestViewSet(viewsets.ModelViewSet):
+class ReadingTestViewSet(SnapshotReadMixin, viewsets.ModelViewSet):
     queryset = ReadingTest.objects.all()
     serializer_class = ReadingTestSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'reading'
 
     def get_queryset(self):
         """
         Filtra los tests por vertical si se proporciona en los parámetros de consulta
         """
-        queryset = super().get_queryset()
+        queryset = with_test_tree('reading', super().get_queryset())
         vertical = self.request.query_params.get('vertical', None)
         if vertical is not None:
             queryset = queryset.filter(vertical=vertical)
@@ -28,89 +35,76 @@ class ReadingTestViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def submit_answers(self, request, pk=None):
-        test = self.get_object()
         user_email = request.data.get('user_email')
         answers = request.data.get('answers', {})
         
-        if not user_email:
+        # El perfil sale del token (401 si no es válido); user_email solo se usa para clientes sin token
+        user_profile = get_submitting_profile(request, user_email)
+        if user_profile is None and not user_email:
             return Response(
                 {'error': 'Se requiere el email del usuario'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            user_profile = UserProfile.objects.get(email=user_email)
-        except UserProfile.DoesNotExist:
+        if user_profile is None:
             return Response(
                 {'error': 'Usuario no encontrado'},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Obtener todas las preguntas del test
-        total_questions = 0
-        correct_answers = 0
-
-        for block in test.reading_blocks.all():
-            for question in block.questions.all():
-                total_questions += 1
-                selected_option_id = answers.get(str(question.id))
-                
-                if selected_option_id:
-                    try:
-                        selected_option = ReadingOption.objects.get(
-                            id=selected_option_id,
-                            question=question
-                        )
-                        if selected_option.is_correct:
-                            correct_answers += 1
-                    except ReadingOption.DoesNotExist:
-                        continue
-
-        # Calcular porcentaje
-        if total_questions > 0:
-            score = (correct_answers / total_questions) * 100
-        else:
-            score = 0
+        # La clave de respuestas sale de cache; en frío es una sola consulta
+        result = grade_submission('reading', pk, answers)
+        if result is None:
+            return Response(
+                {'error': 'Test no encontrado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
 
-        # Actualizar el resultado en el perfil del usuario
-        user_profile.resultado_reading = score
-        user_profile.save()
+        # Actualizar el resultado en el perfil del usuario y el historial
+        record_section_result(user_profile, 'reading', int(pk), result['score'], multiple_choice_detail(result))
 
         return Response({
-            'total_questions': total_questions,
-            'correct_answers': correct_answers,
-            'score': score,
+            'total_questions': result['total_questions'],
+            'correct_answers': result['correct_answers'],
+            'score': result['score'],
+            'question_results': result['question_results'],
             'message': 'Respuestas procesadas correctamente'
         })
 
-class ReadingBlockViewSet(viewsets.ModelViewSet):
+class ReadingBlockViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ReadingBlock.objects.all()
     serializer_class = ReadingBlockSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'reading'
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().order_by('id').prefetch_related(reading_questions())
         test_id = self.request.query_params.get('test_id', None)
         if test_id is not None:
             queryset = queryset.filter(test_id=test_id)
         return queryset
 
-class ReadingQuestionViewSet(viewsets.ModelViewSet):
+class ReadingQuestionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ReadingQuestion.objects.all()
     serializer_class = ReadingQuestionSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'reading'
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().order_by('id').prefetch_related(reading_options())
         block_id = self.request.query_params.get('block_id', None)
         if block_id is not None:
             queryset = queryset.filter(block_id=block_id)
         return queryset
 
-class ReadingOptionViewSet(viewsets.ModelViewSet):
+class ReadingOptionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ReadingOption.objects.all()
     serializer_class = ReadingOptionSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'reading'
 
     def get_queryset(self):
         queryset = super().get_queryset()
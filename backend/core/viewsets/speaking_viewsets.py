@@ -1,11 +1,16 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny
 import logging
 
 from core.models.sections.speaking import SpeakingTest, SpeakingBlock
 from core.models.sections.user_profile import UserProfile
+from core.authentication import PUBLIC_AUTHENTICATION_CLASSES, get_submitting_profile
+from core.utils.history import record_section_result
+from core.viewsets.mixins import SnapshotReadMixin, ConditionalGetMixin
+from core.utils.querysets import with_test_tree
 from core.serializers.speaking_serializers import (
     SpeakingTestSerializer,
     SpeakingBlockSerializer
@@ -14,13 +19,15 @@ from core.serializers.speaking_serializers import (
 from core.utils.speechace_eval import evaluate_speaking
 
 
-class SpeakingTestViewSet(viewsets.ModelViewSet):
+class SpeakingTestViewSet(SnapshotReadMixin, viewsets.ModelViewSet):
     queryset = SpeakingTest.objects.all()
     serializer_class = SpeakingTestSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'speaking'
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = with_test_tree('speaking', super().get_queryset())
         vertical = self.request.query_params.get('vertical', None)
         if vertical is not None:
             queryset = queryset.filter(vertical=vertical)
@@ -28,7 +35,8 @@ class SpeakingTestViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def submit_answers(self, request, pk=None):
-        test = self.get_object()
+        # Sin el prefetch del árbol de with_test_tree: solo se necesita el id
+        test = get_object_or_404(SpeakingTest, pk=pk)
         user_email = request.data.get('user_email')
         audio_files = request.FILES.getlist('audio')  # Obtener todos los archivos de audio
 
@@ -40,12 +48,12 @@ class SpeakingTestViewSet(viewsets.ModelViewSet):
             f.seek(0)
             logging.info(f"[SPEAKING] Archivo {idx}: {f.name}, tamaño: {size} bytes, tipo: {getattr(f, 'content_type', 'desconocido')}")
 
-        if not user_email or not audio_files:
+        # El perfil sale del token (401 si no es válido); user_email solo se usa para clientes sin token
+        user_profile = get_submitting_profile(request, user_email)
+        if (user_profile is None and not user_email) or not audio_files:
             return Response({'error': 'Se requiere email y archivos de audio'}, status=400)
 
-        try:
-            user_profile = UserProfile.objects.get(email=user_email)
-        except UserProfile.DoesNotExist:
+        if user_profile is None:
             return Response({'error': 'Usuario no encontrado'}, status=404)
 
         # Obtener todos los bloques del test
@@ -156,9 +164,11 @@ class SpeakingTestViewSet(viewsets.ModelViewSet):
         if average_score == 0.0:
             logging.error(f"[SPEAKING] Score promedio 0.0 - posible problema sistemático")
 
-        # Guardar el score promedio
-        user_profile.resultado_speaking = average_score
-        user_profile.save()
+        # Guardar el score promedio (perfil e historial)
+        record_section_result(user_profile, 'speaking', test.id, average_score, {
+            'valid': valid_evaluations,
+            'blocks': [[report['block_id'], report.get('score')] for report in detailed_reports],
+        })
 
         return Response({
             "score": average_score,
@@ -172,10 +182,12 @@ class SpeakingTestViewSet(viewsets.ModelViewSet):
         })
 
 
-class SpeakingBlockViewSet(viewsets.ModelViewSet):
+class SpeakingBlockViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = SpeakingBlock.objects.all()
     serializer_class = SpeakingBlockSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'speaking'
 
     def get_queryset(self):
         queryset = super().get_queryset()
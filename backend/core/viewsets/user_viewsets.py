@@ -2,33 +2,32 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from core.models.sections.user_profile import UserProfile
+from core.models.sections.user_profile import UserProfile, MAX_INTENTOS, RESULTADO_FIELDS
+from core.models.sections.auth0_sync import Auth0SyncOutbox
+from core.models.sections.history import TestAttempt
 from core.serializers.user_serializers import UserProfileSerializer
-from core.utils.auth0 import get_token_auth_header, verify_jwt, update_user_app_metadata
+from core.pagination import UserProfileCursorPagination
+from core.authentication import Auth0Identity, get_request_profile
+from core.utils import percentiles
+from core.utils.auth0 import link_auth0_subject
 from rest_framework.decorators import action
-import jwt
+from rest_framework.exceptions import NotAuthenticated
 from django.conf import settings
-import requests
+from django.db import transaction
 from django.utils import timezone
-from datetime import timedelta
 from core.constants import VERTICAL_CHOICES
+import logging
 
+logger = logging.getLogger(__name__)
 
-def get_email_from_token(token, payload):
-    email = payload.get("email")
-    if not email:
-        sub = payload.get("sub")
-        if sub:
-            try:
-                userinfo_url = f"https://{settings.AUTH0_DOMAIN}/userinfo"
-                headers = {"Authorization": f"Bearer {token}"}
-                userinfo_response = requests.get(userinfo_url, headers=headers)
-                if userinfo_response.status_code == 200:
-                    userinfo_data = userinfo_response.json()
-                    email = userinfo_data.get("email")
-            except Exception as userinfo_error:
-                print(f"=== DEBUG: Error obteniendo userinfo: {userinfo_error} ===")
-    return email
+
+def get_auth0_identity(request):
+    """
+    Identidad de Auth0 resuelta por core.authentication.Auth0JWTAuthentication
+    """
+    if not isinstance(request.auth, Auth0Identity):
+        raise NotAuthenticated("Authorization header missing")
+    return request.auth
 
 
 @api_view(['POST'])
@@ -39,8 +38,7 @@ def auth0_login_view(request):
     Recibe un token JWT, lo verifica y crea/recupera el perfil del usuario.
     """
     try:
-        token = get_token_auth_header(request)
-        payload = verify_jwt(token)
+        payload = get_auth0_identity(request).payload
         email = payload.get("email")
         # Priorizar el nombre recibido en el body, luego buscar en el token, luego el email
         name = (
@@ -81,6 +79,8 @@ def auth0_login_view(request):
         if not created and user.vertical != vertical_id:
             user.vertical = vertical_id
             user.save()
+        if not user.auth0_sub:
+            link_auth0_subject(user.email, payload.get("sub"))
         serializer = UserProfileSerializer(user)
         return Response(serializer.data, status=200)
     except Exception as e:
@@ -91,46 +91,74 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileSerializer
     permission_classes = [AllowAny]
+    pagination_class = UserProfileCursorPagination
+
+    # Acciones de lectura que aceptan ?fields=
+    SPARSE_ACTIONS = ('list', 'retrieve')
+
+    def requested_fields(self):
+        if self.action not in self.SPARSE_ACTIONS:
+            return None
+        return UserProfileSerializer.parse_fields(self.request.query_params.get('fields'))
 
     def get_queryset(self):
         queryset = super().get_queryset()
         email = self.request.query_params.get('email', None)
         if email:
             queryset = queryset.filter(email=email)
+        fields = self.requested_fields()
+        if fields:
+            queryset = queryset.only(*UserProfileSerializer.columns_for(fields))
         return queryset
 
+    def get_serializer(self, *args, **kwargs):
+        fields = self.requested_fields()
+        if fields:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_serializer_context(self):
+        # Una sola hora de referencia para evaluar el bloqueo de todas las filas
+        context = super().get_serializer_context()
+        context['now'] = timezone.now()
+        return context
+
+    def paginate_queryset(self, queryset):
+        # La búsqueda por email (usada por el frontend) sigue devolviendo una lista
+        if self.request.query_params.get('email'):
+            return None
+        return super().paginate_queryset(queryset)
+
     @action(detail=False, methods=["post"], url_path="register-attempt")
     def register_attempt(self, request):
         try:
-            token = get_token_auth_header(request)
-            payload = verify_jwt(token)
-            email = get_email_from_token(token, payload)
+            identity = get_auth0_identity(request)
 
-            if not email:
+            if not identity.email:
                 return Response({"error": "Email not found in token"}, status=400)
 
-            user = UserProfile.objects.get(email=email)
+            user = get_request_profile(request)
+            if user is None:
+                raise UserProfile.DoesNotExist
 
-            if not user.puede_intentar_test():
-                desbloqueo = user.fecha_bloqueo + timedelta(days=5)
+            # Un solo UPDATE condicional; None si sigue bloqueado (o ya no existe)
+            with transaction.atomic():
+                registrado = UserProfile.objects.registrar_intento(user.pk)
+                if registrado is not None:
+                    TestAttempt.record(user, registrado[0])
+            if registrado is None:
+                user = UserProfile.objects.get(pk=user.pk)
+                desbloqueo = user.fecha_desbloqueo()
                 return Response({
                     "error": "Has alcanzado el máximo de intentos. Podrás volver a intentarlo el:",
-                    "fecha_desbloqueo": desbloqueo.date().isoformat()
+                    "fecha_desbloqueo": desbloqueo.date().isoformat() if desbloqueo else None
                 }, status=403)
 
-            # Incrementar intento
-            user.intentos_realizados += 1
-
-            # Bloquear si ya llegó al intento 3
-            if user.intentos_realizados == 3:
-                user.fecha_bloqueo = timezone.now()
-
-            user.save()
-
+            intentos_realizados, fecha_bloqueo = registrado
             return Response({
                 "message": "Intento registrado correctamente.",
-                "intentos_realizados": user.intentos_realizados,
-                "bloqueado": user.intentos_realizados >= 3
+                "intentos_realizados": intentos_realizados,
+                "bloqueado": intentos_realizados >= MAX_INTENTOS
             }, status=200)
 
         except UserProfile.DoesNotExist:
@@ -138,14 +166,32 @@ class UserProfileViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({"error": str(e)}, status=500)
 
+    @action(detail=False, methods=["get"], url_path="me/percentile")
+    def my_percentile(self, request):
+        """
+        Percentil del resultado general del candidato autenticado dentro de su
+        vertical, desde los histogramas de core.utils.percentiles
+        """
+        identity = get_auth0_identity(request)
+        if not identity.email:
+            return Response({"error": "Email not found in token"}, status=400)
+
+        user = get_request_profile(request)
+        if user is None:
+            return Response({"error": "User not found"}, status=404)
+        if user.resultado_general is None:
+            return Response({"error": "El usuario todavía no tiene resultado general"}, status=404)
+
+        return Response(percentiles.rank(user.vertical, user.resultado_general))
+
     @action(detail=False, methods=["get"], url_path="me")
     def me(self, request):
         try:
-            print("=== DEBUG: Iniciando método me ===")
+            logger.debug("Iniciando método me")
             
             # Verificar configuración de Auth0
-            print(f"=== DEBUG: AUTH0_DOMAIN: {getattr(settings, 'AUTH0_DOMAIN', 'NO CONFIGURADO')} ===")
-            print(f"=== DEBUG: AUTH0_AUDIENCE: {getattr(settings, 'AUTH0_AUDIENCE', 'NO CONFIGURADO')} ===")
+            logger.debug("AUTH0_DOMAIN: %s", getattr(settings, 'AUTH0_DOMAIN', 'NO CONFIGURADO'))
+            logger.debug("AUTH0_AUDIENCE: %s", getattr(settings, 'AUTH0_AUDIENCE', 'NO CONFIGURADO'))
             
             if not hasattr(settings, 'AUTH0_DOMAIN') or not settings.AUTH0_DOMAIN:
                 return Response({"error": "Auth0 domain not configured"}, status=500)
@@ -153,108 +199,67 @@ class UserProfileViewSet(viewsets.ModelViewSet):
             if not hasattr(settings, 'AUTH0_AUDIENCE') or not settings.AUTH0_AUDIENCE:
                 return Response({"error": "Auth0 audience not configured"}, status=500)
             
-            token = get_token_auth_header(request)
-            print(f"=== DEBUG: Token extraído: {token[:50]}... ===")
-            
-            # Decodificar token sin verificación para debug
-            try:
-                # Decodificar sin verificar para ver el contenido
-                unverified_payload = jwt.decode(token, options={"verify_signature": False})
-                print(f"=== DEBUG: Payload sin verificar: {unverified_payload} ===")
-                
-                # Verificación normal del token
-                payload = verify_jwt(token)
-                print(f"=== DEBUG: Payload verificado: {payload} ===")
-            except Exception as verify_error:
-                print(f"=== DEBUG: Error en verificación: {verify_error} ===")
-                # Usar payload sin verificar temporalmente
-                payload = unverified_payload
-
-            email = payload.get("email")
-            print(f"=== DEBUG: Email extraído: {email} ===")
-            
-            # Si no hay email en el payload principal, obtenerlo del endpoint userinfo
-            if not email:
-                sub = payload.get("sub")
-                print(f"=== DEBUG: Sub extraído: {sub} ===")
-                if sub:
-                    try:
-                        # Obtener email del endpoint userinfo de Auth0
-                        userinfo_url = f"https://{settings.AUTH0_DOMAIN}/userinfo"
-                        headers = {"Authorization": f"Bearer {token}"}
-                        userinfo_response = requests.get(userinfo_url, headers=headers)
-                        print(f"=== DEBUG: Userinfo response status: {userinfo_response.status_code} ===")
-                        
-                        if userinfo_response.status_code == 200:
-                            userinfo_data = userinfo_response.json()
-                            print(f"=== DEBUG: Userinfo data: {userinfo_data} ===")
-                            email = userinfo_data.get("email")
-                            print(f"=== DEBUG: Email obtenido de userinfo: {email} ===")
-                        else:
-                            print(f"=== DEBUG: Error en userinfo: {userinfo_response.text} ===")
-                    except Exception as userinfo_error:
-                        print(f"=== DEBUG: Error obteniendo userinfo: {userinfo_error} ===")
-            
+            identity = get_auth0_identity(request)
+
+            # El email ya viene resuelto por la autenticación (claim, cache, BD o /userinfo)
+            email = identity.email
+            logger.debug("Email extraído: %s", email)
+
             if not email:
-                print("=== DEBUG: Email no encontrado en token ni userinfo ===")
+                logger.debug("Email no encontrado en token ni userinfo")
                 return Response({"error": "Email not found in token"}, status=400)
 
             # Buscar si el usuario ya existe
-            try:
-                user = UserProfile.objects.get(email=email)
-                print(f"=== DEBUG: Usuario encontrado: {user.email} ===")
+            if isinstance(request.user, UserProfile):
+                user = request.user
+                logger.debug("Usuario encontrado: %s", user.email)
                 return Response({
                     "email": user.email,
                     "vertical_id": user.vertical,
                     "exists": True
                 })
-            except UserProfile.DoesNotExist:
-                print(f"=== DEBUG: Usuario no existe, creando respuesta para email: {email} ===")
-                # Si no existe, solo devolver el email para que el frontend muestre el modal
-                return Response({
-                    "email": email,
-                    "vertical_id": None,
-                    "exists": False
-                })
+
+            logger.debug("Usuario no existe, creando respuesta para email: %s", email)
+            # Si no existe, solo devolver el email para que el frontend muestre el modal
+            return Response({
+                "email": email,
+                "vertical_id": None,
+                "exists": False
+            })
 
         except Exception as e:
-            print(f"=== DEBUG: Error en método me: {str(e)} ===")
-            import traceback
-            print(f"=== DEBUG: Traceback: {traceback.format_exc()} ===")
+            logger.debug("Error en método me: %s", e, exc_info=True)
             return Response({"error": str(e)}, status=401)
 
     @action(detail=False, methods=["post"], url_path="create-or-update")
     def create_or_update(self, request):
         try:
-            print("=== DEBUG: Iniciando método create_or_update ===")
-            token = get_token_auth_header(request)
-            payload = verify_jwt(token)
-            email = get_email_from_token(token, payload)
+            logger.debug("Iniciando método create_or_update")
+            email = get_auth0_identity(request).email
             if not email:
                 return Response({"error": "Email not found in token"}, status=400)
             
-            print(f"=== DEBUG: Email obtenido: {email} ===")
+            logger.debug("Email obtenido: %s", email)
             
             # Buscar si el usuario ya existe
-            try:
-                user = UserProfile.objects.get(email=email)
-                print(f"=== DEBUG: Usuario encontrado: {user.email} ===")
-                return Response({"email": user.email}, status=200)
-            except UserProfile.DoesNotExist:
-                print(f"=== DEBUG: Usuario no existe, no se puede crear sin vertical ===")
-                # No crear usuario sin vertical ya que el campo no permite nulos
-                return Response({"error": "User not found. Please set vertical first."}, status=404)
+            if isinstance(request.user, UserProfile):
+                logger.debug("Usuario encontrado: %s", request.user.email)
+                return Response({"email": request.user.email}, status=200)
+
+            logger.debug("Usuario no existe, no se puede crear sin vertical")
+            # No crear usuario sin vertical ya que el campo no permite nulos
+            return Response({"error": "User not found. Please set vertical first."}, status=404)
         except Exception as e:
-            print(f"=== DEBUG: Error en create_or_update: {str(e)} ===")
+            logger.debug("Error en create_or_update: %s", e)
             return Response({"error": str(e)}, status=401)
 
     @action(detail=False, methods=["post"], url_path="create-with-vertical")
     def create_with_vertical(self, request):
         try:
-            print("=== DEBUG: Iniciando método create_with_vertical ===")
-            token = get_token_auth_header(request)
-            payload = verify_jwt(token)
-            email = get_email_from_token(token, payload)
+            logger.debug("Iniciando método create_with_vertical")
+            identity = get_auth0_identity(request)
+            payload = identity.payload
+            email = identity.email
             # Priorizar el nombre recibido en el body, luego buscar en el token, luego el email
             name = (
                 request.data.get("name") or
@@ -264,15 +269,15 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                 payload.get("email")
             )
             vertical_id = request.data.get("vertical_id")
-            print(f"=== DEBUG: Email obtenido: {email} ===")
-            print(f"=== DEBUG: Nombre obtenido: {name} ===")
-            print(f"=== DEBUG: Vertical ID recibido: {vertical_id} ===")
-            print(f"=== DEBUG: Request data: {request.data} ===")
+            logger.debug("Email obtenido: %s", email)
+            logger.debug("Nombre obtenido: %s", name)
+            logger.debug("Vertical ID recibido: %s", vertical_id)
+            logger.debug("Request data: %s", request.data)
             if not email:
-                print("=== DEBUG: Email no encontrado ===")
+                logger.debug("Email no encontrado")
                 return Response({"error": "Email not found in token"}, status=400)
             if not vertical_id:
-                print("=== DEBUG: Vertical ID no proporcionado ===")
+                logger.debug("Vertical ID no proporcionado")
                 return Response({"error": "Vertical ID is required"}, status=400)
             try:
                 vertical_id_int = int(vertical_id)
@@ -293,7 +298,7 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                     }
                 )
             except Exception as e:
-                print(f"=== DEBUG: Error de integridad al crear usuario: {str(e)} ===")
+                logger.debug("Error de integridad al crear usuario: %s", e)
                 return Response({"error": "Error creating user: " + str(e)}, status=400)
             updated = False
             if not created:
@@ -305,9 +310,11 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                     updated = True
                 if updated:
                     user.save()
-                    print("=== DEBUG: Usuario actualizado con nuevo vertical o nombre ===")
+                    logger.debug("Usuario actualizado con nuevo vertical o nombre")
             else:
-                print(f"=== DEBUG: Usuario creado: {user.email} ===")
+                logger.debug("Usuario creado: %s", user.email)
+            if not user.auth0_sub:
+                link_auth0_subject(user.email, payload.get("sub"))
             return Response({
                 "email": user.email, 
                 "name": user.name,
@@ -315,115 +322,103 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                 "created": created
             }, status=201 if created else 200)
         except Exception as e:
-            print(f"=== DEBUG: Error en create_with_vertical: {str(e)} ===")
-            import traceback
-            print(f"=== DEBUG: Traceback: {traceback.format_exc()} ===")
+            logger.debug("Error en create_with_vertical: %s", e, exc_info=True)
             return Response({"error": str(e)}, status=400)
     
     @action(detail=False, methods=["patch"], url_path="set-vertical")
     def set_vertical(self, request):
         try:
-            print("=== DEBUG: Iniciando método set_vertical ===")
-            token = get_token_auth_header(request)
-            payload = verify_jwt(token)
-            email = get_email_from_token(token, payload)
+            logger.debug("Iniciando método set_vertical")
+            email = get_auth0_identity(request).email
             vertical_id = request.data.get("vertical_id")
             
-            print(f"=== DEBUG: Email obtenido: {email} ===")
-            print(f"=== DEBUG: Vertical ID recibido: {vertical_id} ===")
-            print(f"=== DEBUG: Request data: {request.data} ===")
+            logger.debug("Email obtenido: %s", email)
+            logger.debug("Vertical ID recibido: %s", vertical_id)
+            logger.debug("Request data: %s", request.data)
             
             if not email:
-                print("=== DEBUG: Email no encontrado ===")
+                logger.debug("Email no encontrado")
                 return Response({"error": "Email not found in token"}, status=400)
             if not vertical_id:
-                print("=== DEBUG: Vertical ID no proporcionado ===")
+                logger.debug("Vertical ID no proporcionado")
                 return Response({"error": "Vertical ID is required"}, status=400)
             
-            user = UserProfile.objects.get(email=email)
-            print(f"=== DEBUG: Usuario encontrado: {user.email} ===")
+            user = get_request_profile(request, fresh=True)
+            if user is None:
+                raise UserProfile.DoesNotExist
+            logger.debug("Usuario encontrado: %s", user.email)
             user.vertical = vertical_id
             user.save()
-            print(f"=== DEBUG: Vertical actualizado a: {user.vertical} ===")
+            logger.debug("Vertical actualizado a: %s", user.vertical)
             return Response({"email": user.email, "vertical": user.vertical}, status=200)
         except UserProfile.DoesNotExist:
-            print(f"=== DEBUG: Usuario no encontrado para email: {email} ===")
+            logger.debug("Usuario no encontrado para email: %s", email)
             return Response({"error": "User not found"}, status=404)
         except Exception as e:
-            print(f"=== DEBUG: Error en set_vertical: {str(e)} ===")
-            import traceback
-            print(f"=== DEBUG: Traceback: {traceback.format_exc()} ===")
+            logger.debug("Error en set_vertical: %s", e, exc_info=True)
             return Response({"error": str(e)}, status=401)
 
     @action(detail=False, methods=["post"], url_path="update-test-results")
     def update_test_results(self, request):
         try:
-            print("=== DEBUG: Iniciando método update_test_results ===")
-            token = get_token_auth_header(request)
-            payload = verify_jwt(token)
-            email = get_email_from_token(token, payload)
+            logger.debug("Iniciando método update_test_results")
+            identity = get_auth0_identity(request)
+            payload = identity.payload
+            email = identity.email
             
             # Obtener datos del request
             test_results = request.data.get("test_results", {})
             nivel = request.data.get("nivel")
             
-            print(f"=== DEBUG: Email obtenido: {email} ===")
-            print(f"=== DEBUG: Test results: {test_results} ===")
-            print(f"=== DEBUG: Nivel: {nivel} ===")
+            logger.debug("Email obtenido: %s", email)
+            logger.debug("Test results: %s", test_results)
+            logger.debug("Nivel: %s", nivel)
             
             if not email:
                 return Response({"error": "Email not found in token"}, status=400)
             
             # Buscar el usuario
             try:
-                user = UserProfile.objects.get(email=email)
-                print(f"=== DEBUG: Usuario encontrado: {user.email} ===")
+                user = get_request_profile(request, fresh=True)
+                if user is None:
+                    raise UserProfile.DoesNotExist
+                logger.debug("Usuario encontrado: %s", user.email)
                 
                 # Actualizar los resultados del test en la base de datos
-                if test_results.get("listening") is not None:
-                    user.resultado_listening = test_results["listening"]
-                if test_results.get("speaking") is not None:
-                    user.resultado_speaking = test_results["speaking"]
-                if test_results.get("reading") is not None:
-                    user.resultado_reading = test_results["reading"]
-                if test_results.get("writing") is not None:
-                    user.resultado_writing = test_results["writing"]
-                
-                # El resultado general y nivel se calculan automáticamente en el modelo
-                user.save()
-                
-                print(f"=== DEBUG: Resultados actualizados en BD ===")
-                print(f"=== DEBUG: Resultado general: {user.resultado_general} ===")
-                print(f"=== DEBUG: Nivel calculado: {user.nivel} ===")
+                changed = []
+                for section, field in RESULTADO_FIELDS.items():
+                    if test_results.get(section) is not None:
+                        setattr(user, field, test_results[section])
+                        changed.append(field)
                 
                 # Obtener el user_id de Auth0 del token
                 user_id = payload.get("sub")
+
+                # El perfil y el outbox se escriben en la misma transacción; el envío
+                # a Auth0 lo hace el comando drain_auth0_outbox
+                auth0_sync_queued = False
+                if changed:
+                    with transaction.atomic():
+                        # El resultado general y nivel se calculan en el modelo y se
+                        # escriben solo junto con los resultados que cambiaron; save
+                        # relee con bloqueo los demás resultados de la fila
+                        user.save(update_fields=changed)
+
+                        # Solo sincronizar app_metadata si todos los resultados están presentes
+                        resultados_completos = all(
+                            getattr(user, field) is not None for field in RESULTADO_FIELDS.values()
+                        )
+                        if resultados_completos and user_id:
+                            Auth0SyncOutbox.enqueue(user, user_id, {"english_level": user.nivel})
+                            auth0_sync_queued = True
+
+                logger.debug("Resultados actualizados en BD")
+                logger.debug("Resultado general: %s", user.resultado_general)
+                logger.debug("Nivel calculado: %s", user.nivel)
+
                 if not user_id:
                     return Response({"error": "User ID not found in token"}, status=400)
                 
-                # Solo actualizar app_metadata si todos los resultados están presentes
-                resultados_completos = all([
-                    user.resultado_listening is not None,
-                    user.resultado_speaking is not None,
-                    user.resultado_reading is not None,
-                    user.resultado_writing is not None
-                ])
-                
-                auth0_updated = False
-                if resultados_completos:
-                    app_metadata = {
-                        "english_level": user.nivel
-                    }
-                    try:
-                        update_user_app_metadata(user_id, app_metadata)
-                        print(f"=== DEBUG: App metadata actualizado en Auth0 ===")
-                        auth0_updated = True
-                    except Exception as auth0_error:
-                        print(f"=== DEBUG: Error actualizando Auth0: {str(auth0_error)} ===")
-                        # Continuar aunque falle Auth0, los datos están en BD
-                else:
-                    print("=== DEBUG: No se actualiza Auth0 porque faltan resultados ===")
-                
                 return Response({
                     "email": user.email,
                     "vertical": user.vertical,
@@ -435,15 +430,16 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                         "general": user.resultado_general
                     },
                     "nivel": user.nivel,
-                    "auth0_updated": auth0_updated
+                    # auth0_updated se mantiene para el frontend: indica que la
+                    # sincronización con Auth0 quedó encolada
+                    "auth0_updated": auth0_sync_queued,
+                    "auth0_sync_queued": auth0_sync_queued
                 }, status=200)
                 
             except UserProfile.DoesNotExist:
-                print(f"=== DEBUG: Usuario no existe: {email} ===")
+                logger.debug("Usuario no existe: %s", email)
                 return Response({"error": "User not found"}, status=404)
                 
         except Exception as e:
-            print(f"=== DEBUG: Error en update_test_results: {str(e)} ===")
-            import traceback
-            print(f"=== DEBUG: Traceback: {traceback.format_exc()} ===")
+            logger.debug("Error en update_test_results: %s", e, exc_info=True)
             return Response({"error": str(e)}, status=401)
\ No newline at end of file
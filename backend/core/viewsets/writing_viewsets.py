@@ -1,9 +1,14 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny
 from core.models.sections.writing import WritingTest, WritingBlock
 from core.models.sections.user_profile import UserProfile
+from core.authentication import PUBLIC_AUTHENTICATION_CLASSES, get_submitting_profile
+from core.utils.history import record_section_result
+from core.viewsets.mixins import SnapshotReadMixin, ConditionalGetMixin
+from core.utils.querysets import with_test_tree
 from core.serializers.writing_serializers import (
     WritingTestSerializer,
     WritingBlockSerializer
@@ -11,13 +16,15 @@ from core.serializers.writing_serializers import (
 from core.utils.cohere_eval import evaluate_writing
 import json
 
-class WritingTestViewSet(viewsets.ModelViewSet):
+class WritingTestViewSet(SnapshotReadMixin, viewsets.ModelViewSet):
     queryset = WritingTest.objects.all()
     serializer_class = WritingTestSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'writing'
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = with_test_tree('writing', super().get_queryset())
         vertical = self.request.query_params.get('vertical', None)
         if vertical is not None:
             queryset = queryset.filter(vertical=vertical)
@@ -25,16 +32,17 @@ class WritingTestViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def submit_answers(self, request, pk=None):
-        test = self.get_object()
+        # Sin el prefetch del árbol de with_test_tree: solo se necesita el id
+        test = get_object_or_404(WritingTest, pk=pk)
         user_email = request.data.get('user_email')
         texto = request.data.get('texto')
 
-        if not user_email or not texto:
+        # El perfil sale del token (401 si no es válido); user_email solo se usa para clientes sin token
+        user_profile = get_submitting_profile(request, user_email)
+        if (user_profile is None and not user_email) or not texto:
             return Response({'error': 'Se requiere email y texto'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            user_profile = UserProfile.objects.get(email=user_email)
-        except UserProfile.DoesNotExist:
+        if user_profile is None:
             return Response({'error': 'Usuario no encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
         try:
@@ -53,9 +61,8 @@ class WritingTestViewSet(viewsets.ModelViewSet):
             # Calcular promedio
             score = sum(criterios_normalizados.values()) / len(criterios_normalizados)
 
-            # Guardar resultado en el perfil del usuario
-            user_profile.resultado_writing = score
-            user_profile.save()
+            # Guardar resultado en el perfil del usuario y el historial
+            record_section_result(user_profile, 'writing', test.id, score, criterios_normalizados)
 
             return Response({
                 'criterios': criterios_normalizados,
@@ -69,10 +76,12 @@ class WritingTestViewSet(viewsets.ModelViewSet):
             traceback.print_exc()  # muestra el error completo en consola
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class WritingBlockViewSet(viewsets.ModelViewSet):
+class WritingBlockViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = WritingBlock.objects.all()
     serializer_class = WritingBlockSerializer
     permission_classes = [AllowAny]
+    authentication_classes = PUBLIC_AUTHENTICATION_CLASSES
+    content_section = 'writing'
 
     def get_queryset(self):
         queryset = super().get_queryset()